@@ -0,0 +1,263 @@
+import argparse
+import warnings
+from collections import deque
+import numpy as np
+from capture import load_capture_parts
+
+# Перцентили веса на каждой ступени
+percentile_levels = (5, 50, 95)
+
+
+def iter_capture_chunks(path, chunk_rows=1_000_000):
+    """
+    Читает двоичную запись кусками через memmap; каталог сегментов читается как один ряд
+    :return: Итератор кортежей (timestamps, speeds, weights); для записи без веса weights = None
+    """
+    _, parts = load_capture_parts(path)
+    chunks = (data[start:start + chunk_rows] for data in parts for start in range(0, len(data), chunk_rows))
+    for chunk in chunks:
+        has_weight = 'weight' in chunk.dtype.names
+        yield chunk['timestamp'], chunk['speed'], chunk['weight'] if has_weight else None
+
+
+def iter_csv_chunks(path, chunk_rows=1_000_000):
+    """
+    Читает CSV логгера (Timestamp,Speed[,Weight]) кусками
+    :return: Итератор кортежей (timestamps, speeds, weights); для записи без веса weights = None
+    """
+    with open(path, 'r') as f:
+        columns = f.readline().strip().split(',')
+        # Столбцы ищутся по заголовку: после скорости могут идти столбцы времени хоста и обработанный вес
+        # (дробный), поэтому читаются только целые столбцы метки времени, скорости и сырого веса
+        weight = columns.index('Weight') if 'Weight' in columns else None
+        usecols = (0, 1, weight) if weight is not None else (0, 1)
+        while True:
+            # Если строк кратно chunk_rows, последнее чтение пустое, и loadtxt предупреждает об отсутствии данных
+            with warnings.catch_warnings():
+                warnings.filterwarnings('ignore', message='loadtxt: input contained no data', category=UserWarning)
+                chunk = np.loadtxt(f, delimiter=',', dtype=np.int64, max_rows=chunk_rows, ndmin=2, usecols=usecols)
+            if len(chunk) == 0:
+                return
+            yield chunk[:, 0], chunk[:, 1], chunk[:, 2] if weight is not None else None
+            if len(chunk) < chunk_rows:
+                return
+
+
+def iter_chunks(path, chunk_rows=1_000_000):
+    """Выбирает способ чтения по расширению файла: .csv или двоичная запись"""
+    if path.lower().endswith('.csv'):
+        return iter_csv_chunks(path, chunk_rows)
+    return iter_capture_chunks(path, chunk_rows)
+
+
+class StepStats:
+    """Статистика веса на одной ступени постоянной скорости"""
+    __slots__ = ('speed', 'start', 'end', 'count', 'mean', 'std', 'percentiles')
+
+    def __init__(self, speed, start, end, count, mean, std, percentiles):
+        self.speed = speed
+        self.start = start   # Время начала ступени (мс ардуино)
+        self.end = end   # Время последнего отсчета ступени
+        self.count = count   # Количество отсчетов после установления
+        self.mean = mean
+        self.std = std
+        self.percentiles = percentiles   # Словарь {уровень: значение}
+
+    def __repr__(self):
+        return (f"StepStats(speed={self.speed}, start={self.start}, end={self.end}, count={self.count}, "
+                f"mean={self.mean:.3f}, std={self.std:.3f})")
+
+
+class _StepAccumulator:
+    """Накопление статистики открытой ступени с ограниченной памятью"""
+    def __init__(self, speed, start, max_samples):
+        self.speed = speed
+        self.start = start
+        self.end = start
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0   # Сумма квадратов отклонений от среднего
+        # Выборка для перцентилей: каждый stride-й отсчет; при переполнении шаг удваивается
+        self.samples = np.empty(max_samples, dtype=np.float64)
+        self.size = 0
+        self.stride = 1
+
+    def add(self, values):
+        count = len(values)
+        if count == 0:
+            return
+        # Объединение среднего и дисперсии по формуле Чана, без цикла по отсчетам
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+
+        while True:
+            picked = values[(-self.count) % self.stride::self.stride]
+            if self.size + len(picked) <= len(self.samples):
+                break
+            kept = self.samples[:self.size:2].copy()
+            self.size = len(kept)
+            self.samples[:self.size] = kept
+            self.stride *= 2
+        self.samples[self.size:self.size + len(picked)] = picked
+        self.size += len(picked)
+        self.count = total
+
+    def result(self):
+        values = np.percentile(self.samples[:self.size], percentile_levels)
+        return StepStats(self.speed, self.start, self.end, self.count, self.mean,
+                         (self.m2 / self.count) ** 0.5, dict(zip(percentile_levels, values.tolist())))
+
+
+class StepAnalyzer:
+    def __init__(self, settle_ms=30, min_hold_ms=80, min_samples=1, max_step_samples=65536, max_steps=10_000):
+        """
+        Потоковый поиск ступеней постоянной скорости (разгон по 10 PWM и удержание в runMotorTest())
+        и статистика веса на каждой ступени. Память не зависит от длины записи.
+        Ступень определяется по времени удержания скорости, а не по числу отсчетов: скетч присылает несколько
+        строк на ступень разгона, а частота телеметрии зависит от скорости порта
+        :param settle_ms: Сколько миллисекунд после смены скорости отбрасывать как переходный процесс
+        :param min_hold_ms: Минимальное время удержания скорости (до следующей смены или последнего отсчета)
+        :param min_samples: Минимум отсчетов после установления, чтобы ступень попала в результат
+        :param max_step_samples: Размер выборки для перцентилей одной ступени
+        :param max_steps: Сколько последних ступеней хранить
+        """
+        self.settle_ms = settle_ms
+        self.min_hold_ms = min_hold_ms
+        self.min_samples = min_samples
+        self.max_step_samples = max_step_samples
+        self.steps = deque(maxlen=max_steps)
+        self.samples = 0   # Количество обработанных отсчетов
+        self._current = None
+        # Сводка по скоростям для кривой тяги: {скорость: [количество, сумма весов]}
+        self._by_speed = {}
+
+    def feed(self, timestamps, speeds, weights):
+        """
+        Обрабатывает очередной кусок записи
+        :param timestamps: Время отсчетов (мс ардуино)
+        :param speeds: Скорость (PWM)
+        :param weights: Вес с тензодатчика
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        speeds = np.asarray(speeds)
+        weights = np.asarray(weights, dtype=np.float64)
+        count = len(speeds)
+        if count == 0:
+            return
+        self.samples += count
+
+        # Границы участков постоянной скорости внутри куска
+        bounds = np.flatnonzero(np.diff(speeds)) + 1
+        starts = np.concatenate(([0], bounds))
+        stops = np.concatenate((bounds, [count]))
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            speed = int(speeds[start])
+            current = self._current
+            if current is None or current.speed != speed:
+                # Ступень длится до смены скорости, даже если между отсчетами был перерыв
+                self._close(int(timestamps[start]))
+                current = self._current = _StepAccumulator(speed, int(timestamps[start]), self.max_step_samples)
+            current.end = int(timestamps[stop - 1])
+            # Время внутри участка возрастает, поэтому установившиеся отсчеты идут одним срезом
+            first = start + int(np.searchsorted(timestamps[start:stop], current.start + self.settle_ms))
+            current.add(weights[first:stop])
+
+    def finish(self):
+        """Закрывает последнюю ступень; вызывается в конце записи"""
+        self._close()
+        return list(self.steps)
+
+    def _close(self, next_start=None):
+        current = self._current
+        self._current = None
+        if current is None or current.count < self.min_samples:
+            return
+        hold = (next_start if next_start is not None else current.end) - current.start
+        if hold < self.min_hold_ms:
+            return
+        self.steps.append(current.result())
+        entry = self._by_speed.setdefault(current.speed, [0, 0.0])
+        entry[0] += current.count
+        entry[1] += current.mean * current.count
+
+    def curve(self):
+        """
+        Средний вес для каждой скорости по всем ступеням (разгон и торможение проходят одни и те же скорости)
+        :return: Массивы speeds, thrust, counts, упорядоченные по скорости
+        """
+        speeds = np.array(sorted(self._by_speed), dtype=np.float64)
+        counts = np.array([self._by_speed[s][0] for s in speeds.astype(int).tolist()], dtype=np.float64)
+        sums = np.array([self._by_speed[s][1] for s in speeds.astype(int).tolist()], dtype=np.float64)
+        return speeds, sums / np.maximum(counts, 1), counts
+
+    def fit(self, degree=2):
+        """
+        Полином тяги от скорости (тяга винта растет примерно как квадрат оборотов)
+        :return: Коэффициенты numpy.polyfit от старшей степени или None, если скоростей недостаточно
+        """
+        speeds, thrust, counts = self.curve()
+        if len(speeds) <= degree:
+            return None
+        # Вес точки - корень из числа отсчетов, как для среднего с независимым шумом
+        return np.polyfit(speeds, thrust, degree, w=np.sqrt(counts))
+
+    def summary(self, degree=2):
+        """Сводка для каталога прогонов"""
+        coefficients = self.fit(degree)
+        return {
+            'samples': self.samples,
+            'steps': len(self.steps),
+            'max_speed': max((step.speed for step in self.steps), default=None),
+            'max_thrust': max((step.mean for step in self.steps), default=None),
+            'fit': coefficients.tolist() if coefficients is not None else None,
+        }
+
+    def report(self, degree=2):
+        """Текстовая сводка по ступеням и аппроксимация кривой тяги"""
+        lines = [f"Samples: {self.samples}, steps: {len(self.steps)}"]
+        header = ' '.join(f"p{level:<9}" for level in percentile_levels)
+        lines.append(f"{'speed':>6} {'start':>9} {'end':>9} {'count':>7} {'mean':>10} {'std':>10} {header}")
+        for step in self.steps:
+            values = ' '.join(f"{step.percentiles[level]:<10.2f}" for level in percentile_levels)
+            lines.append(f"{step.speed:6d} {step.start:9d} {step.end:9d} {step.count:7d} "
+                         f"{step.mean:10.2f} {step.std:10.2f} {values}")
+        coefficients = self.fit(degree)
+        if coefficients is not None:
+            terms = ' '.join(f"{c:+.6g}*s^{degree - i}" for i, c in enumerate(coefficients))
+            lines.append(f"Thrust fit: {terms}")
+        return '\n'.join(lines)
+
+
+def analyze(path, chunk_rows=1_000_000, **kwargs):
+    """
+    Анализ сохраненной записи (двоичной или CSV) кусками
+    :param kwargs: Параметры StepAnalyzer
+    :return: StepAnalyzer с закрытыми ступенями
+    """
+    analyzer = StepAnalyzer(**kwargs)
+    for timestamps, speeds, weights in iter_chunks(path, chunk_rows):
+        analyzer.feed(timestamps, speeds, weights if weights is not None else np.zeros(len(speeds)))
+    analyzer.finish()
+    return analyzer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ступени скорости и кривая тяги по записи теста")
+    parser.add_argument('path', nargs='?', default='eng_capture', help="Двоичная запись, каталог сегментов или eng.csv")
+    parser.add_argument('--settle-ms', type=int, default=30)
+    parser.add_argument('--min-hold-ms', type=int, default=80)
+    parser.add_argument('--min-samples', type=int, default=1)
+    parser.add_argument('--degree', type=int, default=2)
+    args = parser.parse_args()
+
+    analyzer = analyze(args.path, settle_ms=args.settle_ms, min_hold_ms=args.min_hold_ms,
+                       min_samples=args.min_samples)
+    print(analyzer.report(args.degree))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import argparse
+import time
+import numpy as np
+from analysis import StepAnalyzer
+
+# Параметры runMotorTest() из sketch_aug30a.ino
+min_throttle = 1000
+dest_throttle = 1250
+step_hold_ms = 100
+test_hold_ms = 3000
+
+
+def thrust(speed):
+    """Тяга винта растет примерно как квадрат оборотов (сырые единицы HX711)"""
+    return 0.05 * (speed - min_throttle) ** 2
+
+
+def sketch_trace(log_interval_ms=None, seed=1):
+    """
+    Телеметрия прогона в том виде, в каком ее присылает скетч: строка при каждой смене скорости и, если задан
+    log_interval_ms, строки во время удержания (holdSpeed). Без log_interval_ms - скетч до holdSpeed: одна строка
+    на ступень каждые 100 мс и ни одной за 3 с удержания. Вес отстает от скорости (инерция винта),
+    HX711 обновляется 10 раз в секунду, между обновлениями повторяется прошлое значение
+    """
+    rng = np.random.default_rng(seed)
+    speeds = list(range(min_throttle, dest_throttle + 1, 10))
+    schedule = [(speed, step_hold_ms) for speed in speeds]
+    schedule[-1] = (dest_throttle, step_hold_ms + test_hold_ms)
+    schedule += [(speed, step_hold_ms) for speed in reversed(speeds)]
+
+    rows = []
+    now = 1500
+    force = 0.0
+    reading = 0.0
+    last_adc = -100
+
+    def sample(speed):
+        nonlocal reading, last_adc
+        if now - last_adc >= 100:
+            reading = force + rng.normal(0, 3)
+            last_adc = now
+        rows.append((now, speed, int(round(reading))))
+
+    for speed, hold in schedule:
+        sample(speed)
+        end = now + hold
+        while now < end:
+            step = min(log_interval_ms or hold, end - now)
+            # Переходный процесс тяги с постоянной времени 20 мс
+            force += (thrust(speed) - force) * (1 - np.exp(-step / 20))
+            now += step
+            if log_interval_ms is not None:
+                sample(speed)
+    return np.array(rows, dtype=np.int64)
+
+
+def simulator_trace(rate_hz=1000, seconds_per_step=1.0):
+    """Профиль simulator.py: ступени по 50 PWM, телеметрия с постоянной частотой"""
+    period = 1000 / rate_hz
+    per_step = int(seconds_per_step * rate_hz)
+    speeds = np.repeat(np.arange(1050, 1501, 50), per_step)
+    timestamps = (np.arange(len(speeds)) * period).astype(np.int64)
+    weights = np.rint(thrust(speeds) + np.random.default_rng(2).normal(0, 3, len(speeds))).astype(np.int64)
+    return np.column_stack((timestamps, speeds, weights))
+
+
+def analyze_trace(trace, chunk_rows):
+    analyzer = StepAnalyzer()
+    for start in range(0, len(trace), chunk_rows):
+        chunk = trace[start:start + chunk_rows]
+        analyzer.feed(chunk[:, 0], chunk[:, 1], chunk[:, 2])
+    analyzer.finish()
+    return analyzer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Поиск ступеней и кривая тяги на записях разной формы")
+    parser.add_argument('--rows', type=int, default=5_000_000, help="Строк в записи для замера скорости")
+    parser.add_argument('--chunk-rows', type=int, default=7)
+    args = parser.parse_args()
+
+    traces = {
+        'sketch, logging during holds': sketch_trace(log_interval_ms=50),
+        'sketch, one line per step': sketch_trace(),
+        'simulator 1 kHz': simulator_trace(),
+    }
+    for name, trace in traces.items():
+        analyzer = analyze_trace(trace, args.chunk_rows)
+        summary = analyzer.summary()
+        hold = [step for step in analyzer.steps if step.speed == dest_throttle]
+        expected = f"hold mean {hold[0].mean:.0f} (true {thrust(dest_throttle):.0f})" if hold else "no hold step"
+        fit = np.polyval(summary['fit'], dest_throttle) if summary['fit'] else None
+        print(f"{name:30s} {len(trace):6d} rows  steps {summary['steps']:3d}  {expected}  "
+              f"fit at {dest_throttle}: {f'{fit:.0f}' if fit is not None else None}")
+        if not hold:
+            raise AssertionError(f"{name}: the 25% hold was not detected")
+
+    # Пропускная способность на длинной записи, кусками как при чтении через memmap
+    trace = simulator_trace(seconds_per_step=args.rows / 10 / 1000)
+    start = time.perf_counter()
+    analyze_trace(trace, 1_000_000)
+    elapsed = time.perf_counter() - start
+    print(f"{len(trace)} rows in {elapsed:.2f} s: {len(trace) / elapsed / 1e6:.1f} M rows/s")
+
+
+if __name__ == "__main__":
+    main()
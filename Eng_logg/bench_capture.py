@@ -0,0 +1,85 @@
+import argparse
+import csv
+import os
+import tempfile
+import time
+import numpy as np
+from capture import CaptureWriter, csv_header, encode_header, export_csv, load_capture, SPEED_WEIGHT_COLUMNS
+
+
+def write_large_capture(path, samples):
+    """Быстро создает большую запись напрямую через numpy, минуя CaptureWriter"""
+    dtype = np.dtype([('timestamp', '<u4'), ('speed', '<i4'), ('weight', '<i4')])
+    data = np.empty(samples, dtype=dtype)
+    data['timestamp'] = np.arange(samples, dtype=np.uint32)
+    data['speed'] = 1000 + np.arange(samples) % 1000
+    data['weight'] = np.arange(samples) % 5000
+    header = {'columns': [[name, dtype.fields[name][0].str] for name in dtype.names], 'metadata': {}}
+    with open(path, 'wb') as f:
+        f.write(encode_header(header))
+        data.tofile(f)
+
+
+def load_csv(path):
+    """Старое чтение CSV из plot_graphs"""
+    timestamps, speeds, weights = [], [], []
+    with open(path, 'r') as csv_file:
+        csv_reader = csv.reader(csv_file)
+        next(csv_reader)
+        for row in csv_reader:
+            timestamps.append(int(row[0]))
+            speeds.append(int(row[1]))
+            weights.append(int(row[2]))
+    return timestamps, speeds, weights
+
+
+def timed(name, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    print(f"{name:32s} {(time.perf_counter() - start) * 1000:10.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк двоичной записи телеметрии")
+    parser.add_argument('--samples', type=int, default=10_000_000)
+    parser.add_argument('--write-rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cap_path = os.path.join(tmp, 'run.cap')
+        csv_path = os.path.join(tmp, 'run.csv')
+
+        rows = [[i, 1000 + i % 1000, i % 5000] for i in range(args.write_rows)]
+
+        def write_capture():
+            with CaptureWriter(cap_path, SPEED_WEIGHT_COLUMNS) as writer:
+                for start in range(0, len(rows), 512):
+                    writer.append(rows[start:start + 512])
+
+        def write_csv():
+            with open(csv_path, 'w', newline='') as f:
+                csv_writer = csv.writer(f)
+                csv_writer.writerow(csv_header(SPEED_WEIGHT_COLUMNS))
+                for start in range(0, len(rows), 512):
+                    csv_writer.writerows(rows[start:start + 512])
+
+        print(f"Writing {args.write_rows} rows:")
+        timed("  capture", write_capture)
+        timed("  csv", write_csv)
+
+        print(f"Loading {args.write_rows} rows:")
+        timed("  csv.reader + int()", load_csv, csv_path)
+        _, data = timed("  load_capture", load_capture, cap_path)
+        timed("  load_capture + columns sum", lambda: int(data['speed'].sum()))
+        timed("  export_csv", export_csv, cap_path, csv_path)
+
+        write_large_capture(cap_path, args.samples)
+        print(f"Loading {args.samples} samples:")
+        _, data = timed("  load_capture", load_capture, cap_path)
+        timed("  columns to arrays", lambda: (np.asarray(data['timestamp']), np.asarray(data['weight'])))
+        timed("  speed.max()", lambda: int(data['speed'].max()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+from catalog import Catalog, throttle_percent
+
+
+def populate(catalog, runs, engines, propellers):
+    for i in range(engines):
+        catalog.add_engine(f"engine-{i:04d}", brand="Brand", power=str(100 + i))
+    for i in range(propellers):
+        catalog.add_propeller(f"prop-{i:04d}", diameter=str(5 + i % 10))
+    rnd = random.Random(0)
+    rows = []
+    for i in range(runs):
+        speed = rnd.randrange(1000, 2001, 10)
+        rows.append((1.7e9 + i * 60, rnd.randrange(engines) + 1, rnd.randrange(propellers) + 1, f"runs/{i}/eng.cap",
+                     rnd.randrange(10_000, 1_000_000), speed, throttle_percent(speed), rnd.uniform(0, 2000)))
+    with catalog.db:
+        catalog.db.executemany(
+            "INSERT INTO runs (started, engine_id, propeller_id, capture_path, samples, max_speed, max_throttle, "
+            "max_thrust) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+def timed(function, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк запросов каталога прогонов")
+    parser.add_argument('--runs', type=int, default=100_000)
+    parser.add_argument('--engines', type=int, default=500)
+    parser.add_argument('--propellers', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'catalog.db')
+        with Catalog(path) as catalog:
+            start = time.perf_counter()
+            populate(catalog, args.runs, args.engines, args.propellers)
+            print(f"populate {args.runs} runs: {time.perf_counter() - start:.2f} s")
+
+        # Как при запуске TestApp: новое соединение, холодные кэши SQLite
+        start = time.perf_counter()
+        catalog = Catalog(path)
+        print(f"open: {(time.perf_counter() - start) * 1000:.2f} ms")
+        queries = {
+            'engine_names': catalog.engine_names,
+            'propeller_names': catalog.propeller_names,
+            'runs of prop on motor above 60%': lambda: catalog.find_runs('engine-0007', 'prop-0042', 60),
+            'runs of prop above 60%': lambda: catalog.find_runs(propeller='prop-0042', min_throttle=60),
+            'latest 20 runs': lambda: catalog.find_runs(limit=20),
+        }
+        for name, query in queries.items():
+            elapsed, result = timed(query)
+            print(f"{name:32s} {elapsed:8.3f} ms  ({len(result)} rows)")
+        catalog.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import csv
+import os
+import tempfile
+import time
+from console import ConsoleReader
+from sink import BatchWriter
+from eng_and_tenz import SerialReader, user_input
+
+
+class FakeTransport:
+    """Транспорт-заглушка: запоминает отправленные на ардуино команды"""
+    def __init__(self):
+        self.sent = []
+
+    def write(self, data):
+        self.sent.append(data)
+
+    def close(self):
+        pass
+
+
+async def produce(reader, rate, duration, period=0.001):
+    """Подает в SerialReader строки телеметрии с заданной частотой, как это делал бы драйвер порта"""
+    start = time.monotonic()
+    sent = 0
+    timestamp = 0
+    while True:
+        elapsed = time.monotonic() - start
+        if elapsed >= duration:
+            break
+        due = int(elapsed * rate)
+        chunk = ''.join(f"timestamp,{timestamp + i},speed,1250,weight,{i % 100}\n" for i in range(due - sent))
+        timestamp += due - sent
+        sent = due
+        reader.data_received(chunk.encode())
+        await asyncio.sleep(period)
+    return sent
+
+
+async def run(rate, duration):
+    read_fd, write_fd = os.pipe()
+    stdin = os.fdopen(read_fd, 'r')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, 'eng.log'), 'w') as log_file, \
+                open(os.path.join(tmp, 'eng.csv'), 'w', newline='') as csv_file:
+            with BatchWriter(log_file, csv.writer(csv_file), csv_file) as sink:
+                reader = SerialReader(sink)
+                transport = FakeTransport()
+                reader.connection_made(transport)
+
+                console = ConsoleReader(stdin)
+                input_task = asyncio.create_task(user_input(transport, reader, console))
+                producer = asyncio.create_task(produce(reader, rate, duration))
+
+                # Оператор думает над командой почти всё время теста, затем вводит скорость и остановку
+                await asyncio.sleep(duration * 0.8)
+                os.write(write_fd, b'5\n')
+                await asyncio.sleep(duration * 0.1)
+                os.write(write_fd, b'-\n')
+
+                sent = await producer
+                await input_task
+            written = sink.written_rows
+
+    os.close(write_fd)
+    stdin.close()
+    return sent, written, transport.sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка приема телеметрии во время ожидания ввода оператора")
+    parser.add_argument('--rate', type=int, default=50_000, help="Строк телеметрии в секунду")
+    parser.add_argument('--duration', type=float, default=2.0)
+    args = parser.parse_args()
+
+    expected = int(args.rate * args.duration)
+    sent, written, commands = asyncio.run(run(args.rate, args.duration))
+    print(f"expected {expected}, fed {sent}, written {written}, commands {commands}")
+
+    assert commands == [b'5\n', b'-\n'], commands
+    assert written == sent, "telemetry was lost while waiting for console input"
+    assert sent >= expected * 0.95, "telemetry stalled while waiting for console input"
+    print("OK: telemetry kept flowing at full rate while the prompt was open")
+
+
+if __name__ == "__main__":
+    main()
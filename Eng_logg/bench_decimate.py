@@ -0,0 +1,63 @@
+import argparse
+import os
+import tempfile
+import time
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+from decimate import minmax_decimate, DecimatedLine
+
+# Количество точек в записи
+sizes = [10_000, 100_000, 1_000_000, 10_000_000]
+
+
+def make_series(points):
+    rng = np.random.default_rng(0)
+    timestamps = np.arange(points, dtype=np.uint32)
+    speeds = (1000 + rng.integers(0, 250, points)).astype(np.int32)
+    # Одиночный выброс проверяет, что пики не теряются
+    speeds[points // 2] = 5000
+    return timestamps, speeds
+
+
+def export_png(path, timestamps, speeds, decimate):
+    """Экспорт как в plot_graph: с прореживанием или по старой схеме со всеми точками"""
+    start = time.perf_counter()
+    plt.figure(figsize=(10, 6))
+    if decimate:
+        line = DecimatedLine(plt.gca(), timestamps, speeds, label='Speed', color='b', marker='o').line
+    else:
+        (line,) = plt.plot(timestamps, speeds, label='Speed', color='b', marker='o')
+    plt.legend()
+    plt.grid(True)
+    plt.savefig(path)
+    plt.close()
+    return time.perf_counter() - start, len(line.get_xdata()), max(line.get_ydata())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк прореживания графиков")
+    parser.add_argument('--legacy-limit', type=int, default=1_000_000,
+                        help="Максимальный размер записи для экспорта без прореживания")
+    args = parser.parse_args()
+
+    # PNG пишется во временный каталог, а не в рабочий, где лежат графики прогонов
+    with tempfile.TemporaryDirectory() as tmp:
+        png_path = os.path.join(tmp, 'bench_decimate.png')
+        for points in sizes:
+            timestamps, speeds = make_series(points)
+            start = time.perf_counter()
+            minmax_decimate(timestamps, speeds, 1000)
+            decimate_time = time.perf_counter() - start
+
+            elapsed, drawn, peak = export_png(png_path, timestamps, speeds, True)
+            line = (f"{points:9d} points  decimate {decimate_time * 1000:7.1f} ms  "
+                    f"png {elapsed * 1000:8.1f} ms ({drawn} points, peak {peak})")
+            if points <= args.legacy_limit:
+                legacy, _, _ = export_png(png_path, timestamps, speeds, False)
+                line += f"  legacy png {legacy * 1000:9.1f} ms"
+            print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import time
+import numpy as np
+from dsp import Biquad, Calibration, FilterChain, LowPass, MovingMedian, load_cell_chain
+
+
+def load_cell_signal(samples, seed=1):
+    """Вес на ступенях газа: ступени по 5000 отсчетов, гауссов шум и редкие выбросы АЦП"""
+    rng = np.random.default_rng(seed)
+    steps = (np.arange(samples) // 5000) % 9 * 350 + 8400
+    noise = rng.normal(0, 12, samples)
+    spikes = np.where(rng.random(samples) < 0.001, rng.choice([-3000, 3000], samples), 0)
+    return (steps + noise + spikes).astype(np.int32), steps
+
+
+def chains():
+    """Проверяемые цепочки; каждый вызов дает новые цепочки с начальным состоянием"""
+    return {
+        'calibration': FilterChain([Calibration(8400, 0.0981, 'N')]),
+        'median 5': FilterChain([MovingMedian(5)]),
+        'median 15': FilterChain([MovingMedian(15)]),
+        'low-pass': FilterChain([LowPass(0.2)]),
+        'biquad': FilterChain([Biquad.lowpass(20, 500)]),
+        'load cell': load_cell_chain(8400, 0.0981, median_window=5, lowpass_alpha=0.2, unit='N'),
+    }
+
+
+def split(values, rng, max_chunk):
+    """Куски случайной длины от 1 до max_chunk, как пачки из data_received и BatchWriter"""
+    cuts = np.cumsum(rng.integers(1, max_chunk + 1, len(values) // max(1, max_chunk // 2) + 1))
+    return np.split(values, cuts[cuts < len(values)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обработка канала веса: скорость и совпадение с обработкой целиком")
+    parser.add_argument('--samples', type=int, default=2_000_000)
+    parser.add_argument('--max-chunk', type=int, default=600, help="Наибольший размер куска потока")
+    args = parser.parse_args()
+
+    raw, clean = load_cell_signal(args.samples)
+    chunks = split(raw, np.random.default_rng(2), args.max_chunk)
+    print(f"{args.samples} samples, {len(chunks)} chunks of 1-{args.max_chunk}")
+
+    offline_chains = chains()
+    for name, streaming in chains().items():
+        start = time.perf_counter()
+        offline = offline_chains[name].process(raw)
+        whole = time.perf_counter() - start
+        start = time.perf_counter()
+        streamed = np.concatenate([streaming.process(chunk) for chunk in chunks])
+        chunked = time.perf_counter() - start
+        # Сравнение побитовое: одинаковы и значения, и их представление float64
+        exact = np.array_equal(offline.view(np.int64), streamed.view(np.int64))
+        print(f"{name:12s} offline {args.samples / whole / 1e6:6.2f} M/s  streaming {args.samples / chunked / 1e6:6.2f} "
+              f"M/s  bit-exact {exact}")
+        if not exact:
+            raise AssertionError(f"{name}: streaming result differs from offline processing")
+
+    filtered = load_cell_chain(median_window=5, lowpass_alpha=0.2).process(raw)
+    # Медиана 5 и ФНЧ запаздывают; ошибка считается по установившимся участкам ступеней
+    settled = (np.arange(args.samples) % 5000) > 100
+    print(f"error vs true steps: raw std {np.std((raw - clean)[settled]):.1f}, "
+          f"max {np.max(np.abs(raw - clean)[settled]):.0f}; filtered std {np.std((filtered - clean)[settled]):.1f}, "
+          f"max {np.max(np.abs(filtered - clean)[settled]):.0f}")
+
+
+if __name__ == "__main__":
+    main()
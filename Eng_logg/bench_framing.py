@@ -0,0 +1,80 @@
+import argparse
+import time
+from framing import LineFramer
+
+# Файл с записанным трафиком ардуино
+log_file_name = 'eng.log'
+
+# Частоты поступления строк (строк в секунду) и период чтения порта
+rates = [10_000, 100_000, 1_000_000]
+read_period = 0.001
+
+
+def load_traffic(path, lines_count):
+    """
+    Собирает поток байт нужной длины, повторяя записанный лог
+    :param path: Путь к записанному логу
+    :param lines_count: Количество строк в потоке
+    :return: Байты потока
+    """
+    with open(path, 'rb') as f:
+        lines = [line.rstrip(b'\r\n') + b'\n' for line in f if line.strip()]
+    repeats = lines_count // len(lines) + 1
+    return b''.join((lines * repeats)[:lines_count])
+
+
+def split_chunks(stream, chunk_size):
+    """Нарезает поток на порции фиксированного размера, как их отдаёт драйвер порта"""
+    return [stream[i:i + chunk_size] for i in range(0, len(stream), chunk_size)]
+
+
+def legacy_feed(chunks):
+    """Старая реализация: конкатенация строк и split('\\n', 1) на каждую строку"""
+    buffer = ''
+    count = 0
+    for data in chunks:
+        buffer += data.decode('utf-8')
+        while '\n' in buffer:
+            line, buffer = buffer.split('\n', 1)
+            if line.strip():
+                count += 1
+    return count
+
+
+def framer_feed(chunks):
+    framer = LineFramer()
+    count = 0
+    for data in chunks:
+        count += len(framer.feed(data))
+    return count
+
+
+def measure(func, chunks):
+    start = time.perf_counter()
+    count = func(chunks)
+    return count, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк нарезки потока на строки")
+    parser.add_argument('--log', default=log_file_name)
+    parser.add_argument('--seconds', type=float, default=1.0, help="Длительность моделируемого трафика")
+    args = parser.parse_args()
+
+    for rate in rates:
+        lines_count = int(rate * args.seconds)
+        stream = load_traffic(args.log, lines_count)
+        avg_line = len(stream) / stream.count(b'\n')
+        chunk_size = max(1, int(rate * read_period * avg_line))
+        chunks = split_chunks(stream, chunk_size)
+
+        print(f"{rate} lines/s, chunk {chunk_size} bytes:")
+        for name, func in (("legacy", legacy_feed), ("framer", framer_feed)):
+            count, elapsed = measure(func, chunks)
+            # Доля времени реального трафика, которую занимает разбор
+            load = elapsed / args.seconds * 100
+            print(f"  {name:7s} {count / elapsed:12.0f} lines/s  {elapsed * 1000:8.1f} ms  load {load:6.1f}%")
+
+
+if __name__ == "__main__":
+    main()
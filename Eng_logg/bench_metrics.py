@@ -0,0 +1,117 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+import urllib.request
+from metrics import Metrics, Histogram, serve_prometheus
+from eng_and_tenz import SerialReader
+
+
+class NullSink:
+    """Приемник без записи на диск: измеряется только тракт чтения и разбора"""
+    def submit(self, lines, rows=()):
+        return True
+
+
+class FakeTransport:
+    def close(self):
+        pass
+
+
+def make_chunks(lines, chunk_lines, gap_every=None):
+    """Пачки строк телеметрии, как их отдает драйвер порта; gap_every - пропуск отсчетов через каждые N строк"""
+    chunks = []
+    timestamp = 0
+    for start in range(0, lines, chunk_lines):
+        text = []
+        for i in range(start, min(lines, start + chunk_lines)):
+            timestamp += 1 if gap_every is None or i % gap_every else 50
+            text.append(f"timestamp,{timestamp},speed,1250,weight,{i % 100}\n")
+        chunks.append(''.join(text).encode())
+    return chunks
+
+
+async def feed_reader(chunks, metrics):
+    # RunEvents создает futures, поэтому читатель создается внутри цикла событий
+    reader = SerialReader(NullSink(), metrics)
+    reader.connection_made(FakeTransport())
+    start = time.perf_counter()
+    for chunk in chunks:
+        reader.data_received(chunk)
+    return time.perf_counter() - start
+
+
+def run_reader(chunks, metrics):
+    # Сообщения читателя о подключении не нужны в выводе замера
+    with contextlib.redirect_stdout(io.StringIO()):
+        return asyncio.run(feed_reader(chunks, metrics))
+
+
+def on_batch_cost(lines, chunk_lines, repeat):
+    """Время Metrics.on_batch на пачку (нс) без остального тракта; лучшее из повторов, каждый с новыми метриками"""
+    batches = [[[start + i, 1250, i % 100] for i in range(min(chunk_lines, lines - start))]
+               for start in range(0, lines, chunk_lines)]
+    received = time.monotonic_ns()
+    best = float('inf')
+    for _ in range(repeat):
+        metrics = Metrics()
+        on_batch = metrics.on_batch
+        start = time.perf_counter()
+        for rows in batches:
+            on_batch(len(rows) * 40, len(rows), rows, received)
+        best = min(best, time.perf_counter() - start)
+    return best / len(batches) * 1e9
+
+
+async def fetch_prometheus(metrics, port):
+    task = asyncio.create_task(serve_prometheus(metrics.prometheus_text, port=port))
+    await asyncio.sleep(0.1)
+    loop = asyncio.get_running_loop()
+    text = await loop.run_in_executor(None, lambda: urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics").read())
+    task.cancel()
+    return text.decode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Накладные расходы инструментирования тракта чтения")
+    parser.add_argument('--lines', type=int, default=500_000)
+    parser.add_argument('--chunk-lines', type=int, nargs='+', default=[4, 16, 64])
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--port', type=int, default=9108)
+    args = parser.parse_args()
+
+    for chunk_lines in args.chunk_lines:
+        chunks = make_chunks(args.lines, chunk_lines)
+        # Лучшее из нескольких повторов, чередуя варианты, чтобы шум машины влиял на оба одинаково
+        plain = instrumented = float('inf')
+        for _ in range(args.repeat):
+            plain = min(plain, run_reader(chunks, None))
+            instrumented = min(instrumented, run_reader(chunks, Metrics()))
+        # Разность двух замеров пропускной способности тонет в шуме машины; стоимость on_batch измеряется отдельно
+        # и сравнивается со временем пачки без инструментирования
+        cost = on_batch_cost(args.lines, chunk_lines, args.repeat)
+        per_batch = plain / len(chunks) * 1e9
+        print(f"{chunk_lines:3d} lines/batch  plain {args.lines / plain:9.0f} lines/s  "
+              f"instrumented {args.lines / instrumented:9.0f} lines/s  on_batch {cost:6.0f} ns/batch = "
+              f"{cost / per_batch * 100:5.2f}% of {per_batch / 1000:.1f} us")
+
+    start = time.perf_counter()
+    histogram = Histogram()
+    for value in range(1_000_000):
+        histogram.record(value * 37)
+    print(f"histogram record: {(time.perf_counter() - start) * 1000:.0f} ns/value, "
+          f"p50 {histogram.percentile(50)} (exact {500_000 * 37}), p99 {histogram.percentile(99)} (exact {990_000 * 37})")
+
+    metrics = Metrics()
+    run_reader(make_chunks(10_000, 16, gap_every=1000), metrics)
+    sequence = metrics.sequence
+    print(f"gap detection: {sequence.gaps} gaps found (expected 9), max {sequence.max_gap_ms} ms")
+    print(metrics.stats_line())
+
+    text = asyncio.run(fetch_prometheus(metrics, args.port))
+    print(f"prometheus endpoint: {len(text.splitlines())} lines, e.g. {text.splitlines()[1]}")
+
+
+if __name__ == "__main__":
+    main()
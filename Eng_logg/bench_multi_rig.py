@@ -0,0 +1,57 @@
+import argparse
+import asyncio
+import multiprocessing
+import tempfile
+import time
+import multi_rig
+from simulator import ArduinoSimulator
+
+
+def run_simulators(simulators, result):
+    async def serve_all():
+        await asyncio.gather(*(simulator.serve(sessions=1) for simulator in simulators))
+    asyncio.run(serve_all())
+    result.extend([simulator.sent_lines for simulator in simulators])
+
+
+def bench(rigs_count, rate, duration):
+    simulators = [ArduinoSimulator(rate=rate, duration=duration) for _ in range(rigs_count)]
+    ports = [simulator.port for simulator in simulators]
+
+    # Симуляторы работают в отдельном процессе, чтобы измерять загрузку только логгера
+    manager = multiprocessing.Manager()
+    sent = manager.list()
+    devices = multiprocessing.get_context('fork').Process(target=run_simulators, args=(simulators, sent))
+    devices.start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        wall = time.monotonic()
+        cpu = time.process_time()
+        rigs = asyncio.run(multi_rig.run_rigs(ports, tmp, interval=None))
+        cpu = time.process_time() - cpu
+        wall = time.monotonic() - wall
+    devices.join()
+
+    for simulator in simulators:
+        simulator.close()
+
+    received = sum(rig.reader.rows for rig in rigs if rig.reader)
+    failed = [rig for rig in rigs if rig.error is not None]
+    print(f"{rigs_count:4d} rigs  sent {sum(sent):9d}  received {received:9d}  "
+          f"{received / wall:10.0f} rows/s  cpu {cpu / wall * 100:5.1f}%  failed {len(failed)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк одновременной записи стендов на симуляторах ардуино")
+    parser.add_argument('--rigs', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--rate', type=int, default=1000, help="Строк в секунду на стенд")
+    parser.add_argument('--duration', type=float, default=3.0)
+    args = parser.parse_args()
+
+    multi_rig.start_prompt_timeout = 5
+    for rigs_count in args.rigs:
+        bench(rigs_count, args.rate, args.duration)
+
+
+if __name__ == "__main__":
+    main()
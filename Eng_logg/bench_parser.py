@@ -0,0 +1,63 @@
+import argparse
+import time
+from telemetry import TelemetryParser
+from binary_protocol import TelemetryDecoder, encode_frame
+
+# Требуемая производительность разбора на одном ядре
+target_rate = 200_000
+
+
+def synthesize_lines(count, with_weight=True):
+    """Генерирует строки телеметрии в формате скетча"""
+    if with_weight:
+        return [f"timestamp,{i},speed,{1000 + i % 1000},weight,{i % 5000}" for i in range(count)]
+    return [f"timestamp,{i},speed,{1000 + i % 1000}" for i in range(count)]
+
+
+def legacy_parse(lines):
+    """Старая реализация из логгеров"""
+    rows = []
+    for line in lines:
+        if line.startswith("timestamp"):
+            parts = line.split(',')
+            rows.append([int(parts[1]), int(parts[3]), int(parts[5])])
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора строк телеметрии")
+    parser.add_argument('--lines', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    for layout, with_weight in (("speed+weight", True), ("speed", False)):
+        lines = synthesize_lines(args.lines, with_weight)
+        telemetry_parser = TelemetryParser()
+        start = time.perf_counter()
+        records = telemetry_parser.parse_lines(lines)
+        elapsed = time.perf_counter() - start
+        rate = len(records) / elapsed
+        status = "OK" if rate >= target_rate else "SLOW"
+        print(f"{layout:13s} {rate:12.0f} lines/s  malformed {telemetry_parser.malformed}  {status}")
+
+    lines = synthesize_lines(args.lines)
+    start = time.perf_counter()
+    legacy_parse(lines)
+    elapsed = time.perf_counter() - start
+    print(f"{'legacy':13s} {args.lines / elapsed:12.0f} lines/s")
+
+    # Двоичные кадры: сравниваем объём на линии и скорость разбора с текстом
+    text_stream = ''.join(line + '\n' for line in lines).encode()
+    binary_stream = b''.join(encode_frame(i, 1000 + i % 1000, i % 5000) for i in range(args.lines))
+    for name, stream in (("text", text_stream), ("binary", binary_stream)):
+        decoder = TelemetryDecoder()
+        chunk = 4096
+        start = time.perf_counter()
+        count = 0
+        for i in range(0, len(stream), chunk):
+            count += len(decoder.feed(stream[i:i + chunk]))
+        elapsed = time.perf_counter() - start
+        print(f"{name:13s} {count / elapsed:12.0f} samples/s  {len(stream) / args.lines:5.1f} bytes/sample")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import time
+from connection import SerialConnection
+from eng__control import SerialReader
+from profiles import ProfileRunner, Setpoint, run_schedule
+from simulator import ArduinoSimulator
+from bench_metrics import NullSink
+
+
+def make_schedule(commands, interval):
+    """Чередование уставок 30% и 60% с постоянным шагом, остановка в конце"""
+    schedule = [Setpoint(i * interval, '3' if i % 2 else '6', 30 if i % 2 else 60, 'bench') for i in range(commands)]
+    schedule.append(Setpoint(commands * interval, '-', 0, None))
+    return schedule
+
+
+async def busy_loop(stop, load):
+    """Имитация разбора телеметрии: цикл событий занят load секунд из каждых 10 мс"""
+    while not stop.is_set():
+        end = time.perf_counter() + load
+        while time.perf_counter() < end:
+            pass
+        await asyncio.sleep(0.01 - load)
+
+
+async def relative_schedule(schedule, send):
+    """Наивный планировщик: пауза от предыдущей отправки, опоздания накапливаются"""
+    previous = 0.0
+    for point in schedule:
+        await asyncio.sleep(point.offset - previous)
+        previous = point.offset
+        send(point)
+
+
+async def drift(scheduler, schedule, load):
+    """Отставание последней команды от расписания при загруженном цикле событий (мс)"""
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    busy = asyncio.create_task(busy_loop(stop, load))
+    sent = []
+    start = loop.time()
+    await scheduler(schedule, lambda point: sent.append(loop.time() - start))
+    stop.set()
+    await busy
+    return (sent[-1] - schedule[-1].offset) * 1000
+
+
+def serve(simulator):
+    asyncio.run(simulator.serve(sessions=1))
+
+
+async def run_device(port, schedule):
+    reader = SerialReader(NullSink())
+    connection = SerialConnection(port, 115200, reader)
+    await connection.open()
+    try:
+        await reader.events.wait('ready', 5)
+        runner = ProfileRunner(connection, reader, echo=False)
+        summary = await runner.run(schedule)
+        await reader.events.wait('complete', 5)
+    finally:
+        connection.close()
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Точность отправки профилей и подтверждения команд")
+    parser.add_argument('--commands', type=int, default=200)
+    parser.add_argument('--interval', type=float, default=0.02, help="Шаг уставок (с)")
+    parser.add_argument('--load', type=float, default=0.004, help="Занятость цикла событий из каждых 10 мс (с)")
+    args = parser.parse_args()
+
+    schedule = make_schedule(args.commands, args.interval)
+    for name, scheduler in (("relative sleep", relative_schedule), ("absolute deadlines", run_schedule)):
+        print(f"{name:18s} last command {asyncio.run(drift(scheduler, schedule, args.load)):7.1f} ms behind "
+              f"schedule after {schedule[-1].offset:.1f} s")
+
+    # Ардуино-симулятор в отдельном процессе, эхо команд как у скетча
+    simulator = ArduinoSimulator(rate=500, duration=60)
+    device = multiprocessing.get_context('fork').Process(target=serve, args=(simulator,))
+    device.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        summary = asyncio.run(run_device(simulator.port, schedule))
+    device.join(5)
+    simulator.close()
+    print(f"device: sent {summary['sent']}  acked {summary['acked']}  missing {summary['missing_acks']}  "
+          f"lateness p50/p99/max {summary['lateness_ms'][50]:.2f}/{summary['lateness_ms'][99]:.2f}/"
+          f"{summary['lateness_ms']['max']:.2f} ms  ack p50/p99 {summary['ack_latency_ms'][50]:.2f}/"
+          f"{summary['ack_latency_ms'][99]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
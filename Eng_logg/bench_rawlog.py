@@ -0,0 +1,96 @@
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from sink import BatchWriter
+from rawlog import CODECS, CompressedLog, RawLogReader, line_timestamp, rawlog_files
+
+# Строк в одной порции data_received
+chunk_lines = 16
+
+
+def soak_lines(count, seed=1):
+    """Лог длительного теста: телеметрия каждые 2 мс, ступени скорости, шум тензодатчика, редкие команды"""
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(-15, 16, count)
+    lines = []
+    for i in range(count):
+        step = (i // 5000) % 9 + 1
+        if i % 5000 == 0:
+            lines.append(f"Received command: {step}")
+            lines.append(f"Speed set to {1000 + step * 100}")
+        lines.append(f"timestamp,{i * 2},speed,{1000 + step * 100},weight,{step * 350 + noise[i]}")
+    return lines
+
+
+def write_log(log_file, lines):
+    """
+    Запись через BatchWriter порциями, как из data_received
+    :return: Время submit порции в цикле событий (нс, массив) и полное время записи (с)
+    """
+    chunks = [lines[i:i + chunk_lines] for i in range(0, len(lines), chunk_lines)]
+    submit = np.empty(len(chunks), dtype=np.int64)
+    start = time.perf_counter()
+    with BatchWriter(log_file, max_queue=len(chunks) + 1) as sink:
+        for i, chunk in enumerate(chunks):
+            before = time.perf_counter_ns()
+            sink.submit(chunk)
+            submit[i] = time.perf_counter_ns() - before
+    log_file.close()
+    return submit, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сжатый сырой лог: размер, запись, выборка по времени")
+    parser.add_argument('--lines', type=int, default=1_000_000)
+    parser.add_argument('--window', type=int, default=1000, help="Ширина выборки (мс ардуино)")
+    args = parser.parse_args()
+
+    lines = soak_lines(args.lines)
+    with tempfile.TemporaryDirectory() as tmp:
+        plain_path = os.path.join(tmp, 'eng.log')
+        submit, seconds = write_log(open(plain_path, 'w'), lines)
+        plain = os.path.getsize(plain_path)
+        print(f"text     {plain / 1e6:8.1f} MB  write {len(lines) / seconds:10.0f} lines/s  "
+              f"submit p99 {np.percentile(submit, 99) / 1000:.1f} us")
+
+        for codec in CODECS:
+            path = os.path.join(tmp, f'{codec}.log')
+            log_path, _ = rawlog_files(path)
+            submit, seconds = write_log(CompressedLog(log_path, codec), lines)
+            size = os.path.getsize(log_path)
+            print(f"{codec:8s} {size / 1e6:8.1f} MB  write {len(lines) / seconds:10.0f} lines/s  "
+                  f"submit p99 {np.percentile(submit, 99) / 1000:.1f} us  ratio {plain / size:.1f}x")
+
+            # Выборка окна из середины теста против распаковки всего лога
+            middle = len(lines)   # Метки времени идут через 2 мс, середина - len(lines) мс
+            start, stop = middle, middle + args.window
+            with RawLogReader(log_path) as reader:
+                before = time.perf_counter()
+                window = reader.read_range(start, stop)
+                seek = time.perf_counter() - before
+                blocks = reader.blocks_read
+                before = time.perf_counter()
+                full = list(reader.iter_lines())
+                scan = time.perf_counter() - before
+            assert full == lines, "decompressed log differs from the source"
+            expected = [line for line in lines if start <= (line_timestamp(line) or -1) <= stop]
+            assert [line for line in window if line_timestamp(line) is not None] == expected
+            print(f"{'':8s} {args.window} ms window: {len(window)} lines from {blocks}/{len(reader.blocks)} blocks "
+                  f"in {seek * 1000:.2f} ms  (full decompress {scan * 1000:.0f} ms)")
+
+        # Недописанный блок после сбоя отрезается, лог продолжается
+        log_path, _ = rawlog_files(os.path.join(tmp, 'zlib.log'))
+        with open(log_path, 'ab') as f:
+            f.write(b'RLB1\x00\x01\x02')
+        with CompressedLog(log_path) as log:
+            repaired = log.repaired_bytes
+            log.write("timestamp,999999999,speed,1000,weight,0\n")
+        with RawLogReader(log_path) as reader:
+            count = sum(1 for _ in reader.iter_lines())
+        print(f"torn block: {repaired} bytes cut, {count} lines readable after resume")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import argparse
+import os
+import tempfile
+import time
+from capture import SPEED_WEIGHT_HOST_COLUMNS
+from segments import SegmentedCaptureWriter
+from render import find_captures, render_all
+
+
+def make_archive(root, runs, rows):
+    """Архив прогонов как после eng_and_tenz.py: runs/<время>/eng_capture с сегментами"""
+    for run in range(runs):
+        directory = os.path.join(root, f"20240101-{run:06d}", 'eng_capture')
+        with SegmentedCaptureWriter(directory, SPEED_WEIGHT_HOST_COLUMNS) as capture:
+            for start in range(0, rows, 4096):
+                # Ступени скорости по 1000 строк, как в runMotorTest()
+                capture.append([[i, 1000 + (i // 1000) % 10 * 50, (i // 1000) % 10 * 40 + i % 7, i * 1000, i * 1000]
+                                for i in range(start, min(rows, start + 4096))])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетное построение графиков архивных прогонов")
+    parser.add_argument('--runs', type=int, default=16)
+    parser.add_argument('--rows', type=int, default=100_000, help="Строк в одном прогоне")
+    parser.add_argument('--workers', type=int, nargs='+', help="Количество процессов, по умолчанию 1 и все ядра")
+    args = parser.parse_args()
+    workers = args.workers or sorted({1, os.cpu_count() or 1})
+
+    with tempfile.TemporaryDirectory() as root:
+        make_archive(root, args.runs, args.rows)
+        captures = find_captures(root)
+        print(f"{len(captures)} runs x {args.rows} rows, {os.cpu_count()} cores")
+
+        single = None
+        for count in workers:
+            stats = render_all(captures, count, force=True)
+            single = single or stats['seconds']
+            print(f"{count:3d} workers: {stats['rendered'] / stats['seconds']:6.2f} runs/s  "
+                  f"{stats['rows'] / stats['seconds']:10.0f} rows/s  speedup {single / stats['seconds']:.2f}x")
+
+        stats = render_all(captures, workers[-1])
+        print(f"unchanged archive: {stats['skipped']} up to date, {stats['rendered']} rendered "
+              f"in {stats['seconds'] * 1000:.0f} ms")
+
+        # Дописанный прогон новее своих графиков и перестраивается один
+        changed = captures[len(captures) // 2]
+        time.sleep(0.01)
+        with SegmentedCaptureWriter(changed, SPEED_WEIGHT_HOST_COLUMNS) as capture:
+            capture.append([[args.rows, 1000, 0, 0, 0]])
+        stats = render_all(captures, workers[-1])
+        print(f"one run changed: {stats['rendered']} rendered, {stats['skipped']} up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from capture import CaptureWriter, load_capture
+from segments import SegmentedCaptureWriter, iter_segment_chunks, list_segments, read_index, read_range, repair_text
+
+# Процесс, который пишет запись пачками, пока его не убьют
+WRITER_SCRIPT = """
+import sys
+from segments import SegmentedCaptureWriter
+directory, max_bytes = sys.argv[1], int(sys.argv[2])
+writer = SegmentedCaptureWriter(directory, max_bytes=max_bytes)
+timestamp = writer.rows
+print(writer.rows, flush=True)
+while True:
+    rows = [[timestamp + i, 1000 + (timestamp + i) % 1000, (timestamp + i) % 5000] for i in range(16)]
+    writer.append(rows)
+    writer.flush()
+    timestamp += 16
+"""
+
+
+def make_rows(start, count):
+    return [[i, 1000 + i % 1000, i % 5000] for i in range(start, start + count)]
+
+
+def check_series(directory):
+    """Проверяет, что все сегменты читаются как один непрерывный ряд: метки 0, 1, 2, ... без пропусков"""
+    expected = 0
+    for chunk in iter_segment_chunks(directory, chunk_rows=100_000):
+        timestamps = chunk['timestamp']
+        if not np.array_equal(timestamps, np.arange(expected, expected + len(timestamps))):
+            raise AssertionError(f"series broken near row {expected}")
+        expected += len(timestamps)
+    return expected
+
+
+def bench_write(directory, rows, max_bytes):
+    batches = [rows[i:i + 512] for i in range(0, len(rows), 512)]
+    start = time.perf_counter()
+    with CaptureWriter(os.path.join(directory, 'single.cap')) as capture:
+        for batch in batches:
+            capture.append(batch)
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with SegmentedCaptureWriter(os.path.join(directory, 'segmented'), max_bytes=max_bytes) as capture:
+        for batch in batches:
+            capture.append(batch)
+    segmented = time.perf_counter() - start
+    return single, segmented, capture.segment
+
+
+def crash_and_resume(directory, kills, max_bytes):
+    """Убивает пишущий процесс kill -9 в случайный момент и продолжает запись, kills раз подряд"""
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    for _ in range(kills):
+        process = subprocess.Popen([sys.executable, '-c', WRITER_SCRIPT, directory, str(max_bytes)],
+                                   stdout=subprocess.PIPE, text=True, env=env)
+        process.stdout.readline()
+        time.sleep(0.2 + np.random.default_rng().random() * 0.3)
+        process.kill()
+        process.wait()
+        process.stdout.close()
+
+    # Буферизованная запись редко рвется посреди строки, поэтому недописанная строка добавляется явно
+    with open(list_segments(directory)[-1], 'ab') as f:
+        f.write(b'\x01\x02\x03\x04\x05')
+    # Продолжение после последнего сбоя: недописанная строка отрезается, запись продолжается в тот же прогон
+    with SegmentedCaptureWriter(directory, max_bytes=max_bytes) as writer:
+        repaired = writer.repaired_bytes
+        writer.append(make_rows(writer.rows, 1000))
+    return repaired
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сегментированная запись: смена сегментов, сбои, чтение")
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--segment-bytes', type=int, default=4 << 20)
+    parser.add_argument('--kills', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = make_rows(0, args.rows)
+        single, segmented, segments = bench_write(tmp, rows, args.segment_bytes)
+        print(f"write {args.rows} rows: single file {args.rows / single:10.0f} rows/s  "
+              f"segmented {args.rows / segmented:10.0f} rows/s  ({segments} segments)")
+
+        directory = os.path.join(tmp, 'segmented')
+        start = time.perf_counter()
+        count = check_series(directory)
+        print(f"stream all segments: {count} rows in {(time.perf_counter() - start) * 1000:.1f} ms, continuous")
+
+        middle = args.rows // 2
+        start = time.perf_counter()
+        window = read_range(directory, middle, middle + 999)
+        indexed = time.perf_counter() - start
+        start = time.perf_counter()
+        data = np.concatenate(list(iter_segment_chunks(directory)))
+        full = data[(data['timestamp'] >= middle) & (data['timestamp'] <= middle + 999)]
+        scanned = time.perf_counter() - start
+        assert np.array_equal(window, full)
+        print(f"read 1000-row window: indexed {indexed * 1000:.2f} ms  full scan {scanned * 1000:.1f} ms")
+
+        crashed = os.path.join(tmp, 'crashed')
+        repaired = crash_and_resume(crashed, args.kills, args.segment_bytes)
+        count = check_series(crashed)
+        open_segments = [path for path in list_segments(crashed) if read_index(path) is None]
+        run_ids = {read_index(path)['run_id'] for path in list_segments(crashed)}
+        print(f"{args.kills} kills: {count} rows continuous, {len(list_segments(crashed))} segments, "
+              f"{len(run_ids)} run id, {len(open_segments)} unindexed, last torn record {repaired} bytes repaired")
+
+        # Сброс ардуино по DTR посреди пачки и после перезапуска логгера: millis() начинается с нуля
+        rebooted = os.path.join(tmp, 'rebooted')
+        with SegmentedCaptureWriter(rebooted) as writer:
+            writer.append([[i, 1000, 0] for i in range(5000, 5100)] + [[i, 1000, 0] for i in range(50)])
+        with SegmentedCaptureWriter(rebooted) as writer:
+            writer.append([[i, 1000, 0] for i in range(10)])
+        indexes = [read_index(path) for path in list_segments(rebooted)]
+        assert all(np.all(np.diff(load_capture(path)[1]['timestamp'].astype(np.int64)) > 0)
+                   for path in list_segments(rebooted))
+        assert len(read_range(rebooted, 0, 9)) == 20
+        print(f"2 resets: {len(indexes)} monotonic segments, boots {[index['boot'] for index in indexes]}")
+
+        csv_path = os.path.join(tmp, 'eng.csv')
+        with open(csv_path, 'w') as f:
+            f.write("Timestamp,Speed,Weight\n1,1000,5\n2,1000,6\n3,10")
+        removed = repair_text(csv_path)
+        with open(csv_path) as f:
+            print(f"torn CSV: {removed} bytes removed, {len(f.read().splitlines())} lines kept")
+
+
+if __name__ == "__main__":
+    main()
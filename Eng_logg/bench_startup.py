@@ -0,0 +1,121 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Модули запуска: запись должна начинаться через ~100 мс после старта, импорт не должен съедать это время
+eng_logg_dir = os.path.dirname(os.path.abspath(__file__))
+gui_dir = os.path.join(eng_logg_dir, os.pardir, 'Propeller_GUI')
+startup_modules = (
+    ('logger', eng_logg_dir),
+    ('eng__control', eng_logg_dir),
+    ('eng_and_tenz', eng_logg_dir),
+    ('multi_rig', eng_logg_dir),
+    ('main', gui_dir),
+)
+# Допустимое суммарное время импорта модуля (мс) и время до первой отрисовки окна интерфейса (мс)
+import_budget_ms = 100
+paint_budget_ms = 300
+
+# Окно интерфейса создается и отрисовывается, после чего процесс завершается
+PAINT_SCRIPT = """
+import main
+app = main.TestApp()
+app.update()
+print('painted', flush=True)
+app.destroy()
+"""
+
+
+def import_times(module, directory):
+    """
+    Разбирает вывод python -X importtime для импорта одного модуля
+    :return: Суммарное время импорта модуля (мс) и список (собственное время мс, имя) всех импортов
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=directory,
+                            capture_output=True, text=True)
+    if result.returncode:
+        raise ImportError(result.stderr.strip().splitlines()[-1])
+    total = None
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((int(self_us) / 1000, name.strip()))
+        if name.strip() == module:
+            total = int(cumulative_us) / 1000
+    return total, modules
+
+
+def wall_time(code, directory, repeat):
+    """Лучшее время запуска интерпретатора с выполнением code (мс)"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=directory, check=True, capture_output=True)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def first_paint(repeat):
+    """Время от запуска процесса до отрисованного окна интерфейса (мс)"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, '-c', PAINT_SCRIPT], cwd=gui_dir, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, text=True)
+        line = process.stdout.readline()
+        elapsed = (time.perf_counter() - start) * 1000
+        _, error = process.communicate()
+        if line.strip() != 'painted':
+            raise RuntimeError(error.strip().splitlines()[-1] if error.strip() else "window was not painted")
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время импорта и запуска логгеров и интерфейса")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=5, help="Сколько самых тяжелых импортов показать")
+    parser.add_argument('--budget', type=float, default=import_budget_ms, help="Бюджет импорта (мс)")
+    args = parser.parse_args()
+
+    interpreter = wall_time('pass', eng_logg_dir, args.repeat)
+    print(f"interpreter startup {interpreter:.1f} ms (subtracted from wall time below)")
+    over_budget = []
+    for module, directory in startup_modules:
+        try:
+            total, modules = import_times(module, directory)
+        except ImportError as e:
+            print(f"{module:14s} skipped: {e}")
+            continue
+        wall = wall_time(f'import {module}', directory, args.repeat) - interpreter
+        status = 'ok' if total <= args.budget else 'OVER BUDGET'
+        heaviest = ', '.join(f"{name} {ms:.1f}" for ms, name in sorted(modules, reverse=True)[:args.top])
+        print(f"{module:14s} import {total:6.1f} ms  wall {wall:6.1f} ms  {status}  heaviest: {heaviest}")
+        if total > args.budget:
+            over_budget.append(module)
+
+    if os.environ.get('DISPLAY') or sys.platform in ('win32', 'darwin'):
+        try:
+            paint = first_paint(args.repeat)
+        except RuntimeError as e:
+            print(f"first paint skipped: {e}")
+        else:
+            status = 'ok' if paint <= paint_budget_ms else 'OVER BUDGET'
+            print(f"GUI first paint {paint:.1f} ms  {status}")
+            if paint > paint_budget_ms:
+                over_budget.append('first paint')
+    else:
+        print("first paint skipped: no display")
+
+    if over_budget:
+        print(f"over budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from functools import partial
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+from framing import LineFramer
+from binary_protocol import TelemetryDecoder
+from sink import BatchWriter
+from capture import CaptureWriter, SPEED_WEIGHT_HOST_COLUMNS
+from segments import SegmentedCaptureWriter
+from bench_framing import load_traffic, split_chunks
+from bench_metrics import run_reader
+import eng_and_tenz
+
+# Бенчмарк кадра графиков лежит рядом с интерфейсом
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Propeller_GUI'))
+from bench_live_plot import bench_live  # noqa: E402
+
+# Наборы размеров входных данных (строк телеметрии)
+sizes = {'small': 10_000, 'medium': 100_000, 'large': 1_000_000}
+default_sizes = ('small', 'medium')
+
+# Записанный трафик ардуино и размер порции, которую отдает драйвер порта (байт)
+log_file_name = 'eng.log'
+chunk_size = 256
+# Строк в одной порции, переданной в BatchWriter
+submit_lines = 16
+
+results_file_name = 'bench_results.json'
+# Минимальное суммарное время повторов одного замера (с)
+measure_seconds = 1.0
+# Допустимое ухудшение относительно сохраненного результата (доля)
+regression_threshold = 0.10
+# Порог не ниже погрешности медиан: (погрешность текущей + погрешность сохраненной) * noise_margin
+noise_margin = 2.0
+
+
+def synthetic_stream(lines):
+    """Поток в формате скетча: строки телеметрии с редкими служебными сообщениями"""
+    text = [f"timestamp,{i},speed,{1000 + i % 1000},weight,{i % 5000}\n" for i in range(lines)]
+    for i in range(0, lines, 1000):
+        text[i] = "Speed set to 1250\n"
+    return ''.join(text).encode()
+
+
+def synthetic_rows(lines):
+    """Строки CSV в схеме SPEED_WEIGHT_HOST_COLUMNS"""
+    return [[i, 1000 + i % 1000, i % 5000, 1_000_000 * (i - i % 16), 1_000_000 * i] for i in range(lines)]
+
+
+def measure(functions, repeat, min_seconds=None):
+    """
+    Медианы времени нескольких повторов. Замеры идут по кругу, repeat кругов: медленный период машины
+    (секунды) попадает в отдельные круги всех замеров, а не целиком в один замер. За круг каждый замер
+    повторяется, пока не наберется min_seconds / repeat
+    :param functions: Словарь {имя: функция без аргументов, возвращающая затраченное время (с)}
+    :return: Словарь {имя: (медиана (с), относительная погрешность медианы)}
+    """
+    min_seconds = measure_seconds if min_seconds is None else min_seconds
+    times = {name: [] for name in functions}
+    for _ in range(repeat):
+        for name, function in functions.items():
+            spent = 0.0
+            while spent == 0.0 or spent < min_seconds / repeat:
+                elapsed = function()
+                times[name].append(elapsed)
+                spent += elapsed
+    timings = {}
+    for name, values in times.items():
+        q1, median, q3 = np.percentile(values, [25, 50, 75])
+        # Стандартная ошибка медианы: 1.25 * sigma / sqrt(n), sigma по межквартильному размаху (IQR / 1.35)
+        timings[name] = (median, 1.25 * (q3 - q1) / 1.35 / np.sqrt(len(values)) / median)
+    return timings
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def framing_feed(chunks):
+    framer = LineFramer()
+    for data in chunks:
+        framer.feed(data)
+
+
+def decoder_feed(chunks):
+    decoder = TelemetryDecoder()
+    for data in chunks:
+        decoder.feed(data)
+
+
+def write_rows(directory, rows):
+    """Запись лога, CSV и двоичной записи через BatchWriter, как в логгерах; время до закрытия записи"""
+    batches = [rows[i:i + submit_lines] for i in range(0, len(rows), submit_lines)]
+    texts = [[','.join(map(str, row)) for row in batch] for batch in batches]
+    capture_path = os.path.join(directory, 'eng_capture')
+    shutil.rmtree(capture_path, ignore_errors=True)
+    with open(os.path.join(directory, 'eng.log'), 'w') as log_file, \
+            open(os.path.join(directory, 'eng.csv'), 'w', newline='') as csv_file, \
+            SegmentedCaptureWriter(capture_path, SPEED_WEIGHT_HOST_COLUMNS) as capture:
+        start = time.perf_counter()
+        # Очередь вмещает все порции: замеряется скорость записи, а не отбрасывание
+        with BatchWriter(log_file, csv.writer(csv_file), csv_file, capture, max_queue=len(batches) + 1) as sink:
+            for lines, batch in zip(texts, batches):
+                sink.submit(lines, batch)
+        return time.perf_counter() - start
+
+
+def render_graphs(directory, rows):
+    """Построение графиков прогона eng_and_tenz.plot_graphs по двоичной записи в каталоге directory"""
+    capture_path = os.path.join(directory, 'plot.cap')
+    with CaptureWriter(capture_path, SPEED_WEIGHT_HOST_COLUMNS) as capture:
+        capture.append(rows)
+    eng_and_tenz.capture_file_name = capture_path
+    eng_and_tenz.speed_png_file_name = os.path.join(directory, 'speed.png')
+    eng_and_tenz.weight_png_file_name = os.path.join(directory, 'weight.png')
+    with contextlib.redirect_stdout(io.StringIO()):
+        return timed(eng_and_tenz.plot_graphs)
+
+
+def run_cases(size_names, repeat, frames):
+    """
+    Прогон всех замеров
+    :return: Словарь {ключ: результат}; ключ - 'замер/вход/размер', и медиана reference_work (с)
+    """
+    results = {}
+    references = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size_name in size_names:
+            lines = sizes[size_name]
+            # Замер: функция, единица результата, объем работы за повтор (результат - скорость work / время)
+            # или None и множитель времени
+            cases = {}
+            streams = {'synthetic': synthetic_stream(lines), 'recorded': load_traffic(log_file_name, lines)}
+            for source, stream in streams.items():
+                chunks = split_chunks(stream, chunk_size)
+                cases[f"framing/{source}"] = (partial(timed, framing_feed, chunks), 'lines/s', lines, 1)
+                cases[f"parsing/{source}"] = (partial(timed, decoder_feed, chunks), 'lines/s', lines, 1)
+                # Полный data_received SerialReader без записи на диск
+                cases[f"serial_reader/{source}"] = (partial(run_reader, chunks, None), 'lines/s', lines, 1)
+
+            rows = synthetic_rows(lines)
+            cases['writing/synthetic'] = (partial(write_rows, directory, rows), 'rows/s', lines, 1)
+            cases['plot_graphs/synthetic'] = (partial(render_graphs, directory, rows), 's', None, 1)
+            # update_graphs TestApp: добавление пачки точек в LivePlot и перерисовка кадра
+            cases['update_graphs/synthetic'] = (lambda: bench_live(lines, frames)[0], 'ms/frame', None, 1000)
+
+            # Эталонная работа идет в тех же кругах, что и замеры, и попадает в те же медленные периоды
+            timings = measure({'reference': reference_work, **{name: case[0] for name, case in cases.items()}}, repeat)
+            references.append(timings['reference'][0])
+            for name, (_, unit, work, factor) in cases.items():
+                seconds, noise = timings[name]
+                key = f"{name}/{size_name}"
+                value = work / seconds if work is not None else seconds * factor
+                results[key] = {'value': value, 'unit': unit, 'higher_is_better': work is not None, 'noise': noise}
+                print(f"{key:36s} {value:14.3f} {unit:9s} ±{noise * 100:.1f}%")
+    return results, float(np.median(references))
+
+
+def reference_work():
+    """
+    Время фиксированной работы на чистом Python: по нему результаты разных запусков приводятся к одной скорости
+    машины (частота процессора, соседние процессы)
+    """
+    start = time.perf_counter()
+    LineFramer().feed(b''.join(b"timestamp,%d,speed,1000\n" % i for i in range(50_000)))
+    return time.perf_counter() - start
+
+
+def environment(reference_s):
+    """
+    Сведения о машине и версии кода, чтобы сравнивать только сопоставимые результаты
+    :param reference_s: Медиана reference_work во время замеров (с)
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'created': time.time(),
+        'reference_s': reference_s,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'matplotlib': matplotlib.__version__,
+    }
+
+
+def compare(results, baseline, threshold, scale=1.0):
+    """
+    Сравнение с сохраненными результатами
+    :param scale: Во сколько раз текущая машина медленнее, чем при записи baseline (по reference_work)
+    :return: Список строк с описанием ухудшений больше threshold и больше погрешности медиан обоих запусков
+    """
+    regressions = []
+    for key, result in results.items():
+        previous = baseline.get(key)
+        if previous is None or previous['value'] <= 0 or result['value'] <= 0:
+            continue
+        # Ухудшение: падение скорости или рост времени
+        if result['higher_is_better']:
+            change = previous['value'] / (result['value'] * scale) - 1
+        else:
+            change = result['value'] / (previous['value'] * scale) - 1
+        # Результаты старого формата без разброса сравниваются только с threshold
+        allowed = max(threshold, (result.get('noise', 0) + previous.get('noise', 0)) * noise_margin)
+        if change > allowed:
+            regressions.append(f"{key}: {previous['value']:.3f} -> {result['value']:.3f} {result['unit']} "
+                               f"({change * 100:.1f}% worse, allowed {allowed * 100:.1f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк тракта Eng_logg: нарезка, разбор, запись, графики")
+    parser.add_argument('--sizes', nargs='+', choices=sizes, default=list(default_sizes))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--frames', type=int, default=20, help="Кадров в замере update_graphs")
+    parser.add_argument('--output', default=results_file_name, help="Файл JSON для результатов")
+    parser.add_argument('--baseline', help="Файл JSON с результатами предыдущего коммита")
+    parser.add_argument('--threshold', type=float, default=regression_threshold)
+    parser.add_argument('--scale', action='store_true',
+                        help="Приводить результаты к скорости машины baseline по reference_work (сравнение с другой "
+                             "машиной); на одной машине эталон сам дает ошибку до 20%%, поэтому по умолчанию выключено")
+    args = parser.parse_args()
+
+    results, reference_s = run_cases(args.sizes, args.repeat, args.frames)
+    current = environment(reference_s)
+    with open(args.output, 'w') as f:
+        json.dump({'environment': current, 'results': results}, f, indent=1)
+    print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        scale = current['reference_s'] / baseline['environment'].get('reference_s', current['reference_s'])
+        print(f"Machine speed relative to baseline: {1 / scale:.2f}" + ("" if args.scale else " (not applied)"))
+        regressions = compare(results, baseline['results'], args.threshold, scale if args.scale else 1.0)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions above {args.threshold * 100:.0f}% against {baseline['environment']['commit']}")
+
+
+if __name__ == "__main__":
+    main()
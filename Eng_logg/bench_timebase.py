@@ -0,0 +1,76 @@
+import argparse
+import time
+import numpy as np
+from timebase import ClockFit, fit_clock, align, NS_PER_MS
+
+
+def simulate_batches(samples, rate, drift_ppm, latency_ms, jitter_ms, batch, seed):
+    """
+    Отсчеты ардуино и время их приема хостом
+    :return: Массивы device_ms, recv_ns и истинное время хоста каждого отсчета (нс)
+    """
+    rng = np.random.default_rng(seed)
+    true_host = np.arange(samples) * (1e9 / rate) + 5e12
+    # Кварц ардуино уходит на drift_ppm относительно часов хоста
+    device_ms = np.floor((true_host - true_host[0]) / NS_PER_MS * (1 - drift_ppm * 1e-6)).astype(np.int64) + 1310
+    last = np.arange(batch - 1, samples, batch)
+    recv = true_host[last] + (latency_ms + rng.exponential(jitter_ms, len(last))) * NS_PER_MS
+    recv_ns = np.repeat(recv.astype(np.int64), batch)[:samples]
+    return device_ms[:len(recv_ns)], recv_ns, true_host[:len(recv_ns)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка оценки ухода часов и скорости передискретизации")
+    parser.add_argument('--samples', type=int, default=3_600_000)
+    parser.add_argument('--rate', type=float, default=1000.0)
+    parser.add_argument('--drift-ppm', type=float, default=150.0)
+    args = parser.parse_args()
+
+    device_ms, recv_ns, true_host = simulate_batches(args.samples, args.rate, args.drift_ppm, 2.0, 1.5, 16, 0)
+
+    # Потоковая оценка, как в SerialReader: одна точка на пачку
+    clock = ClockFit()
+    last = np.flatnonzero(np.diff(recv_ns, append=recv_ns[-1] + 1))
+    start = time.perf_counter()
+    for index in last.tolist():
+        clock.add(int(device_ms[index]), int(recv_ns[index]))
+    online = time.perf_counter() - start
+    error = clock.to_host(device_ms) - true_host
+    print(f"online fit: {len(last)} batches in {online * 1000:.1f} ms, drift {clock.drift_ppm:.1f} ppm "
+          f"(true {args.drift_ppm:.1f}), error mean {error.mean() / 1e6:.3f} ms, "
+          f"std {error.std() / 1e6:.4f} ms")
+    raw = recv_ns - true_host
+    print(f"raw receive stamps: error mean {raw.mean() / 1e6:.3f} ms, std {raw.std() / 1e6:.4f} ms")
+
+    # Перезагрузка ардуино посреди прогона (DTR при переподключении): millis() снова с нуля, хост продолжает
+    reboot = len(device_ms) // 2
+    rebooted_ms = device_ms.copy()
+    rebooted_ms[reboot:] -= rebooted_ms[reboot] - 7
+    clock = ClockFit()
+    stamped = []
+    for batch_start in range(0, len(rebooted_ms), 16):
+        rows = [[value] for value in rebooted_ms[batch_start:batch_start + 16].tolist()]
+        clock.stamp(rows, int(recv_ns[min(batch_start + 15, len(recv_ns) - 1)]))
+        stamped += [row[-1] for row in rows]
+    error = (np.array(stamped) - true_host)[reboot + 16 * 64:]
+    print(f"reboot mid-run: {clock.restarts} restart, error after {64} batches mean {error.mean() / 1e6:.3f} ms, "
+          f"max {np.abs(error).max() / 1e6:.3f} ms")
+
+    offline = fit_clock(device_ms, recv_ns)
+    print(f"offline refit: drift {offline.drift_ppm:.1f} ppm")
+
+    # Три стенда с разными часами на общей сетке 1 мс
+    channels = {}
+    for rig in range(3):
+        rig_device, rig_recv, _ = simulate_batches(args.samples, args.rate, args.drift_ppm * (rig - 1), 2.0, 1.5,
+                                                   16, rig)
+        rig_clock = fit_clock(rig_device, rig_recv)
+        channels[f"rig{rig}"] = (rig_clock.to_host(rig_device), np.sin(rig_device / 1000.0))
+    start = time.perf_counter()
+    grid, values = align(channels, NS_PER_MS)
+    elapsed = time.perf_counter() - start
+    print(f"align: 3 rigs x {args.samples} samples onto {len(grid)} points in {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
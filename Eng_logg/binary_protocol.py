@@ -0,0 +1,122 @@
+import binascii
+import struct
+from framing import LineFramer
+from telemetry import TelemetryParser, TelemetryRecord
+
+# Формат двоичного кадра (little-endian, как на AVR):
+# синхрослово 0xAA 0x55, uint32 timestamp, int16 speed, int32 weight, uint16 CRC-16/XMODEM от полезной нагрузки
+FRAME_SYNC = b'\xaa\x55'
+FRAME_STRUCT = struct.Struct('<2sIhiH')
+FRAME_SIZE = FRAME_STRUCT.size
+PAYLOAD_SLICE = slice(len(FRAME_SYNC), FRAME_SIZE - 2)
+
+
+def frame_crc(payload):
+    """CRC-16/XMODEM (полином 0x1021, начальное значение 0), совпадает с _crc_xmodem_update из avr-libc"""
+    return binascii.crc_hqx(payload, 0)
+
+
+def encode_frame(timestamp, speed, weight=0):
+    """
+    Собирает двоичный кадр телеметрии, так же как это делает скетч
+    :return: Байты кадра
+    """
+    frame = bytearray(FRAME_STRUCT.pack(FRAME_SYNC, timestamp, speed, weight, 0))
+    crc = frame_crc(bytes(frame[PAYLOAD_SLICE]))
+    struct.pack_into('<H', frame, FRAME_SIZE - 2, crc)
+    return bytes(frame)
+
+
+def format_record(record):
+    """Текстовое представление записи в формате скетча, для лог-файла"""
+    if record.weight is None:
+        return f"timestamp,{record.timestamp},speed,{record.speed}"
+    return f"timestamp,{record.timestamp},speed,{record.speed},weight,{record.weight}"
+
+
+class TelemetryDecoder:
+    def __init__(self, max_line_length=4096):
+        """
+        Разбор потока с ардуино, в котором могут чередоваться текстовые строки и двоичные кадры
+        :param max_line_length: Максимальная длина текстовой строки
+        """
+        self.max_line_length = max_line_length
+        self.framer = LineFramer(max_line_length=max_line_length)   # Быстрый путь для чисто текстового потока
+        self.parser = TelemetryParser()
+        self.buffer = bytearray()   # Буфер смешанного режима
+        self.binary = False   # Флаг: в потоке был кадр с верной контрольной суммой
+        self.frames = 0   # Количество принятых двоичных кадров
+        self.crc_errors = 0   # Количество кадров с неверной контрольной суммой
+        self.garbage_bytes = 0   # Количество отброшенных байт при поиске синхрослова
+
+    def reset(self):
+        """Сбрасывает недочитанные данные и режим потока (например, после переподключения); счетчики остаются"""
+        self.framer.reset()
+        self.buffer.clear()
+        self.binary = False
+
+    def feed(self, data):
+        """
+        Добавляет порцию байт и возвращает разобранные элементы в порядке поступления
+        :param data: Байты, полученные из последовательного порта
+        :return: Список пар (строка, запись); запись равна None для нетелеметрических строк
+        """
+        if not self.binary and not self.buffer:
+            if FRAME_SYNC[0] not in data:
+                parse = self.parser.parse
+                return [(line, parse(line)) for line in self.framer.feed(data)]
+            # Байт синхрослова: порция разбирается в смешанном режиме вместе с недочитанным хвостом
+            self.buffer += self.framer.buffer
+            self.framer.reset()
+
+        buffer = self.buffer
+        buffer += data
+        items = []
+        pos = 0
+        end = len(buffer)
+        sync_byte = FRAME_SYNC[0]
+
+        with memoryview(buffer) as view:
+            while pos < end:
+                if buffer[pos] == sync_byte:
+                    if end - pos < FRAME_SIZE:
+                        break
+                    sync, timestamp, speed, weight, crc = FRAME_STRUCT.unpack_from(buffer, pos)
+                    if sync == FRAME_SYNC and frame_crc(view[pos + PAYLOAD_SLICE.start:pos + PAYLOAD_SLICE.stop]) == crc:
+                        record = TelemetryRecord(timestamp, speed, weight)
+                        items.append((format_record(record), record))
+                        self.frames += 1
+                        self.binary = True
+                        pos += FRAME_SIZE
+                    else:
+                        # Повреждённый кадр или случайный байт: ищем следующее синхрослово
+                        if sync == FRAME_SYNC:
+                            self.crc_errors += 1
+                        self.garbage_bytes += 1
+                        pos += 1
+                    continue
+
+                # Текстовая строка: до переноса строки или до начала следующего кадра. Синхрослово ищется только
+                # в пределах строки, иначе каждая строка просматривала бы буфер до конца
+                newline = buffer.find(b'\n', pos)
+                sync_pos = buffer.find(sync_byte, pos, newline if newline != -1 else end)
+                if sync_pos != -1:
+                    self.garbage_bytes += sync_pos - pos
+                    pos = sync_pos
+                    continue
+                if newline == -1:
+                    if end - pos > self.max_line_length:
+                        self.garbage_bytes += end - pos
+                        pos = end
+                    break
+                line = str(view[pos:newline], 'utf-8', 'replace').strip()
+                pos = newline + 1
+                if line:
+                    items.append((line, self.parser.parse(line)))
+
+        del buffer[:pos]
+        if not self.binary and sync_byte not in buffer:
+            # Одиночный байт 0xAA (помеха) без верного кадра: хвост возвращается в быстрый текстовый путь
+            self.framer.buffer += buffer
+            buffer.clear()
+        return items
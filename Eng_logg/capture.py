@@ -0,0 +1,192 @@
+import csv
+import json
+import os
+import struct
+import time
+
+# Сигнатура и версия формата записи
+CAPTURE_MAGIC = b'ENGCAP1\x00'
+HEADER_LENGTH = struct.Struct('<I')
+# Начало данных выравнивается, чтобы столбцы можно было отображать через numpy.memmap
+DATA_ALIGNMENT = 64
+# Корзин прореживания записи перед построением графика; график прореживается еще раз до ширины в пикселях
+plot_buckets = 4000
+
+# Коды типов столбцов: numpy dtype и формат struct (little-endian)
+COLUMN_TYPES = {
+    'u4': ('<u4', 'I'),
+    'i4': ('<i4', 'i'),
+    'i8': ('<i8', 'q'),
+    'f4': ('<f4', 'f'),
+    'f8': ('<f8', 'd'),
+}
+
+# Схемы записи для логгеров
+SPEED_COLUMNS = (('timestamp', 'u4'), ('speed', 'i4'))
+SPEED_WEIGHT_COLUMNS = (('timestamp', 'u4'), ('speed', 'i4'), ('weight', 'i4'))
+# Те же схемы со временем хоста: recv_ns - time.monotonic_ns() приема пачки, host_ns - время ардуино,
+# пересчитанное во время хоста по ClockFit
+HOST_TIME_COLUMNS = (('recv_ns', 'i8'), ('host_ns', 'i8'))
+SPEED_HOST_COLUMNS = SPEED_COLUMNS + HOST_TIME_COLUMNS
+SPEED_WEIGHT_HOST_COLUMNS = SPEED_WEIGHT_COLUMNS + HOST_TIME_COLUMNS
+# Вес после ступеней обработки dsp (ноль, калибровка, фильтры) рядом с сырым weight
+FILTERED_WEIGHT_COLUMNS = (('weight_filtered', 'f8'),)
+SPEED_WEIGHT_FILTERED_COLUMNS = SPEED_WEIGHT_HOST_COLUMNS + FILTERED_WEIGHT_COLUMNS
+
+# Заголовки столбцов CSV логгеров и export_csv по именам столбцов записи
+CSV_COLUMN_NAMES = {
+    'timestamp': 'Timestamp',
+    'speed': 'Speed',
+    'weight': 'Weight',
+    'recv_ns': 'ReceiveNs',
+    'host_ns': 'HostNs',
+    'weight_filtered': 'WeightFiltered',
+}
+
+
+class CaptureWriter:
+    def __init__(self, path, columns=SPEED_WEIGHT_COLUMNS, metadata=None):
+        """
+        Запись строк телеметрии в двоичный файл с фиксированной шириной записи
+        :param path: Путь к файлу записи
+        :param columns: Последовательность пар (имя столбца, код типа из COLUMN_TYPES)
+        :param metadata: Словарь с метаданными прогона (двигатель, пропеллер, порт, ...)
+        """
+        for name, code in columns:
+            if code not in COLUMN_TYPES:
+                raise ValueError(f"Unknown column type {code!r} for column {name!r}")
+        self.path = path
+        self.columns = tuple((name, code) for name, code in columns)
+        self.row_struct = struct.Struct('<' + ''.join(COLUMN_TYPES[code][1] for _, code in self.columns))
+        self.rows = 0   # Количество записанных строк
+
+        header = {
+            'columns': [[name, COLUMN_TYPES[code][0]] for name, code in self.columns],
+            'created': time.time(),
+            'metadata': metadata or {},
+        }
+        self.file = open(path, 'wb')
+        self.file.write(encode_header(header))
+
+    def append(self, rows):
+        """
+        Дописывает строки в конец файла
+        :param rows: Последовательность строк, значения в порядке столбцов схемы
+        """
+        pack = self.row_struct.pack
+        self.file.write(b''.join([pack(*row) for row in rows]))
+        self.rows += len(rows)
+
+    def flush(self):
+        self.file.flush()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def encode_header(header):
+    """Сигнатура, длина и JSON заголовка, дополненные пробелами до границы выравнивания"""
+    body = json.dumps(header).encode('utf-8')
+    prefix_size = len(CAPTURE_MAGIC) + HEADER_LENGTH.size
+    padding = -(prefix_size + len(body)) % DATA_ALIGNMENT
+    body += b' ' * padding
+    return CAPTURE_MAGIC + HEADER_LENGTH.pack(len(body)) + body
+
+
+def read_header(path):
+    """
+    Читает заголовок файла записи
+    :return: Словарь заголовка и смещение начала данных
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(len(CAPTURE_MAGIC))
+        if magic != CAPTURE_MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        (length,) = HEADER_LENGTH.unpack(f.read(HEADER_LENGTH.size))
+        header = json.loads(f.read(length).decode('utf-8'))
+    return header, len(CAPTURE_MAGIC) + HEADER_LENGTH.size + length
+
+
+def load_capture(path):
+    """
+    Отображает файл записи в память без разбора
+    :param path: Путь к файлу записи; каталог сегментов читается через load_capture_parts
+    :return: Словарь заголовка и структурированный numpy.memmap (доступ к столбцам по имени)
+    """
+    import numpy as np
+
+    if os.path.isdir(path):
+        raise IsADirectoryError(f"{path} is a segmented capture, read it with load_capture_parts")
+
+    header, offset = read_header(path)
+    dtype = np.dtype([(name, code) for name, code in header['columns']])
+    # Недописанная последняя строка (при аварийном завершении) отбрасывается
+    rows = (os.path.getsize(path) - offset) // dtype.itemsize
+    if rows == 0:
+        return header, np.zeros(0, dtype=dtype)
+    return header, np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(rows,))
+
+
+def load_capture_parts(path):
+    """
+    Отображает запись в память по частям: файл записи - одна часть, каталог сегментов - по части на сегмент.
+    Сегменты не склеиваются, поэтому длинная запись не копируется в память целиком
+    :param path: Путь к файлу записи или каталог сегментированной записи (SegmentedCaptureWriter)
+    :return: Словарь заголовка (первого сегмента) и список структурированных numpy.memmap
+    """
+    if os.path.isdir(path):
+        from segments import load_segments
+        return load_segments(path)
+    header, data = load_capture(path)
+    return header, [data]
+
+
+def load_decimated(path, column, buckets=plot_buckets):
+    """
+    Ряд столбца записи по времени ардуино, прореженный для графика по сегментам
+    :param path: Путь к файлу записи или каталог сегментов
+    :param column: Имя столбца
+    :param buckets: Количество корзин прореживания
+    :return: Прореженные массивы timestamp и значений столбца
+    """
+    from decimate import minmax_decimate_parts
+
+    _, parts = load_capture_parts(path)
+    return minmax_decimate_parts([(data['timestamp'], data[column]) for data in parts], buckets)
+
+
+def csv_header(columns):
+    """
+    Заголовок CSV для схемы записи
+    :param columns: Схема ((имя, тип), ...) или список имен столбцов
+    :return: Список заголовков столбцов CSV
+    """
+    names = [column if isinstance(column, str) else column[0] for column in columns]
+    return [CSV_COLUMN_NAMES.get(name, name) for name in names]
+
+
+def export_csv(path, csv_path, chunk_rows=1_000_000):
+    """
+    Экспортирует запись в CSV в формате логгеров (Timestamp,Speed[,Weight,...])
+    :param path: Путь к файлу записи или каталог сегментов
+    :param csv_path: Путь к CSV файлу
+    :param chunk_rows: Количество строк, обрабатываемых за раз
+    """
+    header, parts = load_capture_parts(path)
+    names = [name for name, _ in header['columns']]
+    with open(csv_path, 'w', newline='') as csv_file:
+        csv_writer = csv.writer(csv_file)
+        csv_writer.writerow(csv_header(names))
+        for data in parts:
+            for start in range(0, len(data), chunk_rows):
+                chunk = data[start:start + chunk_rows]
+                csv_writer.writerows(zip(*(chunk[name].tolist() for name in names)))
@@ -0,0 +1,217 @@
+import json
+import os
+import shutil
+import sqlite3
+import time
+
+# Файл каталога и каталог архива прогонов
+catalog_file_name = 'catalog.db'
+runs_dir = 'runs'
+
+# Диапазон PWM скетча для пересчета скорости в проценты газа
+min_throttle = 1000
+max_throttle = 2000
+
+# Поля двигателей и пропеллеров, как на вкладках TestApp
+ENGINE_FIELDS = ('name', 'brand', 'model', 'power', 'weight', 'other')
+PROPELLER_FIELDS = ('name', 'brand', 'model', 'diameter', 'weight', 'other')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS engines (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    brand TEXT, model TEXT, power TEXT, weight TEXT, other TEXT
+);
+CREATE TABLE IF NOT EXISTS propellers (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    brand TEXT, model TEXT, diameter TEXT, weight TEXT, other TEXT
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    engine_id INTEGER REFERENCES engines(id),
+    propeller_id INTEGER REFERENCES propellers(id),
+    port TEXT,
+    capture_path TEXT,
+    samples INTEGER,
+    steps INTEGER,
+    max_speed INTEGER,
+    max_throttle REAL,
+    max_thrust REAL,
+    fit TEXT,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_engine_propeller ON runs(engine_id, propeller_id, max_throttle);
+CREATE INDEX IF NOT EXISTS runs_propeller ON runs(propeller_id, max_throttle);
+CREATE INDEX IF NOT EXISTS runs_started ON runs(started);
+"""
+
+
+def throttle_percent(speed):
+    """Скорость PWM в процентах газа"""
+    return (speed - min_throttle) * 100.0 / (max_throttle - min_throttle)
+
+
+class Catalog:
+    def __init__(self, path=catalog_file_name):
+        """
+        Каталог двигателей, пропеллеров и прогонов в SQLite
+        :param path: Путь к файлу базы
+        """
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        # WAL: чтение из интерфейса не блокируется записью логгера в другой процесс
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('PRAGMA foreign_keys=ON')
+        with self.db:
+            self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add_engine(self, name, **fields):
+        """Добавляет двигатель или обновляет характеристики двигателя с тем же именем"""
+        return self._upsert('engines', ENGINE_FIELDS, name, fields)
+
+    def add_propeller(self, name, **fields):
+        """Добавляет пропеллер или обновляет характеристики пропеллера с тем же именем"""
+        return self._upsert('propellers', PROPELLER_FIELDS, name, fields)
+
+    def _upsert(self, table, columns, name, fields):
+        unknown = set(fields) - set(columns)
+        if unknown:
+            raise ValueError(f"Unknown {table} fields: {', '.join(sorted(unknown))}")
+        if not name:
+            raise ValueError("Name must not be empty")
+        values = [name] + [fields.get(column) for column in columns[1:]]
+        updates = ', '.join(f"{column}=excluded.{column}" for column in columns[1:])
+        with self.db:
+            self.db.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT(name) DO UPDATE SET {updates}", values)
+        return self.db.execute(f"SELECT id FROM {table} WHERE name = ?", (name,)).fetchone()[0]
+
+    def engine_names(self):
+        return [row[0] for row in self.db.execute("SELECT name FROM engines ORDER BY name")]
+
+    def propeller_names(self):
+        return [row[0] for row in self.db.execute("SELECT name FROM propellers ORDER BY name")]
+
+    def _id(self, table, name):
+        if name is None:
+            return None
+        row = self.db.execute(f"SELECT id FROM {table} WHERE name = ?", (name,)).fetchone()
+        return row[0] if row is not None else None
+
+    def add_run(self, capture_path=None, engine=None, propeller=None, port=None, started=None, summary=None,
+                metadata=None):
+        """
+        Регистрирует прогон
+        :param capture_path: Путь к двоичной записи прогона
+        :param engine: Имя двигателя
+        :param propeller: Имя пропеллера
+        :param port: Порт стенда
+        :param started: Время начала (time.time()), по умолчанию - текущее
+        :param summary: Сводка StepAnalyzer.summary(); если не задана, считается по записи
+        :param metadata: Словарь с прочими сведениями о прогоне
+        :return: Идентификатор прогона
+        """
+        if summary is None and capture_path is not None and os.path.exists(capture_path):
+            from analysis import analyze
+            summary = analyze(capture_path).summary()
+        summary = summary or {}
+        max_speed = summary.get('max_speed')
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO runs (started, engine_id, propeller_id, port, capture_path, samples, steps, max_speed, "
+                "max_throttle, max_thrust, fit, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (started if started is not None else time.time(), self._id('engines', engine),
+                 self._id('propellers', propeller), port,
+                 os.path.abspath(capture_path) if capture_path is not None else None,
+                 summary.get('samples'), summary.get('steps'), max_speed,
+                 throttle_percent(max_speed) if max_speed is not None else None, summary.get('max_thrust'),
+                 json.dumps(summary['fit']) if summary.get('fit') is not None else None,
+                 json.dumps(metadata) if metadata else None))
+        return cursor.lastrowid
+
+    def find_runs(self, engine=None, propeller=None, min_throttle=None, limit=100):
+        """
+        Прогоны по двигателю, пропеллеру и минимальному проценту газа, новые первыми
+        :return: Список sqlite3.Row со столбцами runs и именами двигателя и пропеллера
+        """
+        conditions = []
+        params = []
+        for table, column, name in (('engines', 'engine_id', engine), ('propellers', 'propeller_id', propeller)):
+            if name is not None:
+                conditions.append(f"r.{column} = ?")
+                params.append(self._id(table, name))
+        if min_throttle is not None:
+            conditions.append("r.max_throttle >= ?")
+            params.append(min_throttle)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        params.append(limit)
+        return self.db.execute(
+            "SELECT r.*, e.name AS engine, p.name AS propeller FROM runs r "
+            "LEFT JOIN engines e ON e.id = r.engine_id LEFT JOIN propellers p ON p.id = r.propeller_id "
+            f"{where} ORDER BY r.started DESC LIMIT ?", params).fetchall()
+
+    def import_text_lists(self, engine_file='engines.txt', propeller_file='propellers.txt'):
+        """
+        Переносит двигатели и пропеллеры из старых текстовых файлов TestApp
+        :return: Количество перенесенных записей
+        """
+        imported = 0
+        for path, fields, add in ((engine_file, ENGINE_FIELDS, self.add_engine),
+                                  (propeller_file, PROPELLER_FIELDS, self.add_propeller)):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r') as f:
+                for line in f:
+                    values = line.rstrip('\n').split(',')
+                    if not values[0]:
+                        continue
+                    add(values[0], **dict(zip(fields[1:], values[1:])))
+                    imported += 1
+        return imported
+
+
+def new_run_directory(root=runs_dir):
+    """Создает каталог для файлов очередного прогона с именем по времени начала"""
+    base = os.path.join(root, time.strftime('%Y%m%d-%H%M%S'))
+    directory = base
+    suffix = 1
+    while os.path.exists(directory):
+        directory = f"{base}-{suffix}"
+        suffix += 1
+    os.makedirs(directory)
+    return directory
+
+
+def archive_run(paths, capture_path, copies=(), root=runs_dir, catalog_path=catalog_file_name, **run):
+    """
+    Переносит файлы прогона в отдельный каталог, чтобы следующий прогон их не перезаписал, и регистрирует прогон
+    :param paths: Файлы прогона для переноса (лог, CSV)
+    :param capture_path: Двоичная запись прогона
+    :param copies: Файлы, которые остаются на месте и копируются в каталог прогона (графики последнего прогона)
+    :param run: Параметры Catalog.add_run
+    :return: Каталог прогона
+    """
+    directory = new_run_directory(root)
+    for path in (capture_path, *paths):
+        if os.path.exists(path):
+            os.replace(path, os.path.join(directory, os.path.basename(path)))
+    for path in copies:
+        if os.path.exists(path):
+            shutil.copy2(path, directory)
+    with Catalog(catalog_path) as catalog:
+        catalog.add_run(os.path.join(directory, os.path.basename(capture_path)), **run)
+    return directory
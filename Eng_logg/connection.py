@@ -0,0 +1,146 @@
+import asyncio
+import serial_asyncio
+from framing import LineFramer
+
+
+class _ProtocolAdapter(asyncio.Protocol):
+    """Прослойка между транспортом и протоколом пользователя: перехватывает ответы и обрывы связи"""
+    def __init__(self, connection):
+        self.connection = connection
+
+    def connection_made(self, transport):
+        self.connection._on_connection_made(transport)
+
+    def data_received(self, data):
+        self.connection._on_data(data)
+
+    def connection_lost(self, exc):
+        self.connection._on_connection_lost(exc)
+
+
+class SerialConnection:
+    def __init__(self, port, baud_rate, protocol, reconnect_attempts=5, reconnect_delay=0.5,
+                 max_reconnect_delay=8.0, **serial_kwargs):
+        """
+        Одно долгоживущее подключение к устройству с записью, запросами и переподключением
+        :param port: Последовательный порт
+        :param baud_rate: Скорость порта
+        :param protocol: asyncio.Protocol, получающий данные (например, SerialReader)
+        :param reconnect_attempts: Количество попыток переподключения при обрыве, 0 - не переподключаться
+        :param reconnect_delay: Начальная пауза перед переподключением (с), удваивается с каждой попыткой
+        :param max_reconnect_delay: Максимальная пауза перед переподключением (с)
+        :param serial_kwargs: Дополнительные параметры serial.serial_for_url
+        """
+        self.port = port
+        self.baud_rate = baud_rate
+        self.protocol = protocol
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.serial_kwargs = serial_kwargs
+
+        self.transport = None
+        self.reconnects = 0   # Количество успешных переподключений
+        self._connected = asyncio.Event()
+        self._closing = False
+        self._reconnect_task = None
+        self._waiters = []   # Ожидающие ответа запросы: пары (условие, будущий объект)
+        self._framer = LineFramer()   # Нарезка ответов на строки, работает только пока есть запросы
+
+    @property
+    def connected(self):
+        return self._connected.is_set()
+
+    async def open(self):
+        """Открывает порт, протокол получает connection_made"""
+        loop = asyncio.get_running_loop()
+        await serial_asyncio.create_serial_connection(
+            loop, lambda: _ProtocolAdapter(self), self.port, self.baud_rate, **self.serial_kwargs
+        )
+        # connection_made вызывается транспортом в следующей итерации цикла событий
+        await self._connected.wait()
+
+    def write(self, data):
+        """
+        Отправляет байты в уже открытый порт
+        :param data: Байты для отправки
+        """
+        if not self.connected:
+            raise ConnectionError(f"{self.port} is not connected")
+        self.transport.write(data)
+
+    async def wait_connected(self, timeout=None):
+        """Ожидает (пере)подключения к порту"""
+        await asyncio.wait_for(self._connected.wait(), timeout)
+
+    async def request(self, data, match, timeout=2.0):
+        """
+        Отправляет команду и ожидает строку ответа
+        :param data: Байты команды
+        :param match: Подстрока или функция-условие для строки ответа
+        :param timeout: Максимальное время ожидания ответа (с)
+        :return: Строка ответа
+        """
+        predicate = match if callable(match) else (lambda line: match in line)
+        future = asyncio.get_running_loop().create_future()
+        waiter = (predicate, future)
+        self._waiters.append(waiter)
+        try:
+            self.write(data)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._waiters.remove(waiter)
+            if not self._waiters:
+                self._framer.reset()
+
+    def close(self):
+        """Закрывает порт без переподключения"""
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        if self.transport is not None:
+            self.transport.close()
+
+    def _on_connection_made(self, transport):
+        self.transport = transport
+        self._connected.set()
+        self.protocol.connection_made(transport)
+
+    def _on_data(self, data):
+        if self._waiters:
+            for line in self._framer.feed(data):
+                for predicate, future in self._waiters:
+                    if not future.done() and predicate(line):
+                        future.set_result(line)
+        self.protocol.data_received(data)
+
+    def _on_connection_lost(self, exc):
+        self._connected.clear()
+        self.transport = None
+        for _, future in self._waiters:
+            if not future.done():
+                future.set_exception(ConnectionError(f"{self.port} connection lost: {exc}"))
+
+        # Штатное закрытие (нами или протоколом) передается протоколу сразу, обрыв - после неудачных попыток
+        if self._closing or exc is None or self.reconnect_attempts <= 0:
+            self.protocol.connection_lost(exc)
+            return
+        print(f"Serial connection to {self.port} lost: {exc}. Reconnecting...")
+        self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect(exc))
+
+    async def _reconnect(self, exc):
+        delay = self.reconnect_delay
+        for attempt in range(1, self.reconnect_attempts + 1):
+            await asyncio.sleep(delay)
+            if self._closing:
+                break
+            try:
+                await self.open()
+            except (OSError, ValueError) as e:
+                exc = e
+                print(f"Reconnect attempt {attempt} to {self.port} failed: {e}")
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+            self.reconnects += 1
+            return
+        self.protocol.connection_lost(exc)
@@ -0,0 +1,39 @@
+import asyncio
+import sys
+import threading
+
+
+class ConsoleReader:
+    def __init__(self, stream=None):
+        """
+        Чтение команд оператора в отдельном потоке, чтобы не блокировать цикл событий.
+        Создается внутри работающего цикла событий.
+        :param stream: Источник строк, по умолчанию sys.stdin
+        """
+        self.stream = stream if stream is not None else sys.stdin
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()   # Прочитанные строки, None означает конец ввода
+        self._thread = threading.Thread(target=self._run, name='ConsoleReader', daemon=True)
+        self._thread.start()
+
+    async def readline(self, prompt=''):
+        """
+        Асинхронный аналог input()
+        :param prompt: Приглашение к вводу
+        :return: Строка без пробельных символов по краям
+        """
+        if prompt:
+            print(prompt, end='', flush=True)
+        line = await self.queue.get()
+        if line is None:
+            raise EOFError("Console input closed")
+        return line.strip()
+
+    def _run(self):
+        # Блокирующее чтение выполняется здесь, а в цикл событий передаются только готовые строки
+        while True:
+            line = self.stream.readline()
+            if not line:
+                self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+                break
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, line)
@@ -0,0 +1,109 @@
+import numpy as np
+
+
+def minmax_decimate(x, y, buckets):
+    """
+    Прореживание ряда для отрисовки: в каждой корзине остаются минимум и максимум в исходном порядке,
+    поэтому пики сохраняются, а количество точек не превышает 2 * buckets + 2
+    :param x: Значения по оси X (монотонно возрастающие)
+    :param y: Значения по оси Y
+    :param buckets: Количество корзин, обычно ширина графика в пикселях
+    :return: Прореженные массивы x, y
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    count = len(y)
+    buckets = max(1, int(buckets))
+    if count <= 2 * buckets + 2:
+        return x, y
+
+    # Корзины одинакового размера; хвост дополняется последним значением, чтобы обойтись без цикла
+    size = -(-count // buckets)
+    padded = np.empty(buckets * size, dtype=y.dtype)
+    padded[:count] = y
+    padded[count:] = y[-1]
+    grid = padded.reshape(buckets, size)
+
+    offsets = np.arange(buckets) * size
+    low = np.minimum(grid.argmin(axis=1) + offsets, count - 1)
+    high = np.minimum(grid.argmax(axis=1) + offsets, count - 1)
+
+    # Минимум и максимум корзины идут в порядке их появления, края ряда сохраняются
+    indices = np.empty(2 * buckets + 2, dtype=np.intp)
+    indices[0] = 0
+    indices[1:-1:2] = np.minimum(low, high)
+    indices[2:-1:2] = np.maximum(low, high)
+    indices[-1] = count - 1
+    return x[indices], y[indices]
+
+
+def minmax_decimate_parts(parts, buckets):
+    """
+    Прореживание ряда, записанного частями (сегментами): каждая часть прореживается отдельно, корзины
+    делятся пропорционально длине частей. Части не склеиваются, в памяти остается только результат
+    :param parts: Последовательность пар (x, y)
+    :param buckets: Общее количество корзин
+    :return: Прореженные массивы x, y
+    """
+    parts = [(x, y) for x, y in parts if len(y)]
+    total = sum(len(y) for _, y in parts)
+    if not total:
+        return np.zeros(0), np.zeros(0)
+    views = [minmax_decimate(x, y, -(-buckets * len(y) // total)) for x, y in parts]
+    return np.concatenate([x for x, _ in views]), np.concatenate([y for _, y in views])
+
+
+def visible_slice(x, x0, x1):
+    """
+    Границы части ряда, попадающей в диапазон [x0, x1], с одной точкой запаса с каждой стороны
+    :param x: Монотонно возрастающие значения по оси X
+    :return: Срез для x и y
+    """
+    start = max(0, int(np.searchsorted(x, x0, side='left')) - 1)
+    stop = min(len(x), int(np.searchsorted(x, x1, side='right')) + 1)
+    return slice(start, stop)
+
+
+def decimate_view(x, y, x0, x1, buckets):
+    """Прореживание только видимой части ряда: стоимость отрисовки зависит от ширины экрана, а не от длины записи"""
+    x = np.asarray(x)
+    window = visible_slice(x, x0, x1)
+    return minmax_decimate(x[window], np.asarray(y)[window], buckets)
+
+
+def axes_buckets(ax):
+    """Количество корзин по ширине оси в пикселях"""
+    return max(1, int(ax.bbox.width))
+
+
+class DecimatedLine:
+    def __init__(self, ax, x, y, **kwargs):
+        """
+        Линия графика, которая хранит полный ряд, а рисует только прореженную видимую часть.
+        При масштабировании и сдвиге оси прореживание пересчитывается для нового диапазона
+        :param ax: Ось matplotlib
+        :param x: Значения по оси X (монотонно возрастающие)
+        :param y: Значения по оси Y
+        :param kwargs: Параметры ax.plot; маркер рисуется, только если точек меньше, чем пикселей по ширине оси
+        """
+        self.ax = ax
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        self.marker = kwargs.pop('marker', None)
+        x_view, y_view = minmax_decimate(self.x, self.y, axes_buckets(ax))
+        (self.line,) = ax.plot(x_view, y_view, marker=self._marker(x_view), **kwargs)
+        self._cid = ax.callbacks.connect('xlim_changed', self.update)
+
+    def update(self, ax=None):
+        """Пересчитывает прореживание для текущего диапазона оси X"""
+        x0, x1 = self.ax.get_xlim()
+        x_view, y_view = decimate_view(self.x, self.y, min(x0, x1), max(x0, x1), axes_buckets(self.ax))
+        self.line.set_data(x_view, y_view)
+        self.line.set_marker(self._marker(x_view))
+
+    def _marker(self, x_view):
+        return self.marker if self.marker is not None and len(x_view) < axes_buckets(self.ax) else 'None'
+
+    def remove(self):
+        self.ax.callbacks.disconnect(self._cid)
+        self.line.remove()
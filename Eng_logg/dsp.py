@@ -0,0 +1,216 @@
+import math
+
+# Обработка канала тензодатчика по кускам: ноль и калибровка, скользящая медиана, БИХ-фильтры.
+# Состояние ступеней переносится между кусками, поэтому результат не зависит от того, как поток разбит
+# на куски, и побитово совпадает с обработкой всей записи одним куском.
+# numpy подключается при первой обработке, а не при импорте: логгеры не теряют время на запуске
+
+# Столбец веса в строках схем SPEED_WEIGHT_*: timestamp, speed, weight, ...
+WEIGHT_COLUMN = 2
+
+
+class Calibration:
+    def __init__(self, tare=0.0, scale=1.0, unit='units'):
+        """
+        Ноль и линейная калибровка: (x - tare) * scale
+        :param tare: Показание без нагрузки (сырые единицы)
+        :param scale: Единиц измерения (г, Н) на сырую единицу
+        :param unit: Название единицы измерения
+        """
+        self.tare = float(tare)
+        self.scale = float(scale)
+        self.unit = unit
+
+    @classmethod
+    def from_points(cls, raw_zero, raw_load, load, unit='g'):
+        """
+        Калибровка по двум показаниям: без нагрузки и с известным грузом
+        :param raw_zero: Показание без нагрузки
+        :param raw_load: Показание с грузом
+        :param load: Масса (вес) груза в единицах unit
+        """
+        if raw_load == raw_zero:
+            raise ValueError("Calibration readings with and without load must differ")
+        return cls(raw_zero, load / (raw_load - raw_zero), unit)
+
+    def tare_to(self, values):
+        """Обнуление по показаниям без нагрузки: tare - среднее значение values"""
+        import numpy as np
+
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            raise ValueError("No readings to tare")
+        self.tare = float(values.mean())
+
+    def process(self, x):
+        return (x - self.tare) * self.scale
+
+    def reset(self):
+        pass
+
+
+class MovingMedian:
+    def __init__(self, window=5):
+        """
+        Скользящая медиана по последним window отсчетам; убирает одиночные выбросы, не размывая ступени.
+        Выход запаздывает на window // 2 отсчетов; до заполнения окна недостающие отсчеты равны первому
+        :param window: Нечетная ширина окна
+        """
+        if window < 1 or window % 2 == 0:
+            raise ValueError(f"Median window must be a positive odd number, got {window}")
+        self.window = window
+        self.history = None   # Последние window - 1 входных отсчетов
+
+    def process(self, x):
+        import numpy as np
+        from numpy.lib.stride_tricks import sliding_window_view
+
+        if self.window == 1:
+            return x
+        if self.history is None:
+            self.history = np.full(self.window - 1, x[0])
+        data = np.concatenate((self.history, x))
+        self.history = data[len(data) - self.window + 1:].copy()
+        # Медиана нечетного окна - средний элемент, частичная сортировка дешевле np.median
+        middle = self.window // 2
+        return np.partition(sliding_window_view(data, self.window), middle, axis=1)[:, middle]
+
+    def reset(self):
+        self.history = None
+
+
+class LowPass:
+    def __init__(self, alpha):
+        """
+        БИХ-фильтр первого порядка (экспоненциальное сглаживание): y += alpha * (x - y).
+        Начальное состояние - первый отсчет, без переходного процесса от нуля
+        :param alpha: Коэффициент 0 < alpha <= 1, меньше - сильнее сглаживание
+        """
+        if not 0 < alpha <= 1:
+            raise ValueError(f"Low-pass alpha must be in (0, 1], got {alpha}")
+        self.alpha = alpha
+        self.y = None
+
+    @classmethod
+    def from_cutoff(cls, cutoff_hz, sample_rate_hz):
+        """Фильтр с частотой среза cutoff_hz при частоте отсчетов sample_rate_hz"""
+        return cls(1 - math.exp(-2 * math.pi * cutoff_hz / sample_rate_hz))
+
+    def process(self, x):
+        import numpy as np
+
+        alpha = self.alpha
+        y = self.y if self.y is not None else float(x[0])
+        out = []
+        append = out.append
+        # Рекурсия последовательна по отсчетам; цикл по списку float быстрее поэлементного доступа к массиву
+        for value in x.tolist():
+            y += alpha * (value - y)
+            append(y)
+        self.y = y
+        return np.array(out)
+
+    def reset(self):
+        self.y = None
+
+
+class Biquad:
+    def __init__(self, b, a):
+        """
+        БИХ-фильтр второго порядка, прямая транспонированная форма II.
+        Начальное состояние - установившееся для первого отсчета
+        :param b: Коэффициенты числителя b0, b1, b2
+        :param a: Коэффициенты знаменателя a0, a1, a2; нормируются на a0
+        """
+        a0 = float(a[0])
+        if a0 == 0:
+            raise ValueError("a0 must not be zero")
+        self.b = tuple(float(c) / a0 for c in b)
+        self.a = (1.0, float(a[1]) / a0, float(a[2]) / a0)
+        if 1 + self.a[1] + self.a[2] == 0:
+            raise ValueError("Filter has a pole at zero frequency")
+        self.state = None
+
+    @classmethod
+    def lowpass(cls, cutoff_hz, sample_rate_hz, q=1 / math.sqrt(2)):
+        """ФНЧ Баттерворта второго порядка (формулы RBJ Audio EQ Cookbook)"""
+        w0 = 2 * math.pi * cutoff_hz / sample_rate_hz
+        cos_w0 = math.cos(w0)
+        alpha = math.sin(w0) / (2 * q)
+        b1 = 1 - cos_w0
+        return cls((b1 / 2, b1, b1 / 2), (1 + alpha, -2 * cos_w0, 1 - alpha))
+
+    def process(self, x):
+        import numpy as np
+
+        b0, b1, b2 = self.b
+        _, a1, a2 = self.a
+        if self.state is None:
+            first = float(x[0])
+            y = first * (b0 + b1 + b2) / (1 + a1 + a2)
+            self.state = (y - b0 * first, b2 * first - a2 * y)
+        z1, z2 = self.state
+        out = []
+        append = out.append
+        for value in x.tolist():
+            y = b0 * value + z1
+            z1 = b1 * value - a1 * y + z2
+            z2 = b2 * value - a2 * y
+            append(y)
+        self.state = (z1, z2)
+        return np.array(out)
+
+    def reset(self):
+        self.state = None
+
+
+class FilterChain:
+    def __init__(self, stages):
+        """
+        Последовательность ступеней обработки: каждая получает и возвращает массив float64 того же размера
+        :param stages: Ступени в порядке применения (Calibration, MovingMedian, LowPass, Biquad)
+        """
+        self.stages = list(stages)
+        self.samples = 0   # Обработано отсчетов
+
+    def process(self, values):
+        """
+        Обрабатывает очередной кусок потока
+        :param values: Отсчеты (последовательность или массив numpy)
+        :return: Массив float64
+        """
+        import numpy as np
+
+        x = np.asarray(values, dtype=np.float64)
+        if not len(x):
+            return x
+        for stage in self.stages:
+            x = stage.process(x)
+        self.samples += len(x)
+        return x
+
+    def process_rows(self, rows, column=WEIGHT_COLUMN):
+        """Дописывает к каждой строке обработанное значение столбца column; сырое значение остается"""
+        if not rows:
+            return
+        for row, value in zip(rows, self.process([row[column] for row in rows]).tolist()):
+            row.append(value)
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+        self.samples = 0
+
+
+def load_cell_chain(tare=0.0, scale=1.0, median_window=None, lowpass_alpha=None, unit='units'):
+    """
+    Обработка канала тензодатчика: ноль и калибровка, затем медиана против выбросов и сглаживание
+    :param median_window: Окно скользящей медианы, None - без медианы
+    :param lowpass_alpha: Коэффициент LowPass, None - без сглаживания
+    """
+    stages = [Calibration(tare, scale, unit)]
+    if median_window:
+        stages.append(MovingMedian(median_window))
+    if lowpass_alpha:
+        stages.append(LowPass(lowpass_alpha))
+    return FilterChain(stages)
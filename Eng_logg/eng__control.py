@@ -1,72 +1,125 @@
 import asyncio
-import serial_asyncio
 import csv
-import matplotlib.pyplot as plt
+import time
+from binary_protocol import TelemetryDecoder
+from sink import BatchWriter
+from console import ConsoleReader
+from capture import load_decimated, SPEED_HOST_COLUMNS, csv_header
+from segments import SegmentedCaptureWriter, open_run_csv
+from rawlog import open_log, rawlog_files
+from run_events import RunEvents, RunTimeoutError
+from connection import SerialConnection
+from timebase import ClockFit
+from metrics import Metrics, reporting
+from profiles import ProfileRunner, load_profiles
 
 # Параметры последовательного порта
 serial_port = '/dev/cu.usbserial-A5069RR4'
-baud_rate = 9600
+baud_rate = 115200
+
+# Ограничения времени ожидания этапов прогона (с)
+ready_timeout = 15
+complete_timeout = 30
+
+# YAML профилей испытаний (см. profiles.yaml), None - ручное управление с консоли
+profile_file_name = None
 
 # Имена файлов
 log_file_name = 'eng.log'
+# Сжатие сырого лога: None - текстовый eng.log, 'zlib' или 'lzma' - сжатые блоки в eng.log.z
+log_compression = None
 csv_file_name = 'eng.csv'
+capture_file_name = 'eng_capture'   # Каталог сегментов двоичной записи
 png_file_name = 'motor_speed_plot.png'
+stats_file_name = 'eng_stats.json'
+
+# Статистика тракта чтения: период вывода (с) и порт страницы метрик Prometheus (None - не запускать)
+stats_interval = 5.0
+metrics_port = None
 
 
 class SerialReader(asyncio.Protocol):
-    def __init__(self, log_file, csv_writer, on_ready):
-        self.log_file = log_file
-        self.csv_writer = csv_writer
+    def __init__(self, sink, metrics=None):
+        self.sink = sink
+        self.metrics = metrics
         self.transport = None
-        self.buffer = ''
-        self.test_complete = False
-        self.on_ready = on_ready
+        self.decoder = TelemetryDecoder()
+        self.events = RunEvents()
+        self.clock = ClockFit()   # Соответствие millis() ардуино и time.monotonic_ns() хоста
+        self.last_timestamp = None   # Последняя метка времени ардуино, для привязки команд
 
     def connection_made(self, transport):
         self.transport = transport
+        # После переподключения (автоматического в SerialConnection) ардуино могла перезагрузиться по DTR:
+        # недочитанный хвост прежнего соединения и модель часов прежней загрузки не используются
+        self.decoder.reset()
+        self.clock.reset()
         print("Serial connection established.")
-        # Проверяем состояние on_ready
-        if not self.on_ready.done():
-            self.on_ready.set_result(True)
 
     def data_received(self, data):
-        self.buffer += data.decode('utf-8')
+        # Время приема пачки; строки пачки пришли не позже этого момента
+        received = time.monotonic_ns()
+        lines = []
+        rows = []
 
-        while '\n' in self.buffer:
-            line, self.buffer = self.buffer.split('\n', 1)
-            line = line.strip()
-            if line:
-                self.log_file.write(line + '\n')
-                print(f"Received line: {line}")  # Отладочный вывод
+        for line, record in self.decoder.feed(data):
+            lines.append(line)
 
-                if line.startswith("timestamp"):
-                    parts = line.split(',')
-                    timestamp = int(parts[1])
-                    speed = int(parts[3])
-                    self.csv_writer.writerow([timestamp, speed])
-
-                if "System Ready" in line:
-                    if not self.on_ready.done():
-                        self.on_ready.set_result(True)
-
-                if "Test complete" in line:
-                    self.test_complete = True
-                    self.transport.close()
+            if record is not None:
+                rows.append([record.timestamp, record.speed])
+            else:
+                print(f"Received line: {line}")  # Отладочный вывод
+                self.events.on_line(line)
+
+            if "Test complete" in line:
+                self.transport.close()
+
+        if rows:
+            self.last_timestamp = rows[-1][0]
+            self.clock.stamp(rows, received)
+        self.sink.submit(lines, rows)
+        if self.metrics is not None:
+            self.metrics.on_batch(len(data), len(lines), rows, received)
+
+    def log_command(self, command):
+        """
+        Записывает отправленную команду в лог с временем хоста и последней меткой времени ардуино.
+        host_ns - time.monotonic_ns() отправки, device_estimate - то же время в шкале millis() по ClockFit
+        :param command: Отправленная команда
+        :return: host_ns отправки
+        """
+        sent = time.monotonic_ns()
+        estimate = f"{self.clock.to_device(sent):.1f}" if self.clock.count else None
+        self.sink.submit([f"command,{time.time():.3f},device_timestamp,{self.last_timestamp},"
+                          f"host_ns,{sent},device_estimate,{estimate},{command}"])
+        return sent
+
+    def log_ack(self, command, latency_ns):
+        """
+        Записывает в лог подтверждение команды (эхо ардуино "Received command: ...")
+        :param command: Подтвержденная команда
+        :param latency_ns: Время от отправки до подтверждения (нс)
+        """
+        self.sink.submit([f"ack,{time.time():.3f},device_timestamp,{self.last_timestamp},"
+                          f"host_ns,{time.monotonic_ns()},latency_ms,{latency_ns / 1e6:.3f},{command}"])
 
     def connection_lost(self, exc):
         if exc:
             print(f"Serial connection lost: {exc}")
         else:
             print("Serial connection closed.")
+        self.events.fail(ConnectionError(f"Serial connection closed before the test completed: {exc}"))
 
 
-async def user_input(transport):
+async def user_input(connection, reader, console):
     while True:
-        command = input("Enter command (1-9 to set speed, '-' to stop): ")
+        # Ожидание ввода не блокирует цикл событий, телеметрия продолжает приниматься
+        command = await console.readline("Enter command (1-9 to set speed, '-' to stop): ")
         if command in {'1', '2', '3', '4', '5', '6', '7', '8', '9', '-'}:
             # Отправляем команду с символом новой строки
             message = command + '\n'
-            transport.write(message.encode('utf-8'))
+            connection.write(message.encode('utf-8'))
+            reader.log_command(command)
             print(f"Sent command: {message.strip()}")
             await asyncio.sleep(0.1)  # Даем немного времени для передачи
             # transport.flush()  # Если нужно, можно добавить flush, но это не всегда необходимо
@@ -77,44 +130,66 @@ async def user_input(transport):
 
 
 async def main():
-    with open(log_file_name, 'w') as log_file, open(csv_file_name, 'w', newline='') as csv_file:
+    started = time.time()
+    metrics = Metrics()
+    # Лог и CSV дописываются, только если продолжается прерванный прогон; новый прогон начинает их заново
+    with SegmentedCaptureWriter(capture_file_name, SPEED_HOST_COLUMNS) as capture, \
+            open_log(log_file_name, log_compression, resume=capture.resumed) as log_file, \
+            open_run_csv(csv_file_name, csv_header(SPEED_HOST_COLUMNS), capture.resumed) as csv_file:
         csv_writer = csv.writer(csv_file)
-        csv_writer.writerow(['Timestamp', 'Speed'])
-
-        loop = asyncio.get_running_loop()
-
-        on_ready = loop.create_future()
-
-        reader = SerialReader(log_file, csv_writer, on_ready)
-        transport, protocol = await serial_asyncio.create_serial_connection(loop, lambda: reader, serial_port, baud_rate)
-
-        # Ждем, пока Arduino не сообщит о готовности
-        await on_ready
-
-        # Теперь можем начать ввод команд
-        await user_input(transport)
-
-        while not reader.test_complete:
-            await asyncio.sleep(1)
+        if capture.resumed:
+            print(f"Resuming interrupted run: {capture.rows} rows in {capture.segment} segments")
+
+        # Статистика останавливается после закрытия записи, чтобы итоговый снимок учел последние пачки
+        with reporting(metrics, stats_interval, stats_file_name, metrics_port), \
+                BatchWriter(log_file, csv_writer, csv_file, capture, echo=True, metrics=metrics) as sink:
+            reader = SerialReader(sink, metrics)
+            connection = SerialConnection(serial_port, baud_rate, reader)
+            await connection.open()
+
+            try:
+                # Ждем, пока Arduino не сообщит о готовности
+                try:
+                    await reader.events.wait('ready', ready_timeout)
+                except RunTimeoutError as e:
+                    # Сообщение могло прийти до подключения, если ардуино не перезагрузилась
+                    print(f"{e}, continuing.")
+
+                if profile_file_name is not None:
+                    # Профили из файла выполняются подряд, в конце отправляется остановка
+                    summary = await ProfileRunner(connection, reader).run(load_profiles(profile_file_name))
+                    print(f"Profiles complete: {summary}")
+                else:
+                    # Теперь можем начать ввод команд
+                    await user_input(connection, reader, ConsoleReader())
+
+                await reader.events.wait('complete', complete_timeout)
+            finally:
+                connection.close()
 
     print("Log collection complete.")
     print("Plotting graph...")
     plot_graph()
 
+    # Файлы прогона переносятся в отдельный каталог и регистрируются в каталоге прогонов
+    from catalog import archive_run
+    run_files = [log_file_name, *rawlog_files(log_file_name), csv_file_name, stats_file_name]
+    run_directory = archive_run(run_files, capture_file_name,
+                                copies=[png_file_name], port=serial_port, started=started)
+    print(f"Run saved to {run_directory}")
+
 
 def plot_graph():
-    timestamps = []
-    speeds = []
+    # Графики строятся только после прогона: matplotlib не замедляет запуск и начало записи
+    import matplotlib.pyplot as plt
+    from decimate import DecimatedLine
 
-    with open(csv_file_name, 'r') as csv_file:
-        csv_reader = csv.reader(csv_file)
-        next(csv_reader)
-        for row in csv_reader:
-            timestamps.append(int(row[0]))
-            speeds.append(int(row[1]))
+    # Чтение данных из двоичной записи без построчного разбора; сегменты прореживаются по одному
+    timestamps, speeds = load_decimated(capture_file_name, 'speed')
 
     plt.figure(figsize=(10, 6))
-    plt.plot(timestamps, speeds, label='Speed', color='b', marker='o')
+    # Прореживание до ширины графика в пикселях сохраняет пики, но не рисует миллионы точек
+    DecimatedLine(plt.gca(), timestamps, speeds, label='Speed', color='b', marker='o')
     plt.xlabel('Time (ms)')
     plt.ylabel('Speed (PWM value)')
     plt.title('Motor Speed vs Time')
@@ -1,65 +1,119 @@
 import asyncio
-import serial_asyncio
 import csv
-import matplotlib.pyplot as plt
+import time
+from binary_protocol import TelemetryDecoder
+from sink import BatchWriter
+from console import ConsoleReader
+from capture import SPEED_WEIGHT_FILTERED_COLUMNS, csv_header
+from segments import SegmentedCaptureWriter, open_run_csv
+from rawlog import open_log, rawlog_files
+from run_events import RunEvents
+from connection import SerialConnection
+from timebase import ClockFit
+from metrics import Metrics, reporting
+from dsp import load_cell_chain
 
 # Параметры последовательного порта
 serial_port = '/dev/cu.usbserial-A5069RR4'
-baud_rate = 9600
+baud_rate = 115200
+
+# Ограничение времени ожидания сообщения о завершении после команды остановки '-' (с), как в eng__control.py
+complete_timeout = 30
 
 # Имена файлов
 log_file_name = 'eng.log'
+# Сжатие сырого лога: None - текстовый eng.log, 'zlib' или 'lzma' - сжатые блоки в eng.log.z
+log_compression = None
 csv_file_name = 'eng.csv'
+capture_file_name = 'eng_capture'   # Каталог сегментов двоичной записи
 speed_png_file_name = 'motor_speed_plot.png'
 weight_png_file_name = 'motor_weight_plot.png'
+stats_file_name = 'eng_stats.json'
+
+# Обработка веса перед записью: показание без нагрузки (сырые единицы), масштаб (единиц на сырую единицу),
+# окно скользящей медианы и коэффициент сглаживания (None - ступень отключена). Сырой вес пишется рядом
+weight_tare = 0
+weight_scale = 1.0
+weight_unit = 'units'
+weight_median_window = 5
+weight_lowpass_alpha = 0.2
+
+# Статистика тракта чтения: период вывода (с) и порт страницы метрик Prometheus (None - не запускать)
+stats_interval = 5.0
+metrics_port = None
 
 
 class SerialReader(asyncio.Protocol):
-    def __init__(self, log_file, csv_writer):
-        self.log_file = log_file
-        self.csv_writer = csv_writer
+    def __init__(self, sink, metrics=None):
+        self.sink = sink
+        self.metrics = metrics
         self.transport = None
-        self.buffer = ''
-        self.test_complete = False
+        self.decoder = TelemetryDecoder()
+        self.events = RunEvents()
+        self.clock = ClockFit()   # Соответствие millis() ардуино и time.monotonic_ns() хоста
+        self.last_timestamp = None   # Последняя метка времени ардуино, для привязки команд
 
     def connection_made(self, transport):
         self.transport = transport
+        # После переподключения (автоматического в SerialConnection) ардуино могла перезагрузиться по DTR:
+        # недочитанный хвост прежнего соединения и модель часов прежней загрузки не используются
+        self.decoder.reset()
+        self.clock.reset()
         print("Serial connection established.")
 
     def data_received(self, data):
-        self.buffer += data.decode('utf-8')
-
-        while '\n' in self.buffer:
-            line, self.buffer = self.buffer.split('\n', 1)
-            line = line.strip()
-            if line:
-                self.log_file.write(line + '\n')
+        # Время приема пачки; строки пачки пришли не позже этого момента
+        received = time.monotonic_ns()
+        lines = []
+        rows = []
+
+        for line, record in self.decoder.feed(data):
+            lines.append(line)
+
+            if record is not None:
+                weight = record.weight if record.weight is not None else 0
+                rows.append([record.timestamp, record.speed, weight])
+            else:
                 print(f"Received line: {line}")
-
-                if line.startswith("timestamp"):
-                    parts = line.split(',')
-                    timestamp = int(parts[1])
-                    speed = int(parts[3])
-                    weight = int(parts[5])
-                    self.csv_writer.writerow([timestamp, speed, weight])
-
-                if "Test complete" in line:
-                    self.test_complete = True
-                    self.transport.close()
+                self.events.on_line(line)
+
+            if "Test complete" in line:
+                self.transport.close()
+
+        if rows:
+            self.last_timestamp = rows[-1][0]
+            self.clock.stamp(rows, received)
+        self.sink.submit(lines, rows)
+        if self.metrics is not None:
+            self.metrics.on_batch(len(data), len(lines), rows, received)
+
+    def log_command(self, command):
+        """
+        Записывает отправленную команду в лог с временем хоста и последней меткой времени ардуино.
+        host_ns - time.monotonic_ns() отправки, device_estimate - то же время в шкале millis() по ClockFit
+        :param command: Отправленная команда
+        """
+        sent = time.monotonic_ns()
+        estimate = f"{self.clock.to_device(sent):.1f}" if self.clock.count else None
+        self.sink.submit([f"command,{time.time():.3f},device_timestamp,{self.last_timestamp},"
+                          f"host_ns,{sent},device_estimate,{estimate},{command}"])
 
     def connection_lost(self, exc):
         if exc:
             print(f"Serial connection lost: {exc}")
         else:
             print("Serial connection closed.")
+        self.events.fail(ConnectionError(f"Serial connection closed before the test completed: {exc}"))
 
 
-async def user_input(transport):
+async def user_input(connection, reader, console):
     while True:
-        command = input("Enter command (1-9 to set speed, '-' to stop): ")
+        # Ожидание ввода не блокирует цикл событий, телеметрия продолжает приниматься
+        command = await console.readline("Enter command (1-9 to set speed, '-' to stop): ")
         if command in {'1', '2', '3', '4', '5', '6', '7', '8', '9', '-'}:
             message = command + '\n'
-            transport.write(message.encode('utf-8'))
+            connection.write(message.encode('utf-8'))
+            reader.log_command(command)
             print(f"Sent command: {message.strip()}")
             await asyncio.sleep(0.1)
             if command == '-':
@@ -69,68 +123,67 @@ async def user_input(transport):
 
 
 async def main():
-    with open(log_file_name, 'w') as log_file, open(csv_file_name, 'w', newline='') as csv_file:
+    started = time.time()
+    metrics = Metrics()
+    # Лог и CSV дописываются, только если продолжается прерванный прогон; новый прогон начинает их заново
+    with SegmentedCaptureWriter(capture_file_name, SPEED_WEIGHT_FILTERED_COLUMNS) as capture, \
+            open_log(log_file_name, log_compression, resume=capture.resumed) as log_file, \
+            open_run_csv(csv_file_name, csv_header(SPEED_WEIGHT_FILTERED_COLUMNS), capture.resumed) as csv_file:
         csv_writer = csv.writer(csv_file)
-        csv_writer.writerow(['Timestamp', 'Speed', 'Weight'])
-
-        loop = asyncio.get_running_loop()
-
-        reader = SerialReader(log_file, csv_writer)
-        transport, protocol = await serial_asyncio.create_serial_connection(
-            loop, lambda: reader, serial_port, baud_rate
-        )
-
-        # Запуск задачи для пользовательского ввода
-        user_input_task = asyncio.create_task(user_input(transport))
-
-        # Постоянное ожидание завершения теста
-        while not reader.test_complete:
-            await asyncio.sleep(0.5)
-
-        await user_input_task
+        if capture.resumed:
+            print(f"Resuming interrupted run: {capture.rows} rows in {capture.segment} segments")
+
+        # Вес обрабатывается в потоке записи пачками: data_received не ждет фильтров, состояние фильтров
+        # переносится между пачками
+        weight_filter = load_cell_chain(weight_tare, weight_scale, weight_median_window, weight_lowpass_alpha,
+                                        weight_unit)
+
+        # Статистика останавливается после закрытия записи, чтобы итоговый снимок учел последние пачки
+        with reporting(metrics, stats_interval, stats_file_name, metrics_port), \
+                BatchWriter(log_file, csv_writer, csv_file, capture, echo=True, metrics=metrics,
+                            transform=weight_filter.process_rows) as sink:
+            reader = SerialReader(sink, metrics)
+            connection = SerialConnection(serial_port, baud_rate, reader)
+            await connection.open()
+
+            # Запуск задачи для пользовательского ввода
+            user_input_task = asyncio.create_task(user_input(connection, reader, ConsoleReader()))
+
+            try:
+                # Пока оператор управляет двигателем, время не ограничено: прогон идет до команды '-', сообщения
+                # ардуино о завершении или потери соединения
+                await asyncio.wait({user_input_task, reader.events.complete}, return_when=asyncio.FIRST_COMPLETED)
+                if user_input_task.done():
+                    user_input_task.result()
+                # После '-' ардуино должна сообщить о завершении в пределах complete_timeout
+                await reader.events.wait('complete', complete_timeout)
+            except BaseException:
+                # Прогон прерван (таймаут, ошибка, Ctrl+C): двигатель останавливается до закрытия порта
+                if connection.connected:
+                    connection.write(b'-\n')
+                raise
+            finally:
+                user_input_task.cancel()
+                connection.close()
 
     print("Log collection complete.")
     print("Plotting graphs...")
     plot_graphs()
 
+    # Файлы прогона переносятся в отдельный каталог и регистрируются в каталоге прогонов
+    from catalog import archive_run
+    run_files = [log_file_name, *rawlog_files(log_file_name), csv_file_name, stats_file_name]
+    run_directory = archive_run(run_files, capture_file_name,
+                                copies=[speed_png_file_name, weight_png_file_name], port=serial_port, started=started)
+    print(f"Run saved to {run_directory}")
+
 
 def plot_graphs():
-    timestamps = []
-    speeds = []
-    weights = []
-
-    with open(csv_file_name, 'r') as csv_file:
-        csv_reader = csv.reader(csv_file)
-        next(csv_reader)
-        for row in csv_reader:
-            timestamps.append(int(row[0]))
-            speeds.append(int(row[1]))
-            weights.append(int(row[2]))
-
-    plt.figure(figsize=(10, 6))
-
-    # График скорости
-    plt.subplot(2, 1, 1)
-    plt.plot(timestamps, speeds, label='Speed', color='b', marker='o')
-    plt.xlabel('Time (ms)')
-    plt.ylabel('Speed (PWM value)')
-    plt.title('Motor Speed vs Time')
-    plt.legend()
-    plt.grid(True)
-
-    # График веса
-    plt.subplot(2, 1, 2)
-    plt.plot(timestamps, weights, label='Weight', color='r', marker='o')
-    plt.xlabel('Time (ms)')
-    plt.ylabel('Weight (units)')
-    plt.title('Weight vs Time')
-    plt.legend()
-    plt.grid(True)
-
-    plt.tight_layout()
-    plt.savefig(speed_png_file_name)
-    plt.savefig(weight_png_file_name)
-    plt.close()
+    # Графики строятся только после прогона: matplotlib не замедляет запуск и начало записи
+    from render import render_plots
+
+    # Скорость и вес - отдельные фигуры, каждая в своем файле
+    render_plots(capture_file_name, speed_png_file_name, weight_png_file_name)
 
     print(f"Graphs saved as {speed_png_file_name} and {weight_png_file_name}")
 
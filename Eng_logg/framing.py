@@ -0,0 +1,41 @@
+class LineFramer:
+    def __init__(self, encoding='utf-8', max_line_length=4096):
+        """
+        Нарезка потока байт с последовательного порта на целые строки
+        :param encoding: Кодировка строк
+        :param max_line_length: Максимальная длина строки без символа переноса, после которой хвост сбрасывается
+        """
+        self.encoding = encoding
+        self.max_line_length = max_line_length
+        self.buffer = bytearray()   # Байтовый буфер для хранения неполной строки
+        self.overflows = 0   # Количество сброшенных из-за переполнения хвостов
+
+    def feed(self, data):
+        """
+        Добавляет порцию байт в буфер и возвращает список полных непустых строк
+        :param data: Байты, полученные из последовательного порта
+        :return: Список строк без пробельных символов по краям
+        """
+        buffer = self.buffer
+        buffer += data
+
+        # Ищем последний перенос строки: всё до него - целые строки
+        end = buffer.rfind(b'\n')
+        if end < 0:
+            if len(buffer) > self.max_line_length:
+                self.overflows += 1
+                buffer.clear()
+            return []
+
+        # Декодируем только полные строки одним проходом, без промежуточной копии байт.
+        # Символ '\n' не встречается внутри многобайтовых последовательностей UTF-8,
+        # поэтому разрезанный между чтениями символ всегда остаётся в хвосте буфера
+        with memoryview(buffer) as view:
+            text = str(view[:end], self.encoding, 'replace')
+        del buffer[:end + 1]
+
+        return [line for line in map(str.strip, text.split('\n')) if line]
+
+    def reset(self):
+        """Сбрасывает неполную строку, накопленную в буфере"""
+        self.buffer.clear()
@@ -1,30 +1,52 @@
 import asyncio
-import serial_asyncio
 import csv
-import matplotlib.pyplot as plt
+import time
+from binary_protocol import TelemetryDecoder
+from sink import BatchWriter
+from capture import load_decimated, SPEED_HOST_COLUMNS, csv_header
+from segments import SegmentedCaptureWriter, open_run_csv
+from rawlog import open_log, rawlog_files
+from run_events import RunEvents, RunTimeoutError
+from connection import SerialConnection
+from timebase import ClockFit
+from metrics import Metrics, reporting
 
 # Параметры последовательного порта
 serial_port = '/dev/cu.usbserial-A5069RR4'
-baud_rate = 9600
+baud_rate = 115200
+
+# Ограничения времени ожидания этапов прогона (с)
+start_prompt_timeout = 15
+complete_timeout = 60
 
 # Имена файлов
 log_file_name = 'eng.log'
+# Сжатие сырого лога: None - текстовый eng.log, 'zlib' или 'lzma' - сжатые блоки в eng.log.z
+log_compression = None
 csv_file_name = 'eng.csv'
+capture_file_name = 'eng_capture'   # Каталог сегментов двоичной записи
 png_file_name = 'motor_speed_plot.png'
+stats_file_name = 'eng_stats.json'
+
+# Статистика тракта чтения: период вывода (с) и порт страницы метрик Prometheus (None - не запускать)
+stats_interval = 5.0
+metrics_port = None
 
 
 class SerialReader(asyncio.Protocol):
-    def __init__(self, log_file, csv_writer):
+    def __init__(self, sink, metrics=None):
         """
         Класс описывающий интерфейс для чтения с последовательного порта
-        :param log_file: Открытый файл логов
-        :param csv_writer: Объект для записи в csv файл
+        :param sink: BatchWriter для записи лога и CSV в фоновом потоке
+        :param metrics: Metrics для счетчиков и гистограмм тракта чтения или None
         """
-        self.log_file = log_file
-        self.csv_writer = csv_writer
+        self.sink = sink
+        self.metrics = metrics
         self.transport = None   # Объект представляющий собой серийное соединение
-        self.buffer = ''   # Текстовый буффер для временного хранения данных
-        self.test_complete = False   # Флаг завеершения теста
+        self.decoder = TelemetryDecoder()   # Разбор текстовых строк и двоичных кадров телеметрии
+        self.events = RunEvents()   # Этапы прогона: готовность, ожидание START, завершение
+        self.clock = ClockFit()   # Соответствие millis() ардуино и time.monotonic_ns() хоста
+        self.last_timestamp = None   # Последняя метка времени ардуино
 
     def connection_made(self, transport):
         """
@@ -32,31 +54,40 @@ class SerialReader(asyncio.Protocol):
         :param transport: последовательное соединение
         """
         self.transport = transport
+        # После переподключения (автоматического в SerialConnection) ардуино могла перезагрузиться по DTR:
+        # недочитанный хвост прежнего соединения и модель часов прежней загрузки не используются
+        self.decoder.reset()
+        self.clock.reset()
         print("Serial connection established.")
 
     def data_received(self, data):
-        # Декодируем данные из последовательного порта в обычный текст и сохраняем в буфер
-        self.buffer += data.decode('utf-8')
-
-        # Если в буфере встречается символ переноса строки (считывавем данные построчно)
-        while '\n' in self.buffer:
-            line, self.buffer = self.buffer.split('\n', 1)
-            line = line.strip()
-            if line:
-                self.log_file.write(line + '\n')
+        # Время приема пачки; строки пачки пришли не позже этого момента
+        received = time.monotonic_ns()
+        lines = []
+        rows = []
+
+        # Накапливаем байты в буфере и разбираем только полные строки и кадры
+        for line, record in self.decoder.feed(data):
+            lines.append(line)
+
+            # Записываем данные в CSV, если это строка с данными
+            if record is not None:
+                rows.append([record.timestamp, record.speed])
+            else:
                 print(line)
+                self.events.on_line(line)
 
-                # Записываем данные в CSV, если это строка с данными
-                if line.startswith("timestamp"):
-                    parts = line.split(',')
-                    timestamp = int(parts[1])
-                    speed = int(parts[3])
-                    self.csv_writer.writerow([timestamp, speed])
+            # Закрытие соединения
+            if "Test complete" in line:
+                self.transport.close()
 
-                # Закрытие соединения
-                if "Test complete" in line:
-                    self.test_complete = True
-                    self.transport.close()
+        if rows:
+            self.last_timestamp = rows[-1][0]
+            self.clock.stamp(rows, received)
+        # Запись на диск и вывод телеметрии выполняются пачками в фоновом потоке
+        self.sink.submit(lines, rows)
+        if self.metrics is not None:
+            self.metrics.on_batch(len(data), len(lines), rows, received)
 
     # Вызывается, когда соединение закрывается или теряется
     def connection_lost(self, exc):
@@ -64,59 +95,76 @@ class SerialReader(asyncio.Protocol):
             print(f"Serial connection lost: {exc}")
         else:
             print("Serial connection closed.")
+        # Ожидающие этапы прогона завершаются ошибкой, чтобы main() не зависал
+        self.events.fail(ConnectionError(f"Serial connection closed before the test completed: {exc}"))
 
 
-async def send_start_command():
+async def send_start_command(reader, connection):
     """Асинхронная функция для отправки команды START на ардуино"""
-    await asyncio.sleep(8)
+    # Ждем приглашения вместо фиксированной паузы на калибровку ESC
+    try:
+        await reader.events.wait('start_prompt', start_prompt_timeout)
+    except RunTimeoutError as e:
+        # Приглашение могло прийти до подключения, если ардуино уже откалибрована
+        print(f"{e}, sending START anyway.")
     print("Sending START command to Arduino...")
-    _, writer = await serial_asyncio.open_serial_connection(url=serial_port, baudrate=baud_rate)
-    writer.write(b'START\n')   # Отправка команды в байтовой форме
-    await writer.drain()   # Ожидание отправки данных
-    writer.close()   # Закрытие подключения
-    await writer.wait_closed()
+    # Команда отправляется через уже открытый порт: повторное открытие перезагрузило бы ардуино через DTR
+    connection.write(b'START\n')   # Отправка команды в байтовой форме
     print("START command sent.")
 
 
 async def main():
+    started = time.time()
+    metrics = Metrics()
     # Открытие файла для записи логов и CSV файла
-    with open(log_file_name, 'w') as log_file, open(csv_file_name, 'w', newline='') as csv_file:
+    # Лог и CSV дописываются, только если продолжается прерванный прогон; новый прогон начинает их заново
+    with SegmentedCaptureWriter(capture_file_name, SPEED_HOST_COLUMNS) as capture, \
+            open_log(log_file_name, log_compression, resume=capture.resumed) as log_file, \
+            open_run_csv(csv_file_name, csv_header(SPEED_HOST_COLUMNS), capture.resumed) as csv_file:
         csv_writer = csv.writer(csv_file)
-        # Запись заголовков таблицы
-        csv_writer.writerow(['Timestamp', 'Speed'])
-
-        loop = asyncio.get_running_loop()
-
-        # Запуск асинхронного чтения из последовательного порта
-        reader = SerialReader(log_file, csv_writer)
-        await serial_asyncio.create_serial_connection(loop, lambda: reader, serial_port, baud_rate)
-
-        # Отправка команды START
-        await send_start_command()
-
-        # Ожидание завершения теста
-        while not reader.test_complete:
-            await asyncio.sleep(1)
+        if capture.resumed:
+            print(f"Resuming interrupted run: {capture.rows} rows in {capture.segment} segments")
+
+        # Статистика останавливается после закрытия записи, чтобы итоговый снимок учел последние пачки
+        with reporting(metrics, stats_interval, stats_file_name, metrics_port), \
+                BatchWriter(log_file, csv_writer, csv_file, capture, echo=True, metrics=metrics) as sink:
+            # Запуск асинхронного чтения из последовательного порта
+            reader = SerialReader(sink, metrics)
+            connection = SerialConnection(serial_port, baud_rate, reader)
+            await connection.open()
+
+            try:
+                # Отправка команды START
+                await send_start_command(reader, connection)
+
+                # Ожидание завершения теста
+                await reader.events.wait('complete', complete_timeout)
+            finally:
+                connection.close()
 
     print("Log collection complete.")
     print("Plotting graph...")
     plot_graph()
 
+    # Файлы прогона переносятся в отдельный каталог и регистрируются в каталоге прогонов
+    from catalog import archive_run
+    run_files = [log_file_name, *rawlog_files(log_file_name), csv_file_name, stats_file_name]
+    run_directory = archive_run(run_files, capture_file_name,
+                                copies=[png_file_name], port=serial_port, started=started)
+    print(f"Run saved to {run_directory}")
+
 
 def plot_graph():
-    timestamps = []
-    speeds = []
+    # Графики строятся только после прогона: matplotlib не замедляет запуск и начало записи
+    import matplotlib.pyplot as plt
+    from decimate import DecimatedLine
 
-    # Чтение данных из CSV-файла
-    with open(csv_file_name, 'r') as csv_file:
-        csv_reader = csv.reader(csv_file)
-        next(csv_reader)  # Пропуск заголовка
-        for row in csv_reader:
-            timestamps.append(int(row[0]))
-            speeds.append(int(row[1]))
+    # Чтение данных из двоичной записи без построчного разбора; сегменты прореживаются по одному
+    timestamps, speeds = load_decimated(capture_file_name, 'speed')
 
     plt.figure(figsize=(10, 6))
-    plt.plot(timestamps, speeds, label='Speed', color='b', marker='o')
+    # Прореживание до ширины графика в пикселях сохраняет пики, но не рисует миллионы точек
+    DecimatedLine(plt.gca(), timestamps, speeds, label='Speed', color='b', marker='o')
     plt.xlabel('Time (ms)')
     plt.ylabel('Speed (PWM value)')
     plt.title('Motor Speed vs Time')
@@ -0,0 +1,345 @@
+import asyncio
+import contextlib
+import json
+import os
+import time
+
+# Количество пачек, после которого накопленное время разбора переносится в гистограмму
+parse_flush_batches = 1024
+
+
+class Histogram:
+    def __init__(self, sub_bits=4):
+        """
+        Гистограмма задержек в стиле HDR: корзины растут по степеням двойки, каждая делится на 2 ** sub_bits
+        линейных частей, поэтому относительная погрешность не больше 1 / 2 ** sub_bits при любом масштабе
+        :param sub_bits: Количество бит линейного деления внутри степени двойки
+        """
+        self.sub_bits = sub_bits
+        self.counts = [0] * ((64 - sub_bits) << sub_bits)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        """Добавляет значение (целое, например наносекунды)"""
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        shift = value.bit_length() - self.sub_bits - 1
+        if shift <= 0:
+            self.counts[value] += 1
+        else:
+            # Старшие sub_bits + 1 бит значения выбирают корзину внутри степени двойки
+            self.counts[(shift << self.sub_bits) + (value >> shift)] += 1
+
+    def record_many(self, values):
+        """Добавляет последовательность значений; быстрее, чем record для каждого"""
+        counts = self.counts
+        sub_bits = self.sub_bits
+        top = self.max
+        for value in values:
+            if value > top:
+                top = value
+            shift = value.bit_length() - sub_bits - 1
+            if shift <= 0:
+                counts[value] += 1
+            else:
+                counts[(shift << sub_bits) + (value >> shift)] += 1
+        self.count += len(values)
+        self.total += sum(values)
+        self.max = top
+
+    def _bucket_value(self, index):
+        # Верхняя граница корзины: оценка перцентиля не занижает задержку
+        size = 1 << self.sub_bits
+        if index < 2 * size:
+            return index
+        shift = (index >> self.sub_bits) - 1
+        return ((index - (shift << self.sub_bits) + 1) << shift) - 1
+
+    def percentile(self, level):
+        """Значение, не превышаемое level процентами записанных значений"""
+        if self.count == 0:
+            return 0
+        target = max(1, int(self.count * level / 100 + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._bucket_value(index), self.max)
+        return self.max
+
+    def snapshot(self, levels=(50, 90, 99, 99.9)):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'percentiles': {str(level): self.percentile(level) for level in levels},
+        }
+
+
+class SequenceMonitor:
+    def __init__(self, gap_factor=3.0, min_gap_ms=5):
+        """
+        Поиск разрывов в последовательности меток millis() ардуино
+        :param gap_factor: Во сколько раз интервал должен превысить обычный период, чтобы считаться разрывом
+        :param min_gap_ms: Минимальный разрыв (мс), меньшие интервалы не учитываются
+        """
+        self.gap_factor = gap_factor
+        self.min_gap_ms = min_gap_ms
+        self.period = None   # Сглаженный период отсчетов (мс)
+        self.slack = 0.0   # Допустимое превышение длительности пачки над ожидаемой: порог разрыва минус период
+        self.last = None
+        self.gaps = 0   # Количество разрывов
+        self.gap_ms = 0   # Суммарная длительность разрывов
+        self.max_gap_ms = 0
+        self.resets = 0   # Метка времени пошла назад: перезагрузка ардуино или поврежденная строка
+
+    def check(self, rows):
+        """
+        Проверяет метки времени очередной пачки
+        :param rows: Строки телеметрии пачки, первое значение - метка времени ардуино
+        """
+        if not rows:
+            return
+        first = rows[0][0]
+        last = rows[-1][0]
+        previous = self.last
+        self.last = last
+        if previous is None:
+            # Первая пачка: разрыв до нее не определен, проверяется только сброс внутри
+            if last < first:
+                self._scan(first, rows, None)
+            return
+        period = self.period
+        # Метки внутри пачки возрастают, поэтому сброс виден по ее краям, а разрыв - по тому, что пачка длиннее
+        # ожидаемого на величину порога; построчный разбор нужен только для таких пачек
+        if first < previous or last < first:
+            self._scan(previous, rows, None)
+        elif period and last - previous > len(rows) * period + self.slack:
+            self._scan(previous, rows, max(self.gap_factor * period, self.min_gap_ms))
+        # Период оценивается по всей пачке, один раз; порог пересчитывается вместе с ним
+        if last > previous:
+            period = (last - previous) / len(rows) if period is None else \
+                period * 0.9 + (last - previous) / len(rows) * 0.1
+            self.period = period
+            self.slack = max(self.gap_factor * period, self.min_gap_ms) - period
+
+    def _scan(self, previous, rows, limit):
+        for row in rows:
+            delta = row[0] - previous
+            if delta < 0:
+                self.resets += 1
+            elif limit is not None and delta > limit:
+                self.gaps += 1
+                self.gap_ms += delta
+                if delta > self.max_gap_ms:
+                    self.max_gap_ms = delta
+            previous = row[0]
+
+    def snapshot(self):
+        return {'period_ms': self.period, 'gaps': self.gaps, 'gap_ms': self.gap_ms, 'max_gap_ms': self.max_gap_ms,
+                'resets': self.resets}
+
+
+class Metrics:
+    def __init__(self, name='eng'):
+        """
+        Счетчики, гистограммы и показатели тракта чтение - разбор - запись
+        :param name: Префикс имен метрик
+        """
+        self.name = name
+        self.started = time.monotonic()
+        # Счетчики тракта чтения - атрибуты, а не элементы словаря: on_batch вызывается на каждую пачку
+        self.bytes = 0
+        self.lines = 0
+        self.rows = 0
+        self.batches = 0
+        self.counters = {}   # Прочие счетчики (count)
+        self.histograms = {}
+        self.gauges = {}
+        self.sequence = SequenceMonitor()
+        self._previous = ({}, self.started)   # Счетчики на момент прошлой строки статистики
+        self._parse = self.histogram('parse_ns')
+        # Время разбора пачек копится в списке и переносится в гистограмму пачками или перед снимком
+        self._parse_pending = []
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def gauge(self, name, function):
+        """Регистрирует показатель, значение которого считывается при снятии снимка"""
+        self.gauges[name] = function
+
+    def on_batch(self, size, lines, rows, received_ns):
+        """
+        Учет одной пачки данных из порта; вызывается в конце data_received
+        :param size: Количество принятых байт
+        :param lines: Количество строк в пачке
+        :param rows: Строки телеметрии, первое значение - метка времени ардуино
+        :param received_ns: time.monotonic_ns() приема пачки
+        """
+        self.bytes += size
+        self.lines += lines
+        self.rows += len(rows)
+        self.batches += 1
+        pending = self._parse_pending
+        pending.append(time.monotonic_ns() - received_ns)
+        if len(pending) >= parse_flush_batches:
+            self._flush_parse()
+        if rows:
+            self.sequence.check(rows)
+
+    def _flush_parse(self):
+        self._parse.record_many(self._parse_pending)
+        self._parse_pending = []
+
+    def counter_values(self):
+        """Все счетчики: тракта чтения и добавленные через count"""
+        counters = {'bytes': self.bytes, 'lines': self.lines, 'rows': self.rows, 'batches': self.batches}
+        counters.update(self.counters)
+        return counters
+
+    def snapshot(self):
+        """Снимок всех метрик в виде словаря для JSON"""
+        self._flush_parse()
+        return {
+            'name': self.name,
+            'uptime': time.monotonic() - self.started,
+            'counters': self.counter_values(),
+            'gauges': {name: function() for name, function in self.gauges.items()},
+            'histograms': {name: histogram.snapshot() for name, histogram in self.histograms.items()},
+            'sequence': self.sequence.snapshot(),
+        }
+
+    def stats_line(self):
+        """Строка статистики со скоростями с момента прошлого вызова"""
+        now = time.monotonic()
+        previous, previous_time = self._previous
+        elapsed = max(now - previous_time, 1e-9)
+        self._flush_parse()
+        counters = self.counter_values()
+        self._previous = (counters, now)
+
+        def rate(name):
+            return (counters.get(name, 0) - previous.get(name, 0)) / elapsed
+
+        parse = self.histograms.get('parse_ns')
+        write = self.histograms.get('write_ns')
+        parts = [
+            f"{rate('bytes') / 1024:8.1f} KiB/s",
+            f"{rate('lines'):8.0f} lines/s",
+            f"parse p99 {parse.percentile(99) / 1000 if parse else 0:7.1f} us",
+            f"write p99 {write.percentile(99) / 1e6 if write else 0:7.2f} ms",
+        ]
+        parts += [f"{name} {function()}" for name, function in self.gauges.items()]
+        sequence = self.sequence
+        parts.append(f"gaps {sequence.gaps} (max {sequence.max_gap_ms} ms)")
+        return f"[{self.name}] " + '  '.join(parts)
+
+    def write_json(self, path):
+        """Записывает снимок метрик; файл заменяется атомарно, чтобы читатель не увидел половину"""
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(self.snapshot(), f, indent=1)
+        os.replace(temporary, path)
+
+    def prometheus_text(self, labels=None, types=True):
+        """
+        Метрики в текстовом формате Prometheus
+        :param labels: Словарь меток, добавляемых к каждому значению (например, порт стенда)
+        :param types: Выводить ли строки # TYPE; для второго и следующих стендов на одной странице - False
+        """
+        label_text = ','.join(f'{key}="{value}"' for key, value in (labels or {}).items())
+        prefix = self.name
+
+        def sample(name, value, extra=''):
+            inner = ','.join(filter(None, (label_text, extra)))
+            return f"{prefix}_{name}{{{inner}}} {value}" if inner else f"{prefix}_{name} {value}"
+
+        self._flush_parse()
+        lines = []
+        for name, value in self.counter_values().items():
+            if types:
+                lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(sample(f"{name}_total", value))
+        for name, function in self.gauges.items():
+            if types:
+                lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(sample(name, function()))
+        for name, value in self.sequence.snapshot().items():
+            if value is not None:
+                lines.append(sample(f"sequence_{name}", value))
+        for name, histogram in self.histograms.items():
+            if types:
+                lines.append(f"# TYPE {prefix}_{name} summary")
+            for level in (50, 90, 99, 99.9):
+                lines.append(sample(name, histogram.percentile(level), f'quantile="{level / 100}"'))
+            lines.append(sample(f"{name}_sum", histogram.total))
+            lines.append(sample(f"{name}_count", histogram.count))
+        return '\n'.join(lines) + '\n'
+
+
+async def report_stats(metrics, interval=5.0, json_path=None, echo=True):
+    """
+    Периодически выводит строку статистики и обновляет снимок JSON
+    :param metrics: Metrics
+    :param interval: Период (с)
+    :param json_path: Путь к снимку JSON или None
+    :param echo: Выводить ли строку статистики в консоль
+    """
+    while True:
+        await asyncio.sleep(interval)
+        if echo:
+            print(metrics.stats_line())
+        if json_path is not None:
+            metrics.write_json(json_path)
+
+
+async def serve_prometheus(render, host='127.0.0.1', port=9108):
+    """
+    Локальная страница метрик для Prometheus: отвечает на любой GET текстом метрик; работает до отмены задачи
+    :param render: Функция без аргументов, возвращающая текст метрик
+    """
+    async def handle(reader, writer):
+        try:
+            # Заголовки запроса не нужны, дочитываем их до пустой строки
+            while (await reader.readline()).strip():
+                pass
+            body = render().encode()
+            writer.write(b"HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                         b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+@contextlib.contextmanager
+def reporting(metrics, interval=5.0, json_path=None, port=None, echo=True):
+    """
+    Вывод статистики, снимок JSON и страница Prometheus на время прогона; в конце пишется итоговый снимок.
+    Используется внутри работающего цикла событий
+    :param port: Порт страницы метрик на 127.0.0.1, None - не запускать
+    """
+    tasks = [asyncio.create_task(report_stats(metrics, interval, json_path, echo))]
+    if port is not None:
+        tasks.append(asyncio.create_task(serve_prometheus(metrics.prometheus_text, port=port)))
+    try:
+        yield metrics
+    finally:
+        for task in tasks:
+            task.cancel()
+        if json_path is not None:
+            metrics.write_json(json_path)
@@ -0,0 +1,245 @@
+import argparse
+import asyncio
+import csv
+import os
+import re
+import time
+from binary_protocol import TelemetryDecoder
+from sink import BatchWriter
+from capture import SPEED_WEIGHT_HOST_COLUMNS, csv_header
+from segments import SegmentedCaptureWriter
+from rawlog import CODECS, open_log
+from run_events import RunEvents, RunTimeoutError
+from connection import SerialConnection
+from timebase import ClockFit
+from metrics import Metrics, serve_prometheus
+from catalog import Catalog, new_run_directory, catalog_file_name
+
+# Параметры по умолчанию
+baud_rate = 115200
+output_dir = 'runs'
+status_interval = 1.0
+
+# Ограничения времени ожидания этапов прогона (с)
+start_prompt_timeout = 15
+complete_timeout = 60
+
+
+class RigReader(asyncio.Protocol):
+    def __init__(self, name, sink, metrics=None):
+        """
+        Чтение телеметрии одного стенда
+        :param name: Имя стенда для вывода в консоль
+        :param sink: BatchWriter стенда
+        :param metrics: Metrics стенда или None
+        """
+        self.name = name
+        self.sink = sink
+        self.metrics = metrics
+        self.transport = None
+        self.decoder = TelemetryDecoder()
+        self.events = RunEvents()
+        self.clock = ClockFit()   # Соответствие millis() ардуино и time.monotonic_ns() хоста
+        self.rows = 0   # Количество принятых строк телеметрии
+        self.last_timestamp = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        # После переподключения (автоматического в SerialConnection) ардуино могла перезагрузиться по DTR:
+        # недочитанный хвост прежнего соединения и модель часов прежней загрузки не используются
+        self.decoder.reset()
+        self.clock.reset()
+
+    def data_received(self, data):
+        # Время приема пачки; строки пачки пришли не позже этого момента
+        received = time.monotonic_ns()
+        lines = []
+        rows = []
+
+        for line, record in self.decoder.feed(data):
+            lines.append(line)
+
+            if record is not None:
+                weight = record.weight if record.weight is not None else 0
+                rows.append([record.timestamp, record.speed, weight])
+            else:
+                self.events.on_line(line)
+
+            if "Test complete" in line:
+                self.transport.close()
+
+        if rows:
+            self.rows += len(rows)
+            self.last_timestamp = rows[-1][0]
+            self.clock.stamp(rows, received)
+        self.sink.submit(lines, rows)
+        if self.metrics is not None:
+            self.metrics.on_batch(len(data), len(lines), rows, received)
+
+    def connection_lost(self, exc):
+        self.events.fail(ConnectionError(f"{self.name}: serial connection closed before the test completed: {exc}"))
+
+
+class Rig:
+    def __init__(self, port, directory, log_compression=None):
+        """
+        Один стенд: порт, собственные файлы записи и состояние прогона
+        :param port: Последовательный порт стенда
+        :param directory: Каталог для eng.log, eng.csv и сегментов записи eng_capture стенда
+        :param log_compression: Сжатие сырого лога ('zlib', 'lzma'), None - текстовый eng.log
+        """
+        self.port = port
+        self.directory = directory
+        self.log_compression = log_compression
+        self.state = 'waiting'
+        self.error = None
+        self.reader = None
+        self.sink = None
+        self.metrics = Metrics()
+
+    async def run(self):
+        os.makedirs(self.directory, exist_ok=True)
+        log_path = os.path.join(self.directory, 'eng.log')
+        csv_path = os.path.join(self.directory, 'eng.csv')
+        capture_path = os.path.join(self.directory, 'eng_capture')
+
+        with open_log(log_path, self.log_compression) as log_file, open(csv_path, 'w', newline='') as csv_file, \
+                SegmentedCaptureWriter(capture_path, SPEED_WEIGHT_HOST_COLUMNS, {'port': self.port}) as capture:
+            csv_writer = csv.writer(csv_file)
+            csv_writer.writerow(csv_header(SPEED_WEIGHT_HOST_COLUMNS))
+
+            with BatchWriter(log_file, csv_writer, csv_file, capture, metrics=self.metrics) as self.sink:
+                self.reader = RigReader(self.port, self.sink, self.metrics)
+                connection = SerialConnection(self.port, baud_rate, self.reader)
+                self.state = 'connecting'
+                await connection.open()
+
+                try:
+                    self.state = 'calibrating'
+                    try:
+                        await self.reader.events.wait('start_prompt', start_prompt_timeout)
+                    except RunTimeoutError:
+                        pass   # Ардуино уже могла вывести приглашение до подключения
+                    connection.write(b'START\n')
+                    self.state = 'running'
+                    await self.reader.events.wait('complete', complete_timeout)
+                    self.state = 'complete'
+                finally:
+                    connection.close()
+        self.metrics.write_json(os.path.join(self.directory, 'eng_stats.json'))
+
+    async def run_safe(self):
+        """Запускает прогон, ошибка одного стенда не останавливает остальные"""
+        try:
+            await self.run()
+        except Exception as e:
+            self.state = 'failed'
+            self.error = e
+
+
+def discover_ports():
+    """Поиск подключенных устройств, как в TestApp.get_ports"""
+    import serial.tools.list_ports
+    return [port.device for port in serial.tools.list_ports.comports()]
+
+
+def rig_directory(root, port):
+    """Каталог стенда, имя которого получено из имени порта"""
+    return os.path.join(root, re.sub(r'[^\w.-]+', '_', port.strip('/')))
+
+
+def format_status(rigs, previous_rows, elapsed):
+    """
+    Сводная таблица состояния стендов
+    :param rigs: Список стендов
+    :param previous_rows: Количество строк каждого стенда на момент прошлого вывода
+    :param elapsed: Время с прошлого вывода (с)
+    """
+    lines = [f"{'port':28s} {'state':12s} {'rows':>10s} {'rows/s':>10s} {'queue':>6s} {'dropped':>8s} {'gaps':>6s}"]
+    total_rate = 0.0
+    for rig, prev in zip(rigs, previous_rows):
+        rows = rig.reader.rows if rig.reader else 0
+        rate = (rows - prev) / elapsed if elapsed > 0 else 0.0
+        total_rate += rate
+        queue = rig.sink.queue_depth if rig.sink else 0
+        dropped = rig.sink.dropped_lines if rig.sink else 0
+        state = rig.state if rig.error is None else f"failed: {rig.error}"
+        gaps = rig.metrics.sequence.gaps
+        lines.append(f"{rig.port:28s} {state:12s} {rows:10d} {rate:10.0f} {queue:6d} {dropped:8d} {gaps:6d}")
+    lines.append(f"{len(rigs)} rigs, {total_rate:.0f} rows/s total")
+    return '\n'.join(lines)
+
+
+async def report_status(rigs, interval):
+    previous_rows = [0] * len(rigs)
+    previous_time = time.monotonic()
+    while True:
+        await asyncio.sleep(interval)
+        now = time.monotonic()
+        print(format_status(rigs, previous_rows, now - previous_time))
+        previous_rows = [rig.reader.rows if rig.reader else 0 for rig in rigs]
+        previous_time = now
+
+
+def prometheus_text(rigs):
+    """Метрики всех стендов на одной странице, стенд различается меткой rig"""
+    return ''.join(rig.metrics.prometheus_text({'rig': rig.port}, types=i == 0) for i, rig in enumerate(rigs))
+
+
+async def run_rigs(ports, root=output_dir, interval=status_interval, catalog_path=None, metrics_port=None,
+                   log_compression=None):
+    """
+    Параллельный прогон всех стендов в одном цикле событий
+    :param ports: Список последовательных портов
+    :param root: Каталог для записей стендов; каждый запуск пишет в новый подкаталог
+    :param interval: Интервал вывода сводной таблицы (с), None - не выводить
+    :param catalog_path: Каталог прогонов для регистрации завершенных прогонов, None - не регистрировать
+    :param metrics_port: Порт страницы метрик Prometheus на 127.0.0.1, None - не запускать
+    :param log_compression: Сжатие сырых логов стендов ('zlib', 'lzma'), None - текстовые логи
+    :return: Список стендов с итоговым состоянием
+    """
+    started = time.time()
+    session = new_run_directory(root)
+    rigs = [Rig(port, rig_directory(session, port), log_compression) for port in ports]
+    tasks = [asyncio.create_task(report_status(rigs, interval))] if interval else []
+    if metrics_port is not None:
+        tasks.append(asyncio.create_task(serve_prometheus(lambda: prometheus_text(rigs), port=metrics_port)))
+    try:
+        await asyncio.gather(*(rig.run_safe() for rig in rigs))
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    if catalog_path is not None:
+        with Catalog(catalog_path) as catalog:
+            for rig in rigs:
+                if rig.state == 'complete':
+                    catalog.add_run(os.path.join(rig.directory, 'eng_capture'), port=rig.port, started=started)
+    return rigs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Одновременная запись нескольких стендов")
+    parser.add_argument('ports', nargs='*', help="Последовательные порты стендов")
+    parser.add_argument('--discover', action='store_true', help="Найти порты автоматически")
+    parser.add_argument('--output', default=output_dir, help="Каталог для записей стендов")
+    parser.add_argument('--status-interval', type=float, default=status_interval)
+    parser.add_argument('--catalog', default=catalog_file_name, help="Файл каталога прогонов")
+    parser.add_argument('--metrics-port', type=int, help="Порт страницы метрик Prometheus")
+    parser.add_argument('--log-compression', choices=list(CODECS), help="Сжимать сырые логи стендов (eng.log.z)")
+    args = parser.parse_args()
+
+    ports = list(args.ports)
+    if args.discover:
+        ports += [port for port in discover_ports() if port not in ports]
+    if not ports:
+        parser.error("no ports given and none discovered")
+
+    started = time.monotonic()
+    rigs = asyncio.run(run_rigs(ports, args.output, args.status_interval, args.catalog, args.metrics_port,
+                                args.log_compression))
+    print(format_status(rigs, [0] * len(rigs), time.monotonic() - started))
+
+
+if __name__ == "__main__":
+    main()
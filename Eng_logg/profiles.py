@@ -0,0 +1,255 @@
+import argparse
+import asyncio
+import time
+from collections import deque
+from metrics import Histogram
+from run_events import ACK_MESSAGE
+
+# Команды скетча: цифра 1-9 задает 10-90% газа, '-' останавливает двигатель и завершает тест
+throttle_step = 10
+min_profile_throttle = 10
+max_profile_throttle = 90
+STOP_COMMAND = '-'
+
+# Шаг по времени, с которым разгон переводится в уставки (с), как delay(100) в runMotorTest()
+ramp_interval = 0.1
+# Пауза между профилями (с) и ожидание последних подтверждений (с)
+profile_pause = 1.0
+ack_timeout = 1.0
+
+
+class Setpoint:
+    """Одна команда расписания"""
+    __slots__ = ('offset', 'command', 'throttle', 'profile')
+
+    def __init__(self, offset, command, throttle, profile):
+        self.offset = offset   # Время отправки от начала расписания (с)
+        self.command = command
+        self.throttle = throttle   # Газ (%), которому соответствует команда
+        self.profile = profile
+
+    def __repr__(self):
+        return f"Setpoint({self.offset:.3f}, {self.command!r}, {self.throttle}, {self.profile!r})"
+
+
+def throttle_command(throttle):
+    """
+    Команда скетча для газа
+    :param throttle: Газ (%), округляется до шага команд
+    """
+    # Половина шага округляется вверх: 25% - команда 3
+    level = int(throttle / throttle_step + 0.5)
+    if not min_profile_throttle <= level * throttle_step <= max_profile_throttle:
+        raise ValueError(f"Throttle {throttle}% is outside {min_profile_throttle}-{max_profile_throttle}%")
+    return str(level), level * throttle_step
+
+
+def _number(value, what, where):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise ValueError(f"{where}: {what} must be a non-negative number, got {value!r}")
+    return float(value)
+
+
+def compile_profile(profile, start=0.0, throttle=None):
+    """
+    Переводит шаги профиля в уставки
+    :param profile: Словарь профиля: name, steps, repeat (по умолчанию 1)
+    :param start: Время начала профиля в расписании (с)
+    :param throttle: Газ перед началом профиля (%), None - двигатель стоит
+    :return: Список Setpoint, время окончания профиля и газ в конце
+    """
+    name = profile.get('name', 'profile')
+    steps = profile.get('steps')
+    if not steps:
+        raise ValueError(f"Profile {name!r} has no steps")
+    points = []
+    offset = start
+
+    def set_throttle(value, where):
+        nonlocal throttle
+        try:
+            command, level = throttle_command(value)
+        except ValueError as e:
+            raise ValueError(f"{where}: {e}") from None
+        points.append(Setpoint(offset, command, level, name))
+        throttle = value
+
+    for _ in range(int(profile.get('repeat', 1))):
+        for number, step in enumerate(steps, 1):
+            where = f"profile {name!r} step {number}"
+            if not isinstance(step, dict) or len(step) != 1:
+                raise ValueError(f"{where}: expected one of 'step', 'hold', 'ramp', got {step!r}")
+            (kind, value), = step.items()
+            if kind == 'step':
+                set_throttle(_number(value, 'throttle', where), where)
+            elif kind == 'hold':
+                offset += _number(value, 'duration', where)
+            elif kind == 'ramp':
+                if not isinstance(value, dict) or 'to' not in value or 'duration' not in value:
+                    raise ValueError(f"{where}: ramp needs 'to' and 'duration'")
+                target = _number(value['to'], 'to', where)
+                duration = _number(value['duration'], 'duration', where)
+                interval = _number(value.get('interval', ramp_interval), 'interval', where) or ramp_interval
+                origin = throttle if throttle is not None else min_profile_throttle
+                ticks = max(1, int(round(duration / interval)))
+                # Линейный разгон от текущего газа: уставка в конце каждого шага, последняя - ровно target
+                ramp_start = offset
+                for tick in range(1, ticks + 1):
+                    offset = ramp_start + duration * tick / ticks
+                    set_throttle(origin + (target - origin) * tick / ticks, where)
+            else:
+                raise ValueError(f"{where}: unknown step kind {kind!r}")
+    return points, offset, throttle
+
+
+def compile_profiles(document, pause=None, stop=True):
+    """
+    Расписание для нескольких профилей подряд
+    :param document: Разобранный YAML: словарь с ключами profiles и pause, либо список профилей
+    :param pause: Пауза между профилями (с), по умолчанию из документа или profile_pause
+    :param stop: Добавить в конце команду остановки
+    :return: Список Setpoint; повторы одной и той же команды подряд убраны
+    """
+    if isinstance(document, list):
+        document = {'profiles': document}
+    if not isinstance(document, dict) or not document.get('profiles'):
+        raise ValueError("Profile file must contain a non-empty 'profiles' list")
+    pause = _number(document.get('pause', profile_pause) if pause is None else pause, 'pause', 'profiles')
+
+    schedule = []
+    offset = 0.0
+    throttle = None
+    for index, profile in enumerate(document['profiles']):
+        if index:
+            offset += pause
+        points, offset, throttle = compile_profile(profile, offset, throttle)
+        schedule += points
+    if stop:
+        schedule.append(Setpoint(offset, STOP_COMMAND, 0, None))
+
+    # Разгон в пределах одного шага газа дает одинаковые команды, отправляется только первая
+    result = []
+    for point in schedule:
+        if not result or point.command != result[-1].command:
+            result.append(point)
+    return result
+
+
+def load_profiles(path, pause=None, stop=True):
+    """Читает YAML профилей и строит расписание, см. compile_profiles"""
+    import yaml
+
+    with open(path, 'r') as f:
+        return compile_profiles(yaml.safe_load(f), pause, stop)
+
+
+async def run_schedule(schedule, send):
+    """
+    Отправляет команды расписания в заданные моменты. Сроки отсчитываются от начала расписания, а не от
+    предыдущей команды, поэтому задержка одной отправки не сдвигает следующие
+    :param schedule: Список Setpoint
+    :param send: Функция отправки, получает Setpoint
+    :return: Histogram опоздания отправки относительно срока (нс)
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    lateness = Histogram()
+    for point in schedule:
+        deadline = start + point.offset
+        delay = deadline - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        send(point)
+        lateness.record(max(0, int((loop.time() - deadline) * 1e9)))
+    return lateness
+
+
+class ProfileRunner:
+    def __init__(self, connection, reader, echo=True):
+        """
+        Выполнение расписания профилей через открытое подключение
+        :param connection: SerialConnection
+        :param reader: SerialReader подключения: log_command, log_ack и events
+        :param echo: Выводить ли отправленные команды в консоль
+        """
+        self.connection = connection
+        self.reader = reader
+        self.echo = echo
+        self.pending = deque()   # Отправленные команды, ожидающие подтверждения: (команда, host_ns отправки)
+        self.sent = 0
+        self.acked = 0
+        self.unexpected_acks = 0   # Подтверждения команд, которых нет среди ожидающих
+        self.ack_latency = Histogram()   # Время от отправки до эха команды (нс)
+        self.lateness = None
+        self._drained = asyncio.Event()
+
+    def send(self, point):
+        self.connection.write((point.command + '\n').encode('utf-8'))
+        sent = self.reader.log_command(point.command)
+        self.pending.append((point.command, sent))
+        self._drained.clear()
+        self.sent += 1
+        if self.echo:
+            print(f"Sent command: {point.command} ({point.throttle}%, {point.profile or 'stop'}, "
+                  f"t={point.offset:.2f} s)")
+
+    def on_line(self, line):
+        """Сопоставляет эхо ардуино с отправленными командами; подтверждения приходят по порядку"""
+        if not line.startswith(ACK_MESSAGE):
+            return
+        received = time.monotonic_ns()
+        command = line[len(ACK_MESSAGE):].strip()
+        while self.pending:
+            expected, sent = self.pending.popleft()
+            if expected == command:
+                latency = received - sent
+                self.acked += 1
+                self.ack_latency.record(latency)
+                self.reader.log_ack(command, latency)
+                break
+        else:
+            self.unexpected_acks += 1
+        if not self.pending:
+            self._drained.set()
+
+    async def run(self, schedule, timeout=ack_timeout):
+        """
+        Выполняет расписание и ждет подтверждения последних команд
+        :return: Сводка: количество команд и подтверждений, перцентили опоздания и задержки подтверждения (мс)
+        """
+        self.reader.events.listeners.append(self.on_line)
+        try:
+            self.lateness = await run_schedule(schedule, self.send)
+            if self.pending:
+                try:
+                    await asyncio.wait_for(self._drained.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.reader.events.listeners.remove(self.on_line)
+        return self.summary()
+
+    def summary(self):
+        summary = {'sent': self.sent, 'acked': self.acked, 'missing_acks': self.sent - self.acked,
+                   'unexpected_acks': self.unexpected_acks}
+        for name, histogram in (('lateness', self.lateness), ('ack_latency', self.ack_latency)):
+            if histogram is not None and histogram.count:
+                summary[f'{name}_ms'] = {level: histogram.percentile(level) / 1e6 for level in (50, 99)}
+                summary[f'{name}_ms']['max'] = histogram.max / 1e6
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка файла профилей: расписание команд без отправки")
+    parser.add_argument('path', nargs='?', default='profiles.yaml')
+    parser.add_argument('--pause', type=float, help="Пауза между профилями (с)")
+    args = parser.parse_args()
+
+    schedule = load_profiles(args.path, args.pause)
+    for point in schedule:
+        print(f"{point.offset:8.2f} s  {point.command}  {point.throttle:3d}%  {point.profile or 'stop'}")
+    print(f"{len(schedule)} commands, {schedule[-1].offset:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
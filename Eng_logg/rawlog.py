@@ -0,0 +1,309 @@
+import argparse
+import json
+import os
+import struct
+import zlib
+from segments import open_append
+
+# Сжатый лог: последовательность независимо сжатых блоков строк. Перед каждым блоком - заголовок:
+# метка, алгоритм, CRC32 и длина сжатых данных, количество строк и метки времени ардуино строк блока
+# (первой, последней, минимальная и максимальная; -1 - до первой строки телеметрии)
+RAWLOG_SUFFIX = '.z'
+INDEX_SUFFIX = '.idx'
+BLOCK_MAGIC = b'RLB1'
+BLOCK_HEADER = struct.Struct('<4sBIIIqqqq')
+
+ZLIB = 'zlib'
+LZMA = 'lzma'
+CODECS = {ZLIB: 0, LZMA: 1}
+
+# Размер несжатого блока (байт): больше - лучше сжатие, меньше - меньше лишнего распаковывается при поиске
+block_size = 256 << 10
+zlib_level = 9
+lzma_preset = 6
+
+TELEMETRY_PREFIX = 'timestamp,'
+NO_TIMESTAMP = -1
+
+
+def rawlog_files(log_path):
+    """Файлы сжатого лога для лога log_path: сам лог и его индекс блоков"""
+    path = log_path + RAWLOG_SUFFIX
+    return path, path + INDEX_SUFFIX
+
+
+def line_timestamp(line):
+    """Метка времени ардуино строки телеметрии или None для служебной строки"""
+    if line.startswith(TELEMETRY_PREFIX):
+        end = line.find(',', len(TELEMETRY_PREFIX))
+        try:
+            return int(line[len(TELEMETRY_PREFIX):end if end >= 0 else None])
+        except ValueError:
+            return None
+    return None
+
+
+def compress(data, codec):
+    if codec == ZLIB:
+        return zlib.compress(data, zlib_level)
+    import lzma
+    return lzma.compress(data, preset=lzma_preset)
+
+
+def decompress(data, codec_id):
+    if codec_id == CODECS[ZLIB]:
+        return zlib.decompress(data)
+    import lzma
+    return lzma.decompress(data)
+
+
+def scan_blocks(f):
+    """
+    Заголовки блоков файла по порядку
+    :return: Список блоков (словари) и смещение конца последнего целого блока
+    """
+    blocks = []
+    size = f.seek(0, os.SEEK_END)
+    offset = 0
+    while offset + BLOCK_HEADER.size <= size:
+        f.seek(offset)
+        magic, codec, crc, length, lines, first, last, lowest, highest = BLOCK_HEADER.unpack(
+            f.read(BLOCK_HEADER.size))
+        if magic != BLOCK_MAGIC or offset + BLOCK_HEADER.size + length > size:
+            break
+        blocks.append({'offset': offset, 'codec': codec, 'crc': crc, 'length': length, 'lines': lines,
+                       'first': first, 'last': last, 'min': lowest, 'max': highest})
+        offset += BLOCK_HEADER.size + length
+    return blocks, offset
+
+
+class CompressedLog:
+    def __init__(self, path, codec=ZLIB, block_bytes=None):
+        """
+        Сжатый лог с интерфейсом текстового файла для BatchWriter. Строки копятся в блок, блок сжимается
+        целиком при записи (в потоке BatchWriter, а не в цикле событий); zlib и lzma отпускают GIL на время
+        сжатия. Существующий файл дописывается, недописанный после сбоя блок отрезается
+        :param path: Путь к файлу сжатого лога
+        :param codec: Алгоритм сжатия: ZLIB или LZMA
+        :param block_bytes: Размер несжатого блока (байт), по умолчанию block_size
+        """
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec!r}, expected one of {', '.join(CODECS)}")
+        self.path = path
+        self.name = path
+        self.codec = codec
+        self.block_bytes = block_bytes or block_size
+        self.buffer = []   # Строки текущего блока
+        self.buffered = 0   # Размер текущего блока (символов)
+        self.timestamp = None   # Последняя метка времени телеметрии, к ней относятся следующие служебные строки
+        self.blocks = []
+        self.raw_bytes = 0   # Несжатых байт в записанных блоках
+        self.repaired_bytes = 0   # Байт недописанного блока, отброшенных при открытии
+
+        if os.path.exists(path):
+            self.file = open(path, 'r+b')
+            self.blocks, end = scan_blocks(self.file)
+            self.repaired_bytes = self.file.seek(0, os.SEEK_END) - end
+            if self.repaired_bytes:
+                self.file.truncate(end)
+                os.fsync(self.file.fileno())
+            self.file.seek(end)
+            if self.blocks and self.blocks[-1]['last'] != NO_TIMESTAMP:
+                self.timestamp = self.blocks[-1]['last']
+        else:
+            self.file = open(path, 'wb')
+        # Индекс описывает закрытый файл; пока лог открыт, он неактуален
+        if os.path.exists(path + INDEX_SUFFIX):
+            os.remove(path + INDEX_SUFFIX)
+
+    def write(self, text):
+        """Дописывает текст; блок закрывается только на границе строк"""
+        self.buffer.append(text)
+        self.buffered += len(text)
+        if self.buffered >= self.block_bytes:
+            self._write_block()
+
+    def _write_block(self):
+        text = ''.join(self.buffer)
+        end = text.rfind('\n') + 1
+        # Незаконченная строка переносится в следующий блок
+        tail = text[end:]
+        self.buffer = [tail] if tail else []
+        self.buffered = len(tail)
+        if not end:
+            return
+
+        lines = text[:end].split('\n')[:-1]
+        keys = []
+        timestamp = self.timestamp
+        for line in lines:
+            value = line_timestamp(line)
+            if value is not None:
+                timestamp = value
+            keys.append(NO_TIMESTAMP if timestamp is None else timestamp)
+        self.timestamp = timestamp
+        known = [key for key in keys if key != NO_TIMESTAMP]
+
+        data = text[:end].encode('utf-8')
+        payload = compress(data, self.codec)
+        header = (CODECS[self.codec], zlib.crc32(payload), len(payload), len(lines), keys[0], keys[-1],
+                  min(known, default=NO_TIMESTAMP), max(known, default=NO_TIMESTAMP))
+        offset = self.file.tell()
+        self.file.write(BLOCK_HEADER.pack(BLOCK_MAGIC, *header) + payload)
+        self.blocks.append(dict(zip(('offset', 'codec', 'crc', 'length', 'lines', 'first', 'last', 'min', 'max'),
+                                    (offset,) + header)))
+        self.raw_bytes += len(data)
+
+    def flush(self):
+        """Сжимает накопленные строки отдельным блоком и сбрасывает файл; частый вызов ухудшает сжатие"""
+        if self.buffered:
+            self._write_block()
+        self.file.flush()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        """Дописывает последний блок и атомарно пишет индекс блоков"""
+        if self.file.closed:
+            return
+        self.flush()
+        os.fsync(self.file.fileno())
+        size = self.file.tell()
+        self.file.close()
+        path = self.path + INDEX_SUFFIX
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'size': size, 'blocks': self.blocks}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class RawLogReader:
+    def __init__(self, path):
+        """
+        Чтение сжатого лога с поиском по меткам времени ардуино: распаковываются только нужные блоки
+        :param path: Путь к файлу сжатого лога
+        """
+        self.path = path
+        self.file = open(path, 'rb')
+        self.blocks_read = 0   # Распаковано блоков
+        self.blocks = None
+        size = os.path.getsize(path)
+        try:
+            with open(path + INDEX_SUFFIX) as f:
+                index = json.load(f)
+            if index['size'] == size:
+                self.blocks = index['blocks']
+        except FileNotFoundError:
+            pass
+        if self.blocks is None:
+            # Лог не закрыт (запись идет или прервана): индекс собирается по заголовкам блоков
+            self.blocks, _ = scan_blocks(self.file)
+
+    def read_block(self, block):
+        """Строки одного блока"""
+        self.file.seek(block['offset'] + BLOCK_HEADER.size)
+        payload = self.file.read(block['length'])
+        if zlib.crc32(payload) != block['crc']:
+            raise ValueError(f"{self.path}: block at {block['offset']} is corrupted")
+        self.blocks_read += 1
+        return decompress(payload, block['codec']).decode('utf-8').split('\n')[:-1]
+
+    def iter_lines(self):
+        for block in self.blocks:
+            yield from self.read_block(block)
+
+    def read_range(self, start=None, stop=None):
+        """
+        Строки, относящиеся к меткам времени ардуино в интервале [start, stop]: строки телеметрии с такими
+        метками и служебные строки, пришедшие после них
+        :param start: Начало интервала, None - с начала лога (включая строки до первой телеметрии)
+        :param stop: Конец интервала, None - до конца лога
+        :return: Список строк
+        """
+        lines = []
+        for block in self.blocks:
+            if block['max'] == NO_TIMESTAMP:
+                # В блоке нет телеметрии: все его строки относятся к метке first
+                if block['first'] == NO_TIMESTAMP:
+                    if start is not None:
+                        continue
+                elif (start is not None and block['first'] < start) or (stop is not None and block['first'] > stop):
+                    continue
+            elif (start is not None and max(block['max'], block['first']) < start) or \
+                    (stop is not None and min(block['min'], block['first']) > stop):
+                continue
+            timestamp = block['first'] if block['first'] != NO_TIMESTAMP else None
+            for line in self.read_block(block):
+                value = line_timestamp(line)
+                if value is not None:
+                    timestamp = value
+                if timestamp is None:
+                    if start is None:
+                        lines.append(line)
+                elif (start is None or timestamp >= start) and (stop is None or timestamp <= stop):
+                    lines.append(line)
+        return lines
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def open_log(path, compression=None, resume=False):
+    """
+    Открывает лог прогона для BatchWriter
+    :param path: Путь к текстовому логу
+    :param compression: None - текстовый лог, ZLIB или LZMA - сжатый лог path + RAWLOG_SUFFIX
+    :param resume: Дописать лог прерванного прогона; иначе лог начинается заново
+    """
+    if compression is None:
+        return open_append(path) if resume else open(path, 'w')
+    log_path = rawlog_files(path)[0]
+    if not resume and os.path.exists(log_path):
+        os.remove(log_path)
+    return CompressedLog(log_path, compression)
+
+
+def compress_file(source, destination, codec=ZLIB):
+    """Сжимает готовый текстовый лог, например архив старых прогонов"""
+    with open(source, 'r') as src, CompressedLog(destination, codec) as log:
+        while True:
+            text = src.read(block_size)
+            if not text:
+                break
+            log.write(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сжатый лог: выборка строк по времени ардуино или сжатие лога")
+    parser.add_argument('path', nargs='?', default='eng.log' + RAWLOG_SUFFIX)
+    parser.add_argument('--start', type=int, help="Начало интервала (мс ардуино)")
+    parser.add_argument('--stop', type=int, help="Конец интервала (мс ардуино)")
+    parser.add_argument('--compress', metavar='LOG', help="Сжать текстовый лог LOG в path")
+    parser.add_argument('--codec', choices=list(CODECS), default=ZLIB)
+    args = parser.parse_args()
+
+    if args.compress:
+        compress_file(args.compress, args.path, args.codec)
+        print(f"{args.compress}: {os.path.getsize(args.compress)} -> {os.path.getsize(args.path)} bytes")
+        return
+    with RawLogReader(args.path) as reader:
+        for line in reader.read_range(args.start, args.stop):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
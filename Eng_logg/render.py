@@ -0,0 +1,169 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from capture import read_header
+from catalog import runs_dir
+from segments import SEGMENT_SUFFIX, list_segments
+
+# Файлы, которые строятся рядом с записью прогона
+speed_png_file_name = 'motor_speed_plot.png'
+weight_png_file_name = 'motor_weight_plot.png'
+summary_file_name = 'summary.txt'
+
+
+def save_plot(path, timestamps, values, label, color, ylabel, title):
+    """
+    Сохраняет один график в PNG. Используется холст Agg без pyplot: фигура не попадает в глобальное
+    состояние matplotlib, поэтому графики можно строить параллельно в разных процессах
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from decimate import DecimatedLine
+
+    figure = Figure(figsize=(10, 4))
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    # Прореживание до ширины графика в пикселях сохраняет пики, но не рисует миллионы точек
+    DecimatedLine(ax, timestamps, values, label=label, color=color, marker='o')
+    ax.set_xlabel('Time (ms)')
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
+    ax.legend()
+    ax.grid(True)
+    figure.tight_layout()
+    figure.savefig(path)
+
+
+def render_plots(capture_path, speed_path, weight_path=None):
+    """
+    Строит отдельные графики скорости и веса по записи прогона
+    :param capture_path: Двоичная запись или каталог сегментов
+    :param weight_path: PNG графика веса; не строится, если None или в записи нет веса
+    :return: Количество строк записи
+    """
+    from capture import load_capture_parts, load_decimated
+
+    # Сегменты отображаются в память по одному и прореживаются, запись не копируется в память целиком
+    header, parts = load_capture_parts(capture_path)
+    save_plot(speed_path, *load_decimated(capture_path, 'speed'), 'Speed', 'b', 'Speed (PWM value)',
+              'Motor Speed vs Time')
+    if weight_path is not None and 'weight' in [name for name, _ in header['columns']]:
+        save_plot(weight_path, *load_decimated(capture_path, 'weight'), 'Weight', 'r', 'Weight (units)',
+                  'Weight vs Time')
+    return sum(len(data) for data in parts)
+
+
+def find_captures(root=runs_dir):
+    """Записи прогонов в каталоге архива: каталоги сегментов и отдельные файлы записи"""
+    captures = []
+    for directory, subdirectories, files in os.walk(root):
+        if list_segments(directory):
+            captures.append(directory)
+            subdirectories.clear()
+            continue
+        captures += [os.path.join(directory, name) for name in files if name.endswith(SEGMENT_SUFFIX)]
+        subdirectories.sort()
+    return sorted(captures)
+
+
+def capture_header(capture_path):
+    return read_header(list_segments(capture_path)[0] if os.path.isdir(capture_path) else capture_path)[0]
+
+
+def capture_mtime(capture_path):
+    """Время последнего изменения записи; у каталога сегментов - самого нового файла в нем"""
+    if not os.path.isdir(capture_path):
+        return os.path.getmtime(capture_path)
+    with os.scandir(capture_path) as entries:
+        return max((entry.stat().st_mtime for entry in entries if entry.is_file()), default=0.0)
+
+
+def run_outputs(capture_path):
+    """Пути графиков и сводки прогона: рядом с записью, в каталоге прогона"""
+    directory = os.path.dirname(os.path.abspath(capture_path))
+    columns = [name for name, _ in capture_header(capture_path)['columns']]
+    return (os.path.join(directory, speed_png_file_name),
+            os.path.join(directory, weight_png_file_name) if 'weight' in columns else None,
+            os.path.join(directory, summary_file_name))
+
+
+def is_fresh(capture_path, outputs):
+    """Все результаты существуют и новее записи"""
+    modified = capture_mtime(capture_path)
+    return all(os.path.exists(path) and os.path.getmtime(path) >= modified for path in outputs if path)
+
+
+def render_run(capture_path, force=False):
+    """
+    Графики и сводка одного прогона; выполняется в процессе пула
+    :param force: Строить, даже если результаты новее записи
+    :return: Путь записи, количество строк (0, если прогон пропущен) и признак того, что он построен
+    """
+    from analysis import analyze
+
+    speed_path, weight_path, summary_path = outputs = run_outputs(capture_path)
+    if not force and is_fresh(capture_path, outputs):
+        return capture_path, 0, False
+    rows = render_plots(capture_path, speed_path, weight_path)
+    with open(summary_path, 'w') as f:
+        f.write(analyze(capture_path).report() + '\n')
+    return capture_path, rows, True
+
+
+def preload():
+    """Импорт matplotlib и numpy один раз на процесс пула, а не на каждый прогон"""
+    import matplotlib.figure  # noqa: F401
+    import matplotlib.backends.backend_agg  # noqa: F401
+    import analysis  # noqa: F401
+    import decimate  # noqa: F401
+
+
+def render_all(captures, workers=None, force=False, echo=True):
+    """
+    Перестраивает графики и сводки прогонов в пуле процессов
+    :param captures: Пути записей, см. find_captures
+    :param workers: Количество процессов, None - по числу ядер
+    :return: Словарь: rendered, skipped, failed, rows, seconds и failures - список (путь записи, ошибка)
+    """
+    stats = {'rendered': 0, 'skipped': 0, 'failed': 0, 'rows': 0, 'failures': []}
+    # При запуске процессов через fork импорты родителя наследуются, и пул не тратит время на matplotlib
+    preload()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=preload) as executor:
+        futures = {executor.submit(render_run, path, force): path for path in captures}
+        for future in as_completed(futures):
+            try:
+                path, rows, rendered = future.result()
+            except Exception as e:
+                # Ошибка одного прогона (поврежденная запись, сбой matplotlib или анализа, падение процесса
+                # пула) не останавливает остальные
+                error = f"{type(e).__name__}: {e}"
+                stats['failed'] += 1
+                stats['failures'].append((futures[future], error))
+                if echo:
+                    print(f"Cannot render {futures[future]}: {error}")
+                continue
+            stats['rendered' if rendered else 'skipped'] += 1
+            stats['rows'] += rows
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Графики скорости и веса и сводки для архивных прогонов")
+    parser.add_argument('root', nargs='?', default=runs_dir, help="Каталог архива прогонов")
+    parser.add_argument('--workers', type=int, help="Количество процессов (по умолчанию по числу ядер)")
+    parser.add_argument('--force', action='store_true', help="Перестроить все прогоны, даже неизмененные")
+    args = parser.parse_args()
+
+    captures = find_captures(args.root)
+    stats = render_all(captures, args.workers, args.force)
+    seconds = max(stats['seconds'], 1e-9)
+    print(f"{len(captures)} runs: {stats['rendered']} rendered, {stats['skipped']} up to date, "
+          f"{stats['failed']} failed in {seconds:.1f} s  ({stats['rendered'] / seconds:.1f} runs/s, "
+          f"{stats['rows'] / seconds:.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import asyncio
+
+# Сообщения скетча, по которым отмечаются этапы прогона
+READY_MESSAGE = "System Ready"
+START_PROMPT_MESSAGE = "Enter START"
+COMPLETE_MESSAGE = "Test complete"
+# Эхо принятой команды, служит подтверждением
+ACK_MESSAGE = "Received command: "
+
+
+class RunTimeoutError(TimeoutError):
+    pass
+
+
+class RunEvents:
+    def __init__(self):
+        """
+        Будущие объекты этапов прогона, выставляемые из SerialReader по сообщениям ардуино.
+        Создается внутри работающего цикла событий.
+        """
+        loop = asyncio.get_running_loop()
+        self.ready = loop.create_future()   # Ардуино сообщила "System Ready"
+        self.start_prompt = loop.create_future()   # Ардуино ожидает команду START
+        self.complete = loop.create_future()   # Ардуино сообщила о завершении теста
+        self._names = {
+            'ready': self.ready,
+            'start_prompt': self.start_prompt,
+            'complete': self.complete,
+        }
+        self.listeners = []   # Функции, получающие каждую служебную строку (например, подтверждения команд)
+
+    def on_line(self, line):
+        """
+        Проверяет служебную строку ардуино и отмечает наступившие этапы
+        :param line: Строка, не являющаяся телеметрией
+        """
+        if READY_MESSAGE in line:
+            self._set(self.ready, line)
+        if START_PROMPT_MESSAGE in line:
+            self._set(self.start_prompt, line)
+        if COMPLETE_MESSAGE in line:
+            self._set(self.complete, line)
+        for listener in self.listeners:
+            listener(line)
+
+    def fail(self, exc):
+        """
+        Завершает все ожидаемые этапы ошибкой (например, при потере соединения)
+        :param exc: Исключение, которое получат ожидающие
+        """
+        for future in self._names.values():
+            if not future.done():
+                future.set_exception(exc)
+                # Помечаем исключение как полученное, чтобы asyncio не предупреждал о неожидаемых этапах
+                future.exception()
+
+    async def wait(self, name, timeout=None):
+        """
+        Ожидает этап прогона
+        :param name: 'ready', 'start_prompt' или 'complete'
+        :param timeout: Максимальное время ожидания (с), None - без ограничения
+        :return: Строка ардуино, отметившая этап
+        """
+        future = self._names[name]
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            raise RunTimeoutError(f"Arduino did not report '{name}' within {timeout} s") from None
+
+    @staticmethod
+    def _set(future, line):
+        if not future.done():
+            future.set_result(line)
@@ -0,0 +1,378 @@
+import bisect
+import csv
+import glob
+import json
+import os
+import struct
+import time
+import uuid
+from capture import COLUMN_TYPES, SPEED_WEIGHT_COLUMNS, encode_header, read_header, load_capture
+
+# Имена файлов сегментов: запись прогона - каталог с файлами segment-000001.cap, segment-000002.cap, ...
+segment_prefix = 'segment-'
+SEGMENT_SUFFIX = '.cap'
+# Индекс закрытого сегмента; пока его нет, сегмент считается недописанным
+INDEX_SUFFIX = '.idx'
+
+# Пороги смены сегмента по умолчанию: размер файла (байт) и время записи сегмента (с, None - без ограничения)
+max_segment_bytes = 64 << 20
+max_segment_seconds = None
+# Шаг разреженного индекса меток времени (строк)
+index_every = 4096
+
+
+def segment_path(directory, number):
+    return os.path.join(directory, f"{segment_prefix}{number:06d}{SEGMENT_SUFFIX}")
+
+
+def index_path(path):
+    return path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+
+
+def list_segments(directory):
+    """Файлы сегментов записи в порядке номеров"""
+    return sorted(glob.glob(os.path.join(glob.escape(directory), f"{segment_prefix}*{SEGMENT_SUFFIX}")))
+
+
+def read_index(path):
+    """Индекс закрытого сегмента или None для недописанного"""
+    try:
+        with open(index_path(path)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def header_columns(header):
+    """Схема записи из заголовка: пары (имя столбца, код типа из COLUMN_TYPES)"""
+    codes = {dtype: code for code, (dtype, _) in COLUMN_TYPES.items()}
+    return tuple((name, codes[dtype]) for name, dtype in header['columns'])
+
+
+def repair_segment(path):
+    """
+    Обрезает недописанную последнюю строку файла записи после аварийного завершения
+    :return: Заголовок, количество целых строк и количество отброшенных байт
+    """
+    header, offset = read_header(path)
+    size = os.path.getsize(path)
+    width = struct.calcsize('<' + ''.join(COLUMN_TYPES[code][1] for _, code in header_columns(header)))
+    rows = (size - offset) // width
+    torn = size - offset - rows * width
+    if torn:
+        with open(path, 'r+b') as f:
+            f.truncate(offset + rows * width)
+            os.fsync(f.fileno())
+    return header, rows, torn
+
+
+def repair_text(path):
+    """
+    Обрезает недописанную последнюю строку текстового файла (лог, CSV)
+    :return: Количество отброшенных байт
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'r+b') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        # Ищем последний перевод строки с конца файла блоками
+        while position > 0:
+            start = max(0, position - 65536)
+            f.seek(start)
+            block = f.read(position - start)
+            newline = block.rfind(b'\n')
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        if position < end:
+            f.truncate(position)
+            os.fsync(f.fileno())
+        return end - position
+
+
+def open_append(path, newline=None):
+    """Открывает текстовый файл прогона для дозаписи, предварительно отрезав недописанную строку"""
+    repair_text(path)
+    return open(path, 'a', newline=newline)
+
+
+def open_run_csv(path, header, resume):
+    """
+    Открывает CSV прогона. Дописывается только CSV прерванного прогона с тем же заголовком; иначе (новый прогон,
+    другой логгер или старая схема столбцов) файл начинается заново, чтобы строки не попали под чужой заголовок
+    :param header: Имена столбцов
+    :param resume: Прогон продолжается (SegmentedCaptureWriter.resumed)
+    :return: Файл, открытый для записи строк после заголовка
+    """
+    if resume and os.path.exists(path):
+        with open(path, newline='') as f:
+            existing = next(csv.reader(f), None)
+        if existing == list(header):
+            return open_append(path, newline='')
+    csv_file = open(path, 'w', newline='')
+    csv.writer(csv_file).writerow(header)
+    return csv_file
+
+
+class SegmentedCaptureWriter:
+    def __init__(self, directory, columns=SPEED_WEIGHT_COLUMNS, metadata=None, max_bytes=max_segment_bytes,
+                 max_seconds=max_segment_seconds, resume=True):
+        """
+        Двоичная запись прогона, разбитая на сегменты; интерфейс как у CaptureWriter.
+        Каждый сегмент - обычный файл записи, который читает load_capture. При закрытии сегмента рядом пишется
+        индекс: количество строк, первая и последняя метки времени и разреженный индекс меток времени
+        :param directory: Каталог записи
+        :param columns: Последовательность пар (имя столбца, код типа из COLUMN_TYPES)
+        :param metadata: Словарь с метаданными прогона
+        :param max_bytes: Размер сегмента, после которого начинается следующий
+        :param max_seconds: Время записи сегмента, после которого начинается следующий, None - без ограничения
+        :param resume: Продолжить запись, найденную в каталоге (после аварийного завершения), вместо ошибки
+        """
+        for name, code in columns:
+            if code not in COLUMN_TYPES:
+                raise ValueError(f"Unknown column type {code!r} for column {name!r}")
+        self.directory = directory
+        self.path = directory
+        self.columns = tuple((name, code) for name, code in columns)
+        self.metadata = metadata or {}
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.row_struct = struct.Struct('<' + ''.join(COLUMN_TYPES[code][1] for _, code in self.columns))
+        self.rows = 0   # Количество строк во всех сегментах
+        self.segment = 0   # Номер текущего сегмента
+        self.resumed = False   # Запись продолжена после перезапуска
+        self.repaired_bytes = 0   # Байт недописанной строки, отброшенных при продолжении
+        self.restarts = 0   # Перезапусков ардуино (уменьшений метки времени); номер загрузки в заголовке сегмента
+        self.boot_timestamp = None   # Последняя метка времени текущей загрузки ардуино, через все сегменты
+        self.file = None
+
+        os.makedirs(directory, exist_ok=True)
+        segments = list_segments(directory)
+        if segments and not resume:
+            raise FileExistsError(f"{directory} already contains a capture")
+        self.run_id = uuid.uuid4().hex
+        if segments:
+            self._resume(segments)
+        if self.file is None:
+            self._open_segment(self.segment + 1)
+
+    def _resume(self, segments):
+        self.resumed = True
+        for path in segments:
+            number = int(os.path.basename(path)[len(segment_prefix):-len(SEGMENT_SUFFIX)])
+            index = read_index(path)
+            if index is not None:
+                self.run_id = index['run_id']
+                self.rows = index['first_row'] + index['rows']
+                self.restarts = index.get('boot', 0)
+                if index['last_timestamp'] is not None:
+                    self.boot_timestamp = index['last_timestamp']
+                self.segment = number
+                continue
+            try:
+                header, rows, torn = repair_segment(path)
+            except (ValueError, struct.error):
+                # Процесс завершился при создании сегмента, заголовок недописан
+                os.remove(path)
+                continue
+            if header_columns(header) != self.columns:
+                raise ValueError(f"{path} has columns {header['columns']}, expected {list(self.columns)}")
+            self.run_id = header['run_id']
+            self.restarts = header.get('boot', 0)
+            self.repaired_bytes += torn
+            self.segment = number
+            self._attach(path, header, rows)
+            if path != segments[-1]:
+                # Недописанным может быть только последний сегмент; остальные закрываются сразу
+                self._close_segment()
+
+    def _attach(self, path, header, rows):
+        """Продолжает запись в существующий сегмент; индекс меток времени восстанавливается по данным"""
+        self.file = open(path, 'ab')
+        self.first_row = header['first_row']
+        self.rows = self.first_row + rows
+        self.segment_rows = rows
+        self.opened = time.monotonic()
+        self.sparse_index = []
+        self.first_timestamp = self.last_timestamp = None
+        if rows:
+            _, data = load_capture(path)
+            timestamps = data['timestamp']
+            self.first_timestamp = int(timestamps[0])
+            self.last_timestamp = self.boot_timestamp = int(timestamps[-1])
+            self.sparse_index = [[row, int(timestamps[row])] for row in range(0, rows, index_every)]
+
+    def _open_segment(self, number):
+        self.segment = number
+        path = segment_path(self.directory, number)
+        header = {
+            'columns': [[name, COLUMN_TYPES[code][0]] for name, code in self.columns],
+            'created': time.time(),
+            'metadata': self.metadata,
+            'run_id': self.run_id,
+            'segment': number,
+            'first_row': self.rows,
+            'boot': self.restarts,
+        }
+        self.file = open(path, 'wb')
+        self.file.write(encode_header(header))
+        self.file.flush()
+        self.first_row = self.rows
+        self.segment_rows = 0
+        self.opened = time.monotonic()
+        self.sparse_index = []
+        self.first_timestamp = self.last_timestamp = None
+
+    def _close_segment(self):
+        """Сбрасывает сегмент на диск и пишет его индекс; индекс заменяется атомарно"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        index = {
+            'run_id': self.run_id,
+            'first_row': self.first_row,
+            'rows': self.segment_rows,
+            'first_timestamp': self.first_timestamp,
+            'last_timestamp': self.last_timestamp,
+            'boot': self.restarts,
+            'index_every': index_every,
+            'index': self.sparse_index,
+            'closed': time.time(),
+        }
+        path = index_path(self.file.name)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(index, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        self.file = None
+
+    def append(self, rows):
+        """
+        Дописывает строки; сегмент сменяется между пачками или при уменьшении метки времени, строка не
+        разрывается между файлами
+        :param rows: Последовательность строк, значения в порядке столбцов схемы
+        """
+        if not rows:
+            return
+        # Метка времени уменьшилась: ардуино перезапустился (сброс по DTR при переподключении порта) и millis()
+        # начался с нуля. Строки после сброса пишутся в новый сегмент, чтобы метки времени каждого сегмента
+        # возрастали и поиск по индексу в read_range оставался верным
+        previous = self.boot_timestamp
+        for i, row in enumerate(rows):
+            timestamp = row[0]
+            if previous is not None and timestamp < previous:
+                if i:
+                    self._append(rows[:i])
+                if self.segment_rows:
+                    self._close_segment()
+                    number = self.segment + 1
+                else:
+                    # Пустой сегмент переписывается с новым номером загрузки в заголовке
+                    self.file.close()
+                    number = self.segment
+                self.restarts += 1
+                self._open_segment(number)
+                self.boot_timestamp = None
+                self.append(rows[i:])
+                return
+            previous = timestamp
+        self._append(rows)
+
+    def _append(self, rows):
+        pack = self.row_struct.pack
+        self.file.write(b''.join([pack(*row) for row in rows]))
+
+        start = self.segment_rows
+        self.segment_rows += len(rows)
+        self.rows += len(rows)
+        if self.first_timestamp is None:
+            self.first_timestamp = rows[0][0]
+        self.last_timestamp = self.boot_timestamp = rows[-1][0]
+        # Разреженный индекс: метка времени каждой index_every-й строки сегмента
+        row = -start % index_every + start
+        while row < self.segment_rows:
+            self.sparse_index.append([row, rows[row - start][0]])
+            row += index_every
+
+        if self.file.tell() >= self.max_bytes or \
+                (self.max_seconds is not None and time.monotonic() - self.opened >= self.max_seconds):
+            self._close_segment()
+            self._open_segment(self.segment + 1)
+
+    def flush(self):
+        self.file.flush()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        if self.file is not None:
+            self._close_segment()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def iter_segment_chunks(directory, chunk_rows=1_000_000):
+    """
+    Читает все сегменты записи как один ряд, кусками через memmap, не загружая записи целиком
+    :return: Итератор структурированных массивов numpy
+    """
+    for path in list_segments(directory):
+        _, data = load_capture(path)
+        for start in range(0, len(data), chunk_rows):
+            yield data[start:start + chunk_rows]
+
+
+def load_segments(directory):
+    """
+    Отображает все сегменты записи в память, каждый отдельным memmap; данные не копируются
+    :return: Заголовок первого сегмента и список структурированных массивов numpy в порядке сегментов
+    """
+    segments = list_segments(directory)
+    if not segments:
+        raise ValueError(f"{directory} contains no capture segments")
+    header, _ = read_header(segments[0])
+    return header, [load_capture(path)[1] for path in segments]
+
+
+def read_range(directory, start, stop):
+    """
+    Строки с меткой времени в интервале [start, stop]; по индексам читаются только нужные сегменты и их части.
+    Метки времени возрастают внутри сегмента; после перезапуска ардуино (новый boot в индексе) интервал может
+    встретиться повторно, строки всех загрузок возвращаются в порядке сегментов
+    :return: Структурированный массив numpy
+    """
+    import numpy as np
+
+    parts = []
+    dtype = None
+    for path in list_segments(directory):
+        index = read_index(path)
+        if index is not None and index['rows'] and (index['last_timestamp'] < start or
+                                                   index['first_timestamp'] > stop):
+            continue
+        _, data = load_capture(path)
+        dtype = data.dtype
+        lower, upper = 0, len(data)
+        if index is not None and index['index']:
+            # Границы поиска сужаются до соседних точек разреженного индекса
+            marks = [timestamp for _, timestamp in index['index']]
+            position = bisect.bisect_left(marks, start) - 1
+            lower = index['index'][position][0] if position >= 0 else 0
+            position = bisect.bisect_right(marks, stop)
+            upper = index['index'][position][0] if position < len(marks) else len(data)
+        timestamps = data['timestamp'][lower:upper]
+        first = lower + int(np.searchsorted(timestamps, start, side='left'))
+        last = lower + int(np.searchsorted(timestamps, stop, side='right'))
+        if last > first:
+            parts.append(np.array(data[first:last]))
+    if not parts:
+        return np.zeros(0, dtype=dtype) if dtype is not None else np.zeros(0)
+    return np.concatenate(parts)
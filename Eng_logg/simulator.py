@@ -0,0 +1,336 @@
+import argparse
+import asyncio
+import os
+import pty
+import random
+import select
+import time
+import tty
+from binary_protocol import encode_frame
+from framing import LineFramer
+from telemetry import TelemetryParser
+
+# Параметры скетча sketch_aug30a.ino
+min_throttle = 1000
+max_throttle = 2000
+dest_throttle = min_throttle + (max_throttle - min_throttle) // 4
+
+# Сообщения скетча
+CALIBRATION_MESSAGES = (
+    "Starting ESC Calibration...",
+    "Max throttle set. Wait for ESC to recognize max throttle.",
+    "Min throttle set. Calibration complete.",
+)
+READY_MESSAGE = "System Ready. Use 1-9 to control speed, - to stop and enter sleep mode."
+START_PROMPT = "Enter START to begin the test."
+COMPLETE_MESSAGES = ("Test complete", "Test complete.", "Entering sleep mode...")
+
+
+def load_recording(path):
+    """
+    Читает записанный eng.log
+    :return: Список пар (timestamp, строка телеметрии)
+    """
+    parser = TelemetryParser()
+    recording = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            record = parser.parse(line)
+            if record is not None:
+                recording.append((record.timestamp, line))
+    if not recording:
+        raise ValueError(f"{path} contains no telemetry lines")
+    return recording
+
+
+class ArduinoSimulator:
+    def __init__(self, rate=1000.0, duration=3.0, replay=None, binary=False, noise=0.0, partial_writes=False,
+                 disconnect_after=None, calibration_delay=0.0, seed=None, tick=0.002, max_pending=1 << 20):
+        """
+        Имитация ардуино со скетчем sketch_aug30a.ino на псевдотерминале Linux
+        :param rate: Строк телеметрии в секунду; для записи None - исходный темп записи
+        :param duration: Длительность теста после START (с)
+        :param replay: Путь к записанному eng.log для воспроизведения вместо синтетических данных
+        :param binary: Отправлять телеметрию двоичными кадрами
+        :param noise: Вероятность повреждения каждой строки телеметрии
+        :param partial_writes: Отправлять данные кусками случайной длины
+        :param disconnect_after: Через сколько секунд после START оборвать связь, None - не обрывать
+        :param calibration_delay: Пауза калибровки ESC после открытия порта (с)
+        :param seed: Начальное значение генератора случайных чисел
+        :param tick: Период генерации данных (с)
+        :param max_pending: Максимум неотправленных байт; как и Serial.print на ардуино, генерация ждет
+        """
+        self.rate = rate
+        self.duration = duration
+        self.recording = load_recording(replay) if replay else None
+        self.binary = binary
+        self.noise = noise
+        self.partial_writes = partial_writes
+        self.disconnect_after = disconnect_after
+        self.calibration_delay = calibration_delay
+        self.random = random.Random(seed)
+        self.tick = tick
+        self.max_pending = max_pending
+
+        self.master, slave = pty.openpty()
+        tty.setraw(slave)
+        self.port = os.ttyname(slave)   # Порт для логгера
+        # Держим открытым только master: так видно, когда логгер открывает и закрывает порт
+        os.close(slave)
+        os.set_blocking(self.master, False)
+
+        self.sessions = 0   # Количество открытий порта логгером
+        self.sent_lines = 0   # Отправлено строк телеметрии
+        self.sent_bytes = 0
+        self.corrupted = 0   # Повреждено строк телеметрии
+        self.commands = []   # Принятые команды
+        self.closed = False
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            os.close(self.master)
+
+    async def serve(self, sessions=None):
+        """
+        Обслуживает логгер: каждое открытие порта - перезагрузка ардуино, как при сбросе через DTR
+        :param sessions: Количество сеансов, None - до закрытия симулятора
+        """
+        while not self.closed and (sessions is None or self.sessions < sessions):
+            await self._wait_open()
+            self.sessions += 1
+            await _Session(self).run()
+
+    async def _wait_open(self):
+        poller = select.poll()
+        poller.register(self.master, select.POLLIN)
+        while any(event & select.POLLHUP for _, event in poller.poll(0)):
+            await asyncio.sleep(0.005)
+
+
+class _Session:
+    """Один сеанс работы скетча от перезагрузки до закрытия порта"""
+    def __init__(self, simulator):
+        self.sim = simulator
+        self.framer = LineFramer()
+        self.pending = bytearray()
+        self.speed = min_throttle
+        self.stream_start = None   # Время начала потока телеметрии
+        self.test_end = None   # Время окончания теста по START, None - ручное управление
+        self.sent = 0   # Строк отправлено в этом потоке
+        self.boot = time.monotonic()
+        self.sleeping = False
+        self.alive = True
+
+    async def run(self):
+        sim = self.sim
+        for message in CALIBRATION_MESSAGES:
+            self.print(message)
+        await self.sleep(sim.calibration_delay)
+        self.print(READY_MESSAGE)
+        self.print(START_PROMPT)
+
+        while self.alive:
+            self.read_commands()
+            now = time.monotonic()
+            if self.stream_start is not None and not self.sleeping:
+                if sim.disconnect_after is not None and now - self.stream_start >= sim.disconnect_after:
+                    sim.close()
+                    return
+                self.generate(now)
+            self.flush()
+            await asyncio.sleep(sim.tick)
+
+    async def sleep(self, delay):
+        end = time.monotonic() + delay
+        while self.alive and time.monotonic() < end:
+            self.read_commands()
+            self.flush()
+            await asyncio.sleep(min(self.sim.tick, max(0.0, end - time.monotonic())))
+
+    def millis(self, now=None):
+        return int(((now or time.monotonic()) - self.boot) * 1000)
+
+    def print(self, line):
+        self.pending += line.encode() + b'\n'
+
+    def read_commands(self):
+        try:
+            data = os.read(self.sim.master, 4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            # Логгер закрыл порт
+            self.alive = False
+            return
+        for command in self.framer.feed(data):
+            self.sim.commands.append(command)
+            if self.sleeping:
+                continue
+            self.print(f"Received command: {command}")
+            if command == 'START':
+                self.start_stream(self.sim.duration)
+            elif command in {'1', '2', '3', '4', '5', '6', '7', '8', '9'}:
+                self.speed = min_throttle + int(command) * (max_throttle - min_throttle) // 10
+                if self.stream_start is None:
+                    self.start_stream(None)
+            elif command == '-':
+                self.speed = min_throttle
+                self.complete()
+            else:
+                self.print("Unknown command.")
+
+    def start_stream(self, duration):
+        self.stream_start = time.monotonic()
+        self.test_end = self.stream_start + duration if duration is not None else None
+        self.sent = 0
+
+    def complete(self):
+        for message in COMPLETE_MESSAGES:
+            self.print(message)
+        self.sleeping = True
+
+    def generate(self, now):
+        sim = self.sim
+        if sim.recording is not None and sim.rate is None:
+            # Исходный темп записи: отправляем строки, время которых уже наступило
+            elapsed_ms = (now - self.stream_start) * 1000
+            first = sim.recording[0][0]
+            due = self.sent
+            while due < len(sim.recording) and sim.recording[due][0] - first <= elapsed_ms:
+                due += 1
+            finished = due >= len(sim.recording)
+        else:
+            end = min(now, self.test_end) if self.test_end is not None else now
+            due = int((end - self.stream_start) * sim.rate)
+            finished = self.test_end is not None and now >= self.test_end
+
+        # Как и Serial.print, генерация ждет, пока освободится место в буфере
+        room = max(0, sim.max_pending - len(self.pending)) // 16 + 1
+        due = min(due, self.sent + room)
+        if due > self.sent:
+            self.pending += self.render(self.sent, due)
+            sim.sent_lines += due - self.sent
+            self.sent = due
+        elif finished and not self.pending:
+            self.complete()
+
+    def render(self, start, stop):
+        sim = self.sim
+        if sim.recording is not None:
+            recording = sim.recording
+            lines = [recording[i % len(recording)][1] for i in range(start, stop)]
+            if sim.rate is not None:
+                # Записанные значения с новыми метками времени, чтобы время не шло назад при повторе
+                base = self.millis(self.stream_start)
+                lines = [self.restamp(line, base + int(i * 1000 / sim.rate)) for i, line in zip(range(start, stop), lines)]
+            payload = [self.encode(line) for line in lines]
+        else:
+            base = self.millis(self.stream_start)
+            payload = []
+            for i in range(start, stop):
+                timestamp = base + int(i * 1000 / sim.rate)
+                speed = self.profile_speed(i / sim.rate)
+                # Тяга растет со скоростью, плюс детерминированный шум датчика
+                weight = max(0, (speed - min_throttle) * 4 + (i * 7919) % 7 - 3)
+                if sim.binary:
+                    payload.append(encode_frame(timestamp, speed, weight))
+                else:
+                    payload.append(f"timestamp,{timestamp},speed,{speed},weight,{weight}\n".encode())
+        if sim.noise:
+            payload = [self.corrupt(item) for item in payload]
+        return b''.join(payload)
+
+    def encode(self, line):
+        if self.sim.binary:
+            parts = line.split(',')
+            weight = int(parts[5]) if len(parts) >= 6 else 0
+            return encode_frame(int(parts[1]), int(parts[3]), weight)
+        return line.encode() + b'\n'
+
+    @staticmethod
+    def restamp(line, timestamp):
+        parts = line.split(',')
+        parts[1] = str(timestamp)
+        return ','.join(parts)
+
+    def profile_speed(self, t):
+        """Скорость по профилю runMotorTest(): разгон, удержание, торможение; при ручном управлении - текущая"""
+        if self.test_end is None:
+            return self.speed
+        duration = self.test_end - self.stream_start
+        ramp = duration / 4
+        if t < ramp:
+            return min_throttle + int((dest_throttle - min_throttle) * t / ramp) // 10 * 10
+        if t < duration - ramp:
+            return dest_throttle
+        return min_throttle + int((dest_throttle - min_throttle) * (duration - t) / ramp) // 10 * 10
+
+    def corrupt(self, item):
+        rnd = self.sim.random
+        if rnd.random() >= self.sim.noise:
+            return item
+        self.sim.corrupted += 1
+        data = bytearray(item)
+        kind = rnd.randrange(3)
+        position = rnd.randrange(len(data) - 1)
+        if kind == 0:
+            data[position] ^= 1 << rnd.randrange(8)   # Инверсия бита
+        elif kind == 1:
+            del data[position]   # Потерянный байт
+        else:
+            data[position:position] = bytes([rnd.randrange(256)])   # Лишний байт
+        return bytes(data)
+
+    def flush(self):
+        sim = self.sim
+        while self.pending and not sim.closed:
+            size = len(self.pending)
+            if sim.partial_writes:
+                size = sim.random.randint(1, size)
+            try:
+                written = os.write(sim.master, self.pending[:size])
+            except BlockingIOError:
+                return
+            except OSError:
+                self.alive = False
+                return
+            sim.sent_bytes += written
+            del self.pending[:written]
+            if sim.partial_writes:
+                return
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Имитация ардуино со скетчем sketch_aug30a.ino на псевдотерминале")
+    parser.add_argument('--rate', type=float, default=1000.0, help="Строк телеметрии в секунду")
+    parser.add_argument('--duration', type=float, default=3.0, help="Длительность теста после START (с)")
+    parser.add_argument('--replay', help="Воспроизвести записанный eng.log")
+    parser.add_argument('--original-timing', action='store_true', help="Воспроизводить запись в исходном темпе")
+    parser.add_argument('--binary', action='store_true', help="Двоичные кадры вместо текста")
+    parser.add_argument('--noise', type=float, default=0.0, help="Вероятность повреждения строки")
+    parser.add_argument('--partial-writes', action='store_true')
+    parser.add_argument('--disconnect-after', type=float)
+    parser.add_argument('--calibration-delay', type=float, default=0.0)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    simulator = ArduinoSimulator(
+        rate=None if args.original_timing else args.rate, duration=args.duration, replay=args.replay,
+        binary=args.binary, noise=args.noise, partial_writes=args.partial_writes,
+        disconnect_after=args.disconnect_after, calibration_delay=args.calibration_delay, seed=args.seed,
+    )
+    print(f"Simulated Arduino on {simulator.port}", flush=True)
+    try:
+        asyncio.run(simulator.serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.close()
+        print(f"sessions {simulator.sessions}, lines {simulator.sent_lines}, bytes {simulator.sent_bytes}, "
+              f"corrupted {simulator.corrupted}")
+
+
+if __name__ == "__main__":
+    main()
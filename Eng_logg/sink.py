@@ -0,0 +1,161 @@
+import os
+import queue
+import threading
+import time
+
+# Политики сброса данных на диск
+FSYNC_NEVER = 'never'   # Только буферизованная запись, решение за ОС
+FSYNC_BATCH = 'batch'   # fsync после каждой записанной пачки
+FSYNC_CLOSE = 'close'   # fsync один раз при закрытии
+
+_STOP = object()
+
+
+class BatchWriter:
+    def __init__(self, log_file, csv_writer=None, csv_file=None, capture=None, batch_size=512, flush_interval=0.25,
+                 max_queue=1024, echo=False, echo_interval=1.0, fsync=FSYNC_NEVER, metrics=None, transform=None):
+        """
+        Запись лога и CSV пачками в фоновом потоке, чтобы не блокировать цикл событий
+        :param log_file: Открытый файл логов
+        :param csv_writer: Объект для записи в csv файл или None
+        :param csv_file: Файл, в который пишет csv_writer (нужен для fsync)
+        :param capture: CaptureWriter для двоичной записи строк CSV или None
+        :param batch_size: Количество строк, после которого пачка записывается на диск
+        :param flush_interval: Максимальное время ожидания строки в пачке (с)
+        :param max_queue: Максимальное количество порций в очереди, при переполнении порции отбрасываются
+        :param echo: Выводить ли последнюю строку телеметрии в консоль
+        :param echo_interval: Минимальный интервал между строками вывода в консоль (с)
+        :param fsync: Политика сброса на диск: FSYNC_NEVER, FSYNC_BATCH или FSYNC_CLOSE
+        :param metrics: Metrics для времени записи пачек, глубины очереди и потерь, или None
+        :param transform: Функция, которая дополняет строки пачки перед записью (например,
+                          FilterChain.process_rows), или None; выполняется в потоке записи
+        """
+        if fsync not in (FSYNC_NEVER, FSYNC_BATCH, FSYNC_CLOSE):
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.log_file = log_file
+        self.csv_writer = csv_writer
+        self.csv_file = csv_file
+        self.capture = capture
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.echo = echo
+        self.echo_interval = echo_interval
+        self.fsync = fsync
+        self.transform = transform
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.submitted_lines = 0   # Строк передано в запись
+        self.written_lines = 0   # Строк записано в лог
+        self.written_rows = 0   # Строк записано в CSV
+        self.dropped_chunks = 0   # Порций отброшено из-за переполнения очереди
+        self.dropped_lines = 0   # Строк отброшено из-за переполнения очереди
+        self.batches = 0   # Количество записанных пачек
+        self.error = None   # Исключение, остановившее поток записи
+
+        self.write_histogram = None
+        if metrics is not None:
+            self.write_histogram = metrics.histogram('write_ns')
+            metrics.gauge('sink_queue_depth', lambda: self.queue_depth)
+            metrics.gauge('sink_dropped_lines', lambda: self.dropped_lines)
+            metrics.gauge('sink_written_rows', lambda: self.written_rows)
+
+        self._thread = threading.Thread(target=self._run, name='BatchWriter', daemon=True)
+        self._thread.start()
+
+    def submit(self, lines, rows=()):
+        """
+        Передает порцию строк на запись, не блокируя вызывающий поток
+        :param lines: Строки для лог-файла
+        :param rows: Строки для CSV файла
+        :return: False, если очередь переполнена и порция отброшена
+        """
+        if not lines and not rows:
+            return True
+        self.submitted_lines += len(lines)
+        try:
+            self.queue.put_nowait((lines, rows))
+        except queue.Full:
+            self.dropped_chunks += 1
+            self.dropped_lines += len(lines)
+            return False
+        return True
+
+    @property
+    def queue_depth(self):
+        """Текущее количество порций, ожидающих записи"""
+        return self.queue.qsize()
+
+    def close(self):
+        """Дописывает оставшиеся данные и останавливает поток записи"""
+        if self._thread.is_alive():
+            self.queue.put(_STOP)
+            self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self):
+        lines = []
+        rows = []
+        deadline = time.monotonic() + self.flush_interval
+        next_echo = 0.0
+        last_echo_count = 0
+
+        try:
+            while True:
+                timeout = max(0.0, deadline - time.monotonic())
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+                if item is _STOP:
+                    break
+                if item is not None:
+                    lines.extend(item[0])
+                    rows.extend(item[1])
+
+                now = time.monotonic()
+                if max(len(lines), len(rows)) >= self.batch_size or now >= deadline:
+                    if lines or rows:
+                        self._write(lines, rows, self.fsync == FSYNC_BATCH)
+                        if self.echo and rows and now >= next_echo:
+                            # Выводим только последнюю строку телеметрии и количество пропущенных
+                            skipped = self.written_rows - last_echo_count - 1
+                            suffix = f"  (+{skipped} rows)" if skipped > 0 else ""
+                            print(f"{','.join(map(str, rows[-1]))}{suffix}")
+                            last_echo_count = self.written_rows
+                            next_echo = now + self.echo_interval
+                        lines = []
+                        rows = []
+                    deadline = now + self.flush_interval
+
+            self._write(lines, rows, self.fsync != FSYNC_NEVER)
+        except Exception as e:
+            self.error = e
+
+    def _write(self, lines, rows, sync):
+        started = time.monotonic_ns()
+        if rows and self.transform is not None:
+            self.transform(rows)
+        if lines:
+            self.log_file.write('\n'.join(lines) + '\n')
+        if rows and self.csv_writer is not None:
+            self.csv_writer.writerows(rows)
+        if rows and self.capture is not None:
+            self.capture.append(rows)
+        self.written_lines += len(lines)
+        self.written_rows += len(rows)
+        self.batches += 1
+
+        if sync:
+            for f in (self.log_file, self.csv_file, self.capture):
+                if f is not None:
+                    f.flush()
+                    os.fsync(f.fileno())
+        if self.write_histogram is not None:
+            self.write_histogram.record(time.monotonic_ns() - started)
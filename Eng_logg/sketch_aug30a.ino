@@ -1,13 +1,35 @@
 #include <Servo.h>
 #include <avr/sleep.h>
+#include <util/crc16.h>
+
+// Формат телеметрии: 0 - текстовые строки, 1 - компактные двоичные кадры с CRC
+#define BINARY_TELEMETRY 0
+// Скорость порта должна совпадать с baud_rate в логгере. На 9600 строка телеметрии (~40 байт) передается
+// ~42 мс, на 115200 - ~3.5 мс, кадр (14 байт) - ~1.2 мс
+#define SERIAL_BAUD 115200
+// Тензодатчик через АЦП HX711 (библиотека HX711 by Bogdan Necula): 1 - подключен, 0 - вес не передается
+// (в двоичном кадре 0). Подключение: VCC - 5V, GND - GND, DT - D3, SCK - D2 (см. loadCellDoutPin, loadCellSckPin)
+#define LOAD_CELL 0
+
+#if LOAD_CELL
+#include <HX711.h>
+#endif
 
 Servo esc;
+#if LOAD_CELL
+HX711 loadCell;
+int loadCellDoutPin = 3;  // DT модуля HX711
+int loadCellSckPin = 2;   // SCK модуля HX711
+#endif
 
 int escPin = A2;
 int minThrottle = 1000;
 int maxThrottle = 2000;
 int currentSpeed = 0;
 int destThrottle; // Переменная для хранения значения 25% мощности
+unsigned long stepHoldMs = 100;   // Время удержания каждой ступени разгона и торможения
+unsigned long testHoldMs = 3000;  // Время удержания 25% мощности
+unsigned long logIntervalMs = 50; // Период телеметрии во время удержания скорости
 
 bool testComplete = false; // Флаг завершения теста
 
@@ -15,13 +37,26 @@ bool testComplete = false; // Флаг завершения теста
 struct LogData {
   unsigned long timestamp;  // Время логгирования
   int speed;                // Текущая скорость
+  long weight;              // Показания тензодатчика (0, если датчик не подключен)
+};
+
+// Двоичный кадр телеметрии: синхрослово 0xAA 0x55, данные и CRC-16/XMODEM от данных
+struct __attribute__((packed)) TelemetryFrame {
+  uint8_t sync[2];
+  uint32_t timestamp;
+  int16_t speed;
+  int32_t weight;
+  uint16_t crc;
 };
 
 LogData logData;
 
 void setup() {
-  Serial.begin(9600);
+  Serial.begin(SERIAL_BAUD);
   esc.attach(escPin);
+#if LOAD_CELL
+  loadCell.begin(loadCellDoutPin, loadCellSckPin);
+#endif
 
   // Калибровка ESC
   Serial.println("Starting ESC Calibration...");
@@ -73,16 +108,16 @@ void runMotorTest() {
   // Плавное увеличение скорости до 25%
   for (int speed = minThrottle; speed <= destThrottle; speed += 10) {
     setSpeed(speed);
-    delay(100);
+    holdSpeed(stepHoldMs);
   }
 
   // Держим скорость на 25% в течение 3-х секунд
-  delay(3000);
+  holdSpeed(testHoldMs);
 
   // Плавное уменьшение скорости до 0
   for (int speed = destThrottle; speed >= minThrottle; speed -= 10) {
     setSpeed(speed);
-    delay(100);
+    holdSpeed(stepHoldMs);
   }
 
   Serial.println("Test complete");
@@ -92,14 +127,67 @@ void runMotorTest() {
 void setSpeed(int speed) {
   esc.writeMicroseconds(speed);
   currentSpeed = speed;
+  logSample();
+}
+
+// Удержание текущей скорости с телеметрией каждые logIntervalMs: на каждой ступени, включая удержание 25%,
+// есть отсчеты после переходного процесса, по которым логгер считает тягу.
+// Моменты отсчетов отсчитываются от начала удержания, а не от конца передачи, поэтому время отправки строки
+// не растягивает период
+void holdSpeed(unsigned long ms) {
+  unsigned long start = millis();
+  unsigned long next = logIntervalMs;
+  while (next <= ms) {
+    while (millis() - start < next) {
+    }
+    logSample();
+    next += logIntervalMs;
+  }
+  while (millis() - start < ms) {
+  }
+}
+
+void logSample() {
   logData.speed = currentSpeed;
   logData.timestamp = millis();  // Получаем время в миллисекундах с момента старта
+#if LOAD_CELL
+  // HX711 выдает 10 отсчетов в секунду; пока новый не готов, передается предыдущий, чтобы не ждать АЦП.
+  // Передается сырое значение, ноль и калибровка выполняются в логгере (dsp.py)
+  if (loadCell.is_ready()) {
+    logData.weight = loadCell.read();
+  }
+#endif
   logDataToSerial(logData);  // Логгируем данные на компьютер
 }
 
 void logDataToSerial(const LogData& data) {
+#if BINARY_TELEMETRY
+  TelemetryFrame frame;
+  frame.sync[0] = 0xAA;
+  frame.sync[1] = 0x55;
+  frame.timestamp = data.timestamp;
+  frame.speed = data.speed;
+  frame.weight = data.weight;
+
+  // Контрольная сумма считается по полям между синхрословом и CRC
+  const uint8_t* payload = (const uint8_t*)&frame.timestamp;
+  uint16_t crc = 0;
+  for (size_t i = 0; i < sizeof(frame) - sizeof(frame.sync) - sizeof(frame.crc); i++) {
+    crc = _crc_xmodem_update(crc, payload[i]);
+  }
+  frame.crc = crc;
+
+  Serial.write((const uint8_t*)&frame, sizeof(frame));
+#else
   Serial.print("timestamp,");
   Serial.print(data.timestamp);
   Serial.print(",speed,");
+#if LOAD_CELL
+  Serial.print(data.speed);
+  Serial.print(",weight,");
+  Serial.println(data.weight);
+#else
   Serial.println(data.speed);
+#endif
+#endif
 }
\ No newline at end of file
@@ -0,0 +1,83 @@
+class TelemetryRecord:
+    __slots__ = ('timestamp', 'speed', 'weight', 'extra')
+
+    def __init__(self, timestamp, speed, weight=None, extra=None):
+        """
+        Одна строка телеметрии ардуино
+        :param timestamp: Время с момента старта ардуино (мс)
+        :param speed: Скорость (значение ШИМ)
+        :param weight: Показания тензодатчика, None если датчика нет
+        :param extra: Словарь дополнительных каналов (rpm, moment, thrust, ...) или None
+        """
+        self.timestamp = timestamp
+        self.speed = speed
+        self.weight = weight
+        self.extra = extra
+
+    def __repr__(self):
+        return (f"TelemetryRecord(timestamp={self.timestamp}, speed={self.speed}, "
+                f"weight={self.weight}, extra={self.extra})")
+
+    def __eq__(self, other):
+        if not isinstance(other, TelemetryRecord):
+            return NotImplemented
+        return (self.timestamp, self.speed, self.weight, self.extra) == \
+            (other.timestamp, other.speed, other.weight, other.extra)
+
+
+class TelemetryParser:
+    prefix = 'timestamp,'
+
+    def __init__(self):
+        """Разбор строк вида timestamp,<t>,speed,<s>[,weight,<w>][,<канал>,<значение>...]"""
+        self.parsed = 0   # Количество разобранных строк телеметрии
+        self.malformed = 0   # Количество повреждённых строк телеметрии
+        self.last_error = None   # Последняя повреждённая строка для отладки
+
+    def parse(self, line):
+        """
+        Разбирает одну строку
+        :param line: Строка без символа переноса
+        :return: TelemetryRecord или None, если строка не является телеметрией или повреждена
+        """
+        if not line.startswith(self.prefix):
+            return None
+
+        parts = line.split(',')
+        count = len(parts)
+        try:
+            # Быстрые пути для двух раскладок скетча
+            if count == 6 and parts[2] == 'speed' and parts[4] == 'weight':
+                record = TelemetryRecord(int(parts[1]), int(parts[3]), int(parts[5]))
+            elif count == 4 and parts[2] == 'speed':
+                record = TelemetryRecord(int(parts[1]), int(parts[3]))
+            else:
+                record = self._parse_generic(parts)
+        except (ValueError, IndexError):
+            record = None
+
+        if record is None:
+            self.malformed += 1
+            self.last_error = line
+            return None
+
+        self.parsed += 1
+        return record
+
+    def parse_lines(self, lines):
+        """
+        Разбирает список строк
+        :param lines: Строки, полученные от LineFramer
+        :return: Список TelemetryRecord, строки не являющиеся телеметрией пропускаются
+        """
+        parse = self.parse
+        return [record for record in map(parse, lines) if record is not None]
+
+    @staticmethod
+    def _parse_generic(parts):
+        # Пары имя,значение с произвольным набором каналов
+        if len(parts) % 2 or len(parts) < 4 or parts[2] != 'speed':
+            return None
+        values = {parts[i]: int(parts[i + 1]) for i in range(4, len(parts), 2)}
+        weight = values.pop('weight', None)
+        return TelemetryRecord(int(parts[1]), int(parts[3]), weight, values or None)
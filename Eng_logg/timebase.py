@@ -0,0 +1,187 @@
+NS_PER_MS = 1_000_000
+
+
+class ClockFit:
+    def __init__(self):
+        """
+        Потоковая линейная модель времени хоста от времени ардуино: host = offset + slope * device.
+        Каждая пачка данных дает одну точку: метку millis() последней строки и time.monotonic_ns() приема.
+        Задержка передачи по порту входит в смещение, уход частоты кварца - в наклон.
+        Если метка времени ардуино уменьшилась (перезагрузка по DTR при переподключении, millis() начался
+        с нуля), модель строится заново: точки разных загрузок не смешиваются
+        """
+        self.restarts = 0   # Сколько раз модель начиналась заново из-за уменьшения метки времени
+        self.reset()
+
+    def reset(self):
+        """Забывает все точки; вызывается при переподключении к порту и при перезагрузке ардуино"""
+        self.last_device = None   # Последняя метка времени ардуино, по которой видна перезагрузка
+        self.count = 0   # Количество точек
+        self._x0 = None   # Начало отсчета по ардуино (мс) и по хосту (нс), чтобы суммы не теряли точность
+        self._y0 = None
+        self._mean_x = 0.0
+        self._mean_y = 0.0
+        self._cxx = 0.0
+        self._cxy = 0.0
+
+    def add(self, device_ms, host_ns):
+        """
+        Добавляет точку соответствия часов
+        :param device_ms: Метка времени ардуино (мс)
+        :param host_ns: Время приема по time.monotonic_ns()
+        """
+        if self._x0 is None:
+            self._x0 = device_ms
+            self._y0 = host_ns
+        self.last_device = device_ms
+        x = float(device_ms - self._x0)
+        y = (host_ns - self._y0) / NS_PER_MS
+        # Онлайн-ковариация Уэлфорда: устойчива на длинных прогонах
+        self.count += 1
+        dx = x - self._mean_x
+        self._mean_x += dx / self.count
+        self._mean_y += (y - self._mean_y) / self.count
+        self._cxx += dx * (x - self._mean_x)
+        self._cxy += dx * (y - self._mean_y)
+
+    @property
+    def slope(self):
+        """Миллисекунд хоста на миллисекунду ардуино; до двух разных точек - номинальная 1.0"""
+        return self._cxy / self._cxx if self._cxx > 0 else 1.0
+
+    @property
+    def drift_ppm(self):
+        """Уход часов ардуино относительно хоста (ppm), положительный - часы ардуино отстают"""
+        return (self.slope - 1.0) * 1e6
+
+    @property
+    def offset_ns(self):
+        """Время хоста, соответствующее millis() = 0"""
+        if self._x0 is None:
+            return None
+        intercept = self._mean_y - self.slope * self._mean_x
+        return self._y0 + (intercept - self.slope * self._x0) * NS_PER_MS
+
+    def to_host(self, device_ms):
+        """
+        Переводит время ардуино во время хоста (нс); принимает число или массив numpy
+        """
+        if self._x0 is None:
+            raise ValueError("Clock fit has no points")
+        intercept = self._mean_y - self.slope * self._mean_x
+        return self._y0 + (intercept + self.slope * (device_ms - self._x0)) * NS_PER_MS
+
+    def to_device(self, host_ns):
+        """Обратный перевод: время хоста (нс) во время ардуино (мс)"""
+        if self._x0 is None:
+            raise ValueError("Clock fit has no points")
+        intercept = self._mean_y - self.slope * self._mean_x
+        return self._x0 + ((host_ns - self._y0) / NS_PER_MS - intercept) / self.slope
+
+    def stamp(self, rows, received_ns):
+        """
+        Уточняет модель по пачке и дописывает к каждой строке время приема пачки и пересчитанное время хоста
+        :param rows: Строки телеметрии пачки, первое значение - метка времени ардуино
+        :param received_ns: time.monotonic_ns() приема пачки
+        """
+        previous = self.last_device
+        # Метки внутри пачки возрастают, поэтому перезагрузка видна по краям пачки; построчно проверяются
+        # только такие пачки
+        if (previous is not None and rows[0][0] < previous) or rows[-1][0] < rows[0][0]:
+            start = 0
+            for i, row in enumerate(rows):
+                if previous is not None and row[0] < previous:
+                    if i > start:
+                        self._stamp(rows[start:i], received_ns)
+                    self.restarts += 1
+                    self.reset()
+                    start = i
+                previous = row[0]
+            rows = rows[start:]
+        self._stamp(rows, received_ns)
+
+    def _stamp(self, rows, received_ns):
+        self.add(rows[-1][0], received_ns)
+        # Коэффициенты считаются один раз на пачку
+        intercept = self._mean_y - self.slope * self._mean_x
+        base = self._y0 + intercept * NS_PER_MS
+        scale = self.slope * NS_PER_MS
+        x0 = self._x0
+        for row in rows:
+            row.append(received_ns)
+            row.append(int(base + scale * (row[0] - x0)))
+
+
+def fit_clock(device_ms, received_ns):
+    """
+    Повторная аппроксимация часов по сохраненной записи
+    :param device_ms: Столбец timestamp
+    :param received_ns: Столбец recv_ns; строки одной пачки имеют одинаковое время приема
+    :return: ClockFit по последним строкам каждой пачки
+    """
+    import numpy as np
+
+    device_ms = np.asarray(device_ms, dtype=np.int64)
+    received_ns = np.asarray(received_ns, dtype=np.int64)
+    # Последняя строка каждой пачки ближе всего ко времени приема
+    last = np.flatnonzero(np.diff(received_ns, append=received_ns[-1:] + 1))
+    clock = ClockFit()
+    x = device_ms[last]
+    y = received_ns[last]
+    clock._x0 = int(x[0])
+    clock._y0 = int(y[0])
+    xs = (x - x[0]).astype(np.float64)
+    ys = (y - y[0]) / NS_PER_MS
+    clock.count = len(xs)
+    clock._mean_x = float(xs.mean())
+    clock._mean_y = float(ys.mean())
+    clock._cxx = float(((xs - clock._mean_x) ** 2).sum())
+    clock._cxy = float(((xs - clock._mean_x) * (ys - clock._mean_y)).sum())
+    return clock
+
+
+def resample(grid, times, values, method='linear'):
+    """
+    Значения канала на заданной сетке времени
+    :param grid: Сетка времени
+    :param times: Время отсчетов канала (возрастающее)
+    :param values: Значения канала
+    :param method: 'linear' - линейная интерполяция, 'previous' - последнее известное значение (команды, ступени)
+    :return: Массив float64; вне диапазона канала - NaN
+    """
+    import numpy as np
+
+    grid = np.asarray(grid, dtype=np.float64)
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if method == 'linear':
+        return np.interp(grid, times, values, left=np.nan, right=np.nan)
+    if method == 'previous':
+        index = np.searchsorted(times, grid, side='right') - 1
+        result = values[np.clip(index, 0, len(values) - 1)]
+        result[(index < 0) | (grid > times[-1])] = np.nan
+        return result
+    raise ValueError(f"Unknown resampling method: {method}")
+
+
+def align(channels, step, start=None, stop=None, method='linear'):
+    """
+    Приводит несколько каналов или стендов к общей сетке времени
+    :param channels: Словарь {имя: (время, значения)}; время у всех каналов в одной шкале (например host_ns)
+    :param step: Шаг сетки в единицах времени каналов
+    :param start: Начало сетки, по умолчанию - начало общего для всех каналов участка
+    :param stop: Конец сетки, по умолчанию - конец общего участка
+    :param method: Способ передискретизации, см. resample; либо словарь {имя: способ}
+    :return: Сетка и словарь {имя: значения на сетке}
+    """
+    import numpy as np
+
+    if start is None:
+        start = max(float(times[0]) for times, _ in channels.values())
+    if stop is None:
+        stop = min(float(times[-1]) for times, _ in channels.values())
+    grid = np.arange(start, stop + step / 2, step, dtype=np.float64)
+    return grid, {
+        name: resample(grid, times, values, method[name] if isinstance(method, dict) else method)
+        for name, (times, values) in channels.items()
+    }
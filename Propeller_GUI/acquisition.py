@@ -0,0 +1,126 @@
+import queue
+import threading
+import time
+import serial
+import shared  # noqa: F401  подключает модули Eng_logg
+from binary_protocol import TelemetryDecoder
+
+# Сообщения от потока сбора данных к интерфейсу
+EVENT_LINE = 'line'   # Служебная строка ардуино
+EVENT_SAMPLES = 'samples'   # Пачка телеметрии: словарь {канал: список значений}
+EVENT_ERROR = 'error'   # Ошибка порта, поток завершается
+EVENT_STOPPED = 'stopped'   # Поток завершил работу
+
+
+class AcquisitionWorker(threading.Thread):
+    def __init__(self, port, baud_rate=115200, batch_interval=0.05, read_timeout=0.05, filters=None):
+        """
+        Поток, который владеет последовательным портом и передает телеметрию интерфейсу пачками
+        :param port: Последовательный порт
+        :param baud_rate: Скорость порта
+        :param batch_interval: Период отправки пачек телеметрии в интерфейс (с)
+        :param read_timeout: Таймаут чтения порта (с), ограничивает задержку реакции на команды
+        :param filters: Словарь {канал: FilterChain} для обработки каналов тензодатчиков или None. В пачке
+                        канал заменяется обработанными значениями, сырые передаются как <канал>_raw
+        """
+        super().__init__(name=f'Acquisition-{port}', daemon=True)
+        self.port = port
+        self.baud_rate = baud_rate
+        self.batch_interval = batch_interval
+        self.read_timeout = read_timeout
+        self.filters = filters or {}
+        # SimpleQueue не использует блокировки на стороне записи и не ограничена по размеру
+        self.events = queue.SimpleQueue()
+        self._commands = queue.SimpleQueue()
+        self._stop_event = threading.Event()
+        self._serial = None
+        self.samples = 0   # Количество принятых строк телеметрии
+        self.malformed = 0   # Количество поврежденных строк и кадров телеметрии
+
+    def send(self, command):
+        """Ставит команду в очередь на отправку в порт"""
+        self._commands.put(command)
+
+    def stop(self, abort_command=b'-\n'):
+        """
+        Немедленно останавливает поток
+        :param abort_command: Команда остановки двигателя, отправляемая перед закрытием порта, None - не отправлять
+        """
+        if abort_command is not None:
+            self.send(abort_command)
+        self._stop_event.set()
+        ser = self._serial
+        if ser is not None:
+            try:
+                # Прерывает ожидание в read(), чтобы поток не ждал таймаута
+                ser.cancel_read()
+            except (AttributeError, serial.SerialException):
+                pass
+
+    @property
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def run(self):
+        try:
+            with serial.Serial(self.port, self.baud_rate, timeout=self.read_timeout) as ser:
+                self._serial = ser
+                self._loop(ser)
+        except (serial.SerialException, OSError) as e:
+            self.events.put((EVENT_ERROR, str(e)))
+        finally:
+            self._serial = None
+            self.events.put((EVENT_STOPPED, None))
+
+    def _loop(self, ser):
+        # Тот же разбор, что и в логгерах: текстовые строки и двоичные кадры скетча
+        decoder = TelemetryDecoder()
+        batch = {}
+        next_flush = time.monotonic() + self.batch_interval
+
+        while True:
+            self._write_commands(ser)
+            if self._stop_event.is_set():
+                break
+
+            data = ser.read(max(1, ser.in_waiting))
+            if data:
+                for line, record in decoder.feed(data):
+                    if record is None:
+                        if not line.startswith('timestamp'):
+                            self.events.put((EVENT_LINE, line))
+                        continue
+                    self.samples += 1
+                    batch.setdefault('timestamp', []).append(record.timestamp)
+                    batch.setdefault('speed', []).append(record.speed)
+                    if record.weight is not None:
+                        batch.setdefault('weight', []).append(record.weight)
+                    if record.extra:
+                        for name, value in record.extra.items():
+                            batch.setdefault(name, []).append(value)
+                self.malformed = decoder.parser.malformed + decoder.crc_errors
+
+            now = time.monotonic()
+            if batch and now >= next_flush:
+                self.events.put((EVENT_SAMPLES, self._filter(batch)))
+                batch = {}
+                next_flush = now + self.batch_interval
+
+        if batch:
+            self.events.put((EVENT_SAMPLES, self._filter(batch)))
+
+    def _filter(self, batch):
+        """Обрабатывает каналы пачки; фильтры работают в этом потоке и не занимают цикл интерфейса"""
+        for name, chain in self.filters.items():
+            if name in batch:
+                batch[name + '_raw'] = batch[name]
+                batch[name] = chain.process(batch[name]).tolist()
+        return batch
+
+    def _write_commands(self, ser):
+        while True:
+            try:
+                command = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            ser.write(command)
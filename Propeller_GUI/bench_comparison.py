@@ -0,0 +1,77 @@
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from comparison import SeriesCache, SeriesLoader, series_key, EVENT_LOADED
+from capture import encode_header, SPEED_WEIGHT_COLUMNS, COLUMN_TYPES
+
+
+def write_capture(path, rows, seed):
+    """Синтетический прогон runMotorTest(): разгон ступенями по 10 PWM, удержание, торможение"""
+    dtype = np.dtype([(name, COLUMN_TYPES[code][0]) for name, code in SPEED_WEIGHT_COLUMNS])
+    data = np.zeros(rows, dtype=dtype)
+    data['timestamp'] = np.arange(rows)
+    phase = np.arange(rows) / rows
+    speed = np.where(phase < 0.25, phase * 4, np.where(phase < 0.75, 1.0, (1 - phase) * 4))
+    data['speed'] = 1000 + (speed * 25).astype(int) * 10
+    rng = np.random.default_rng(seed)
+    data['weight'] = (data['speed'] - 1000) ** 2 * (0.01 + seed * 0.001) + rng.normal(0, 3, rows)
+    header = {'columns': [[name, dtype.fields[name][0].str] for name in dtype.names], 'metadata': {}}
+    with open(path, 'wb') as f:
+        f.write(encode_header(header))
+        f.write(data.tobytes())
+
+
+def load_all(loader, keys):
+    """Заказывает ряды и ждет, пока поток загрузки вернет их все"""
+    start = time.perf_counter()
+    for key in keys:
+        loader.request(key)
+    remaining = set(keys)
+    while remaining:
+        event, (key, _) = loader.events.get()
+        if event != EVENT_LOADED:
+            raise RuntimeError(f"failed to load {key[0]}")
+        remaining.discard(key)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк загрузки рядов для сравнения прогонов")
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--budget-mb', type=float, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, f"run{i}.cap") for i in range(args.runs)]
+        for i, path in enumerate(paths):
+            write_capture(path, args.rows, i)
+        keys = [series_key(path) for path in paths]
+
+        cache = SeriesCache(int(args.budget_mb * (1 << 20)))
+        loader = SeriesLoader(cache)
+        loader.start()
+        first = load_all(loader, keys)
+        print(f"first load: {args.runs} runs x {args.rows} rows in {first:.2f} s "
+              f"({first / args.runs * 1000:.0f} ms/run, background thread)")
+
+        # Повторный выбор тех же прогонов: ряды берутся из кэша в потоке интерфейса
+        start = time.perf_counter()
+        cached = [cache.get(key) for key in keys]
+        elapsed = time.perf_counter() - start
+        print(f"reselect from cache: {elapsed * 1000:.3f} ms, {sum(s is not None for s in cached)}/{args.runs} hits, "
+              f"cache {cache.nbytes / (1 << 20):.2f} MB in {len(cache)} series, evictions {cache.evictions}")
+
+        # Маленький бюджет: кэш вытесняет давние ряды и не превышает ограничение
+        small = SeriesCache(budget_bytes=cache.nbytes // 4)
+        for key in keys:
+            small.put(key, cache.get(key))
+        print(f"budget {small.budget_bytes / (1 << 20):.2f} MB: {len(small)} series kept, "
+              f"{small.nbytes / (1 << 20):.2f} MB, evictions {small.evictions}")
+        loader.stop()
+
+
+if __name__ == "__main__":
+    main()
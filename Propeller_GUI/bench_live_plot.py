@@ -0,0 +1,84 @@
+import argparse
+import time
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from live_plot import LivePlot
+
+# Количество точек на графике
+sizes = [1_000, 10_000, 100_000, 1_000_000]
+
+
+def make_figure():
+    figure = Figure(figsize=(12, 3), dpi=100)
+    canvas = FigureCanvasAgg(figure)
+    axes = [figure.add_subplot(131, title="RPM"), figure.add_subplot(132, title="Moment"),
+            figure.add_subplot(133, title="Thrust")]
+    return figure, canvas, axes
+
+
+def legacy_frame(canvas, axes, series):
+    """Старый update_graphs: очистка осей и перерисовка всех точек"""
+    for ax, (title, values) in zip(axes, series.items()):
+        ax.clear()
+        ax.set_title(title)
+        ax.grid(True, linestyle='--', alpha=0.6)
+        ax.plot(values, label=title)
+        ax.legend()
+    canvas.draw()
+
+
+def bench_legacy(points, frames):
+    _, canvas, axes = make_figure()
+    rng = np.random.default_rng(0)
+    series = {name: rng.normal(size=points).cumsum() for name in ("RPM", "Moment", "Thrust")}
+    start = time.perf_counter()
+    for _ in range(frames):
+        legacy_frame(canvas, axes, series)
+    return (time.perf_counter() - start) / frames
+
+
+def bench_live(points, frames, batch=100):
+    _, canvas, axes = make_figure()
+    live_plot = LivePlot(canvas, dict(zip(("RPM", "Moment", "Thrust"), axes)), capacity=points)
+    rng = np.random.default_rng(0)
+    # Заполняем окно до начала измерений
+    warmup = rng.normal(size=points).cumsum()
+    live_plot.extend(RPM=warmup, Moment=warmup, Thrust=warmup)
+    live_plot.update(force=True)
+
+    redraws = live_plot.full_redraws
+    start = time.perf_counter()
+    for _ in range(frames):
+        chunk = warmup[-1] + rng.normal(size=batch).cumsum()
+        live_plot.extend(RPM=chunk, Moment=chunk, Thrust=chunk)
+        live_plot.update(force=True)
+    elapsed = (time.perf_counter() - start) / frames
+    drawn = sum(len(line.get_xdata()) for line in live_plot.lines.values()) // len(live_plot.lines)
+
+    # Масштабирование: прореживание пересчитывается для видимой части
+    start = time.perf_counter()
+    for ax in axes:
+        ax.set_xlim(points // 3, points // 2)
+    canvas.draw()
+    zoom = time.perf_counter() - start
+    return elapsed, live_plot.full_redraws - redraws, drawn, zoom
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк времени кадра графиков TestApp")
+    parser.add_argument('--frames', type=int, default=30)
+    args = parser.parse_args()
+
+    for points in sizes:
+        legacy = bench_legacy(points, max(1, args.frames // (5 if points < 1_000_000 else 30)))
+        live, redraws, drawn, zoom = bench_live(points, args.frames)
+        print(f"{points:8d} points  legacy {legacy * 1000:8.1f} ms/frame  "
+              f"live {live * 1000:8.1f} ms/frame  full redraws {redraws}/{args.frames}  "
+              f"drawn {drawn} points  zoom {zoom * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import os
+import queue
+import threading
+from collections import OrderedDict
+import numpy as np
+import shared  # noqa: F401  подключает модули Eng_logg
+from analysis import analyze
+from capture import load_capture_parts
+from decimate import minmax_decimate_parts
+
+# Сообщения от потока загрузки к интерфейсу
+EVENT_LOADED = 'loaded'   # Ряд загружен: (ключ, словарь массивов)
+EVENT_FAILED = 'failed'   # Ошибка загрузки: (ключ, текст ошибки)
+
+
+def series_key(path):
+    """Ключ кэша: путь и время изменения, чтобы перезаписанный файл загружался заново"""
+    return path, os.stat(path).st_mtime_ns
+
+
+def load_series(path, buckets=2000):
+    """
+    Читает запись прогона и готовит ряды для сравнения
+    :param path: Путь к двоичной записи или каталогу сегментов
+    :param buckets: Количество корзин прореживания ряда тяги по времени
+    :return: Словарь массивов: time (от начала прогона), thrust (прореженные), curve_speed, curve_thrust
+             (кривая тяги по ступеням)
+    """
+    _, parts = load_capture_parts(path)
+    parts = [data for data in parts if len(data)]
+    pairs = [(data['timestamp'], data['weight'] if 'weight' in data.dtype.names else
+              np.zeros(len(data), dtype=np.int32)) for data in parts]
+    # Сегменты прореживаются по одному; копии: прореженные ряды не должны держать открытым отображение файлов
+    time_view, thrust_view = minmax_decimate_parts(pairs, buckets)
+    speeds, thrust, _ = analyze(path).curve()
+    return {
+        'time': np.array(time_view, dtype=np.float64) - (float(parts[0]['timestamp'][0]) if parts else 0.0),
+        'thrust': np.array(thrust_view, dtype=np.float64),
+        'curve_speed': speeds,
+        'curve_thrust': thrust,
+    }
+
+
+class SeriesCache:
+    def __init__(self, budget_bytes=64 << 20):
+        """
+        LRU-кэш загруженных рядов с ограничением по памяти
+        :param budget_bytes: Максимальный суммарный размер массивов в кэше
+        """
+        self.budget_bytes = budget_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        # Кэш заполняет поток загрузки, а читает интерфейс
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def get(self, key):
+        with self._lock:
+            series = self._items.get(key)
+            if series is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return series
+
+    def put(self, key, series):
+        size = sum(array.nbytes for array in series.values())
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self.nbytes -= sum(array.nbytes for array in previous.values())
+            self._items[key] = series
+            self.nbytes += size
+            # Вытесняем давно не использованные ряды; последний добавленный остается, даже если он больше бюджета
+            while self.nbytes > self.budget_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self.nbytes -= sum(array.nbytes for array in evicted.values())
+                self.evictions += 1
+
+
+class SeriesLoader(threading.Thread):
+    def __init__(self, cache, buckets=2000):
+        """
+        Поток, который загружает ряды прогонов в кэш, не блокируя интерфейс
+        :param cache: SeriesCache
+        :param buckets: Количество корзин прореживания
+        """
+        super().__init__(name='SeriesLoader', daemon=True)
+        self.cache = cache
+        self.buckets = buckets
+        self.events = queue.SimpleQueue()
+        self._requests = queue.SimpleQueue()
+        self._pending = set()   # Ключи, уже поставленные в очередь
+        self._lock = threading.Lock()
+
+    def request(self, key):
+        """
+        Ставит ряд в очередь загрузки; о готовности сообщает событие EVENT_LOADED
+        :param key: Ключ series_key()
+        """
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._requests.put(key)
+
+    def stop(self):
+        self._requests.put(None)
+
+    def run(self):
+        while True:
+            key = self._requests.get()
+            if key is None:
+                return
+            try:
+                series = load_series(key[0], self.buckets)
+                self.cache.put(key, series)
+            except (OSError, ValueError, KeyError) as e:
+                self.events.put((EVENT_FAILED, (key, str(e))))
+            else:
+                self.events.put((EVENT_LOADED, (key, series)))
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
@@ -0,0 +1,192 @@
+import time
+import numpy as np
+import shared  # noqa: F401  подключает модули Eng_logg
+from decimate import decimate_view, axes_buckets
+
+
+class RingBuffer:
+    def __init__(self, capacity, dtype=np.float64):
+        """
+        Кольцевой буфер фиксированного размера с непрерывным представлением последних значений
+        :param capacity: Максимальное количество хранимых значений
+        :param dtype: Тип значений
+        """
+        self.capacity = capacity
+        # Каждое значение пишется дважды (i и i + capacity), поэтому окно последних значений всегда непрерывно
+        self._data = np.zeros(2 * capacity, dtype=dtype)
+        self._head = 0   # Позиция для следующей записи
+        self.total = 0   # Количество значений, записанных за все время
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def extend(self, values):
+        """Добавляет пачку значений одной векторной операцией"""
+        values = np.asarray(values, dtype=self._data.dtype).ravel()
+        if len(values) > self.capacity:
+            self.total += len(values) - self.capacity
+            values = values[-self.capacity:]
+        count = len(values)
+        if count == 0:
+            return
+        head = self._head
+        first = min(count, self.capacity - head)
+        self._data[head:head + first] = values[:first]
+        self._data[head + self.capacity:head + self.capacity + first] = values[:first]
+        rest = count - first
+        if rest:
+            self._data[:rest] = values[first:]
+            self._data[self.capacity:self.capacity + rest] = values[first:]
+        self._head = (head + count) % self.capacity
+        self.total += count
+
+    def view(self):
+        """Последние значения в порядке поступления, без копирования"""
+        size = len(self)
+        start = self._head + self.capacity - size
+        return self._data[start:start + size]
+
+    def clear(self):
+        self._head = 0
+        self.total = 0
+
+
+class LivePlot:
+    def __init__(self, canvas, axes, capacity=200_000, fps=20.0, margin=0.25):
+        """
+        Обновление графиков в реальном времени: данные в кольцевых буферах, перерисовка только линий.
+        Линии прорежены до ширины оси в пикселях, поэтому время кадра не зависит от количества точек
+        :param canvas: Холст matplotlib (FigureCanvasTkAgg или FigureCanvasAgg)
+        :param axes: Словарь {имя канала: ось}
+        :param capacity: Количество последних точек, отображаемых по каждому каналу
+        :param fps: Максимальная частота кадров
+        :param margin: Запас при расширении пределов осей, чтобы полная перерисовка была редкой
+        """
+        self.canvas = canvas
+        self.axes = axes
+        self.capacity = capacity
+        self.frame_interval = 1.0 / fps
+        self.margin = margin
+
+        self.buffers = {name: RingBuffer(capacity) for name in axes}
+        self.lines = {}
+        for name, ax in axes.items():
+            # animated=True исключает линию из обычной перерисовки холста, она рисуется поверх фона
+            (self.lines[name],) = ax.plot([], [], label=name, animated=True)
+            ax.legend()
+
+        self.background = None
+        self.last_frame = 0.0
+        self.dirty = False
+        self.full_redraws = 0   # Количество полных перерисовок холста
+        self.frames = 0   # Количество отрисованных кадров
+        self.follow = True   # Пределы осей следуют за новыми данными; выключается, когда пользователь масштабирует
+        self._fitting = False
+        self._draw_cid = canvas.mpl_connect('draw_event', self._on_draw)
+        for name, ax in axes.items():
+            ax.callbacks.connect('xlim_changed', lambda ax, name=name: self._on_xlim_changed(name))
+
+    def extend(self, **channels):
+        """
+        Добавляет новые значения в каналы
+        :param channels: Имя канала и последовательность новых значений
+        """
+        for name, values in channels.items():
+            self.buffers[name].extend(values)
+        self.dirty = True
+
+    def clear(self):
+        for buffer in self.buffers.values():
+            buffer.clear()
+        self.dirty = True
+        self.background = None
+        self.follow = True
+
+    def follow_latest(self):
+        """Возвращает автоматическое следование за новыми данными после ручного масштабирования"""
+        self.follow = True
+        self.dirty = True
+        self.background = None
+
+    def update(self, force=False):
+        """
+        Перерисовывает изменившиеся линии не чаще заданной частоты кадров
+        :param force: Перерисовать независимо от ограничения частоты
+        :return: True, если кадр был отрисован
+        """
+        now = time.perf_counter()
+        if not self.dirty or (not force and now - self.last_frame < self.frame_interval):
+            return False
+        self.last_frame = now
+        self.dirty = False
+        self.frames += 1
+
+        rescale = False
+        for name in self.buffers:
+            if self.follow:
+                rescale |= self._fit_limits(name)
+            self._set_line(name)
+
+        if rescale or self.background is None:
+            # Пределы осей изменились: нужен новый фон с подписями, линии дорисуются в _on_draw
+            self.full_redraws += 1
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            self._draw_lines()
+            # На экран копируются только области осей
+            for ax in self.axes.values():
+                self.canvas.blit(ax.bbox)
+        return True
+
+    def _series(self, name):
+        buffer = self.buffers[name]
+        y = buffer.view()
+        return np.arange(buffer.total - len(y), buffer.total), y
+
+    def _set_line(self, name):
+        # На линию попадает только видимая часть, не больше двух точек на пиксель
+        ax = self.axes[name]
+        x, y = self._series(name)
+        x0, x1 = ax.get_xlim()
+        self.lines[name].set_data(*decimate_view(x, y, min(x0, x1), max(x0, x1), axes_buckets(ax)))
+
+    def _fit_limits(self, name):
+        ax = self.axes[name]
+        x, y = self._series(name)
+        if len(y) == 0:
+            return False
+        changed = False
+        self._fitting = True
+        x0, x1 = ax.get_xlim()
+        if x[0] < x0 or x[-1] > x1:
+            span = max(self.capacity, 1)
+            # Ось времени сдвигается скачком на часть окна, а не на каждом кадре
+            right = x[-1] + span * self.margin
+            ax.set_xlim(right - span * (1 + self.margin), right)
+            changed = True
+        y0, y1 = ax.get_ylim()
+        low, high = float(y.min()), float(y.max())
+        if low < y0 or high > y1:
+            # Пределы только расширяются, с запасом, чтобы не перерисовывать подписи на каждом кадре
+            pad = max(high - low, abs(high), 1.0) * self.margin
+            ax.set_ylim(min(y0, low - pad) if low < y0 else y0, max(y1, high + pad) if high > y1 else y1)
+            changed = True
+        self._fitting = False
+        return changed
+
+    def _on_xlim_changed(self, name):
+        if self._fitting:
+            return
+        # Масштабирование или сдвиг панелью инструментов: прореживание пересчитывается до перерисовки холста
+        self.follow = False
+        self._set_line(name)
+
+    def _on_draw(self, event):
+        # Обычная перерисовка холста (изменение размера, новые пределы): сохраняем фон и рисуем линии
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._draw_lines()
+
+    def _draw_lines(self):
+        for name, line in self.lines.items():
+            self.axes[name].draw_artist(line)
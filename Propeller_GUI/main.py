@@ -1,23 +1,57 @@
 import tkinter as tk
 from tkinter import ttk
-from ttkthemes import ThemedTk
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import serial
-import serial.tools.list_ports
 import os
-
-
-class TestApp(ThemedTk):
+import queue
+import threading
+import time
+import shared  # noqa: F401  подключает модули Eng_logg
+from catalog import Catalog, ENGINE_FIELDS, PROPELLER_FIELDS
+from dsp import load_cell_chain
+from acquisition import AcquisitionWorker, EVENT_SAMPLES, EVENT_LINE, EVENT_ERROR, EVENT_STOPPED
+
+# Тема оформления; ttkthemes подключается после первой отрисовки окна и необязателен
+theme_name = 'arc'
+
+# Обработка каналов тензодатчиков перед графиками: ноль (сырые единицы), масштаб, окно медианы, коэффициент
+# сглаживания (None - ступень отключена); см. dsp.load_cell_chain
+load_cell_settings = {
+    'weight': {'tare': 0, 'scale': 1.0, 'median_window': 5, 'lowpass_alpha': 0.2},
+    'thrust': {'tare': 0, 'scale': 1.0, 'median_window': 5, 'lowpass_alpha': 0.2},
+    'moment': {'tare': 0, 'scale': 1.0, 'median_window': 5, 'lowpass_alpha': 0.2},
+}
+
+NO_PORTS = "No Ports Available"
+SEARCHING_PORTS = "Searching ports..."
+
+
+class TestApp(tk.Tk):
     def __init__(self):
-        super().__init__(theme='arc')  # Используйте тему 'arc' для современного вида
+        super().__init__()
 
         self.title("Motor and Propeller Test")
         self.geometry("1000x600")  # Установите размер окна
 
-        # Инициализация файлов
+        # Каталог двигателей, пропеллеров и прогонов; старые текстовые списки переносятся при первом запуске
         self.engine_file = 'engines.txt'
         self.propeller_file = 'propellers.txt'
+        self.catalog = Catalog('catalog.db')
+        if not self.catalog.engine_names() and not self.catalog.propeller_names():
+            self.catalog.import_text_lists(self.engine_file, self.propeller_file)
+        self.run_recorded = False   # Прогон текущего теста уже записан в каталог
+
+        # Потоки сбора данных: каждый владеет портом своего устройства
+        self.workers = {}
+        self.pending_request = None   # Ожидаемый ответ: (порт, текст при успехе, крайний срок)
+        self.response_timeout = 2.0   # Время ожидания ответа на команду (с)
+        self.poll_interval = 30   # Период опроса очередей потоков (мс)
+        self.poll_budget = 0.01   # Максимальное время разбора очередей за один опрос (с)
+
+        # Графики, анализатор и сравнение прогонов создаются после первой отрисовки окна (start_deferred)
+        self.live_plot = None
+        self.analyzer = None
+        self.series_loader = None
+        self.ports = queue.SimpleQueue()   # Результаты поиска портов из фонового потока
+        self.port_scan = None
 
         # Настройка меню
         self.create_menu()
@@ -44,6 +78,32 @@ class TestApp(ThemedTk):
         # Обновляем выпадающие списки
         self.update_dropdowns()
 
+        # Окно показывается сразу; matplotlib, numpy и тема подключаются следующим шагом цикла событий
+        self.after(1, self.start_deferred)
+
+    def start_deferred(self):
+        """Загружает тяжелые модули и строит графики; вызывается после первой отрисовки окна"""
+        # Окно дорисовывается до того, как цикл событий займут импорты matplotlib и numpy
+        self.update_idletasks()
+        from analysis import StepAnalyzer
+
+        self.apply_theme()
+        self.create_graphs()
+        self.create_comparison_graphs()
+        # Ступени скорости и кривая тяги считаются на лету по мере прихода телеметрии
+        self.analyzer = StepAnalyzer()
+        self.load_run_list()
+
+        # Опрос потоков сбора данных
+        self.after(self.poll_interval, self.poll_acquisition)
+
+    def apply_theme(self):
+        try:
+            from ttkthemes import ThemedStyle
+        except ImportError:
+            return   # Остается стандартная тема ttk
+        ThemedStyle(self).set_theme(theme_name)
+
     def create_menu(self):
         menu = tk.Menu(self)
         self.config(menu=menu)
@@ -60,6 +120,25 @@ class TestApp(ThemedTk):
         self.graph_frame = ttk.Frame(self.graph_tab)
         self.graph_frame.pack(fill='both', expand=True, padx=10, pady=10)
 
+        # Окна ввода
+        self.engine_label = ttk.Label(self.graph_tab, text="Engine:")
+        self.engine_label.pack(pady=5, padx=10, anchor='w')
+        self.engine_combobox = ttk.Combobox(self.graph_tab, values=self.load_engine_list())
+        self.engine_combobox.pack(pady=5, padx=10, fill='x')
+
+        self.propeller_label = ttk.Label(self.graph_tab, text="Propeller:")
+        self.propeller_label.pack(pady=5, padx=10, anchor='w')
+        self.propeller_combobox = ttk.Combobox(self.graph_tab, values=self.load_propeller_list())
+        self.propeller_combobox.pack(pady=5, padx=10, fill='x')
+
+        self.create_comparison_panel()
+
+    def create_graphs(self):
+        """Графики в реальном времени на вкладке Graphs"""
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+        from live_plot import LivePlot
+
         # Создание фигур для графиков
         self.figure = Figure(figsize=(12, 3), dpi=100)  # Установите размеры фигуры
         self.ax1 = self.figure.add_subplot(131, title="RPM")
@@ -75,16 +154,50 @@ class TestApp(ThemedTk):
         self.canvas = FigureCanvasTkAgg(self.figure, self.graph_frame)
         self.canvas.get_tk_widget().pack(fill='both', expand=True)
 
-        # Окна ввода
-        self.engine_label = ttk.Label(self.graph_tab, text="Engine:")
-        self.engine_label.pack(pady=5, padx=10, anchor='w')
-        self.engine_combobox = ttk.Combobox(self.graph_tab, values=self.load_engine_list())
-        self.engine_combobox.pack(pady=5, padx=10, fill='x')
-
-        self.propeller_label = ttk.Label(self.graph_tab, text="Propeller:")
-        self.propeller_label.pack(pady=5, padx=10, anchor='w')
-        self.propeller_combobox = ttk.Combobox(self.graph_tab, values=self.load_propeller_list())
-        self.propeller_combobox.pack(pady=5, padx=10, fill='x')
+        # Графики в реальном времени: кольцевые буферы и перерисовка только линий
+        self.live_plot = LivePlot(self.canvas, {'RPM': self.ax1, 'Moment': self.ax2, 'Thrust': self.ax3})
+        self.after(int(self.live_plot.frame_interval * 1000), self.refresh_graphs)
+
+        # Масштабирование и сдвиг; прореживание линий пересчитывается для видимого диапазона
+        self.toolbar = NavigationToolbar2Tk(self.canvas, self.graph_frame, pack_toolbar=False)
+        self.toolbar.pack(side='bottom', fill='x', before=self.canvas.get_tk_widget())
+        self.follow_button = ttk.Button(self.graph_frame, text="Follow", command=self.live_plot.follow_latest)
+        self.follow_button.pack(side='bottom', anchor='e', before=self.toolbar)
+
+    def create_comparison_panel(self):
+        """Сравнение прежних прогонов: кривые тяги и тяга по времени поверх друг друга"""
+        self.compare_frame = ttk.Frame(self.graph_tab)
+        self.compare_frame.pack(fill='both', expand=True, padx=10, pady=5)
+
+        # Прогоны выбранного двигателя из каталога; несколько прогонов выбираются с Ctrl/Shift
+        self.run_listbox = tk.Listbox(self.compare_frame, selectmode='extended', height=8, width=48,
+                                      exportselection=False)
+        self.run_listbox.pack(side='left', fill='y')
+        self.compare_runs = []   # Строки каталога в порядке списка
+        self.shown_series = {}   # Ряды на графике; держатся, даже если кэш их уже вытеснил
+
+    def create_comparison_graphs(self):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from comparison import SeriesCache, SeriesLoader
+
+        self.compare_figure = Figure(figsize=(8, 2.5), dpi=100)
+        self.curve_ax = self.compare_figure.add_subplot(121, title="Thrust curve")
+        self.curve_ax.set_xlabel("Speed (PWM)")
+        self.history_ax = self.compare_figure.add_subplot(122, title="Thrust vs time")
+        self.history_ax.set_xlabel("Time (ms)")
+        for ax in (self.curve_ax, self.history_ax):
+            ax.grid(True, linestyle='--', alpha=0.6)
+        self.compare_canvas = FigureCanvasTkAgg(self.compare_figure, self.compare_frame)
+        self.compare_canvas.get_tk_widget().pack(side='left', fill='both', expand=True)
+
+        # Загруженные ряды хранятся в LRU-кэше, повторный выбор прогона не читает файл
+        self.series_cache = SeriesCache(budget_bytes=64 << 20)
+        self.series_loader = SeriesLoader(self.series_cache)
+        self.series_loader.start()
+        self.after(self.poll_interval, self.poll_comparison)
+        self.run_listbox.bind('<<ListboxSelect>>', lambda event: self.update_comparison())
+        self.engine_combobox.bind('<<ComboboxSelected>>', lambda event: self.load_run_list())
 
     def create_graph_panel(self, ax, title):
         """ Создает мини-экранчик для графика с рамкой """
@@ -173,9 +286,12 @@ class TestApp(ThemedTk):
         self.port_label = ttk.Label(self.port_frame, text="Select COM Port:")
         self.port_label.pack(side='left', padx=5)
 
-        self.port_combobox = ttk.Combobox(self.port_frame)
-        self.port_combobox['values'] = self.get_ports()
+        # Перечисление портов может занимать сотни миллисекунд, поэтому идет в фоновом потоке;
+        # при открытии списка порты ищутся заново
+        self.port_combobox = ttk.Combobox(self.port_frame, postcommand=self.scan_ports)
+        self.port_combobox.set(SEARCHING_PORTS)
         self.port_combobox.pack(side='left', padx=5)
+        self.scan_ports()
 
         # Кнопка для проверки порта
         self.check_button = ttk.Button(self.port_frame, text="Check Port", command=self.check_port)
@@ -185,58 +301,261 @@ class TestApp(ThemedTk):
         self.test_button = ttk.Button(self.port_frame, text="Run Test", command=self.run_test)
         self.test_button.pack(side='left', padx=5)
 
+        # Кнопка для немедленной остановки теста
+        self.stop_button = ttk.Button(self.port_frame, text="Stop", command=self.stop_test)
+        self.stop_button.pack(side='left', padx=5)
+
         # Лейбл для отображения результатов проверки порта
         self.test_result_label = ttk.Label(self.port_frame, text="", foreground="red")
         self.test_result_label.pack(side='left', padx=5)
 
-    def get_ports(self):
+    @staticmethod
+    def get_ports():
+        import serial.tools.list_ports
+
         ports = [port.device for port in serial.tools.list_ports.comports()]
-        return ports if ports else ["No Ports Available"]
+        return ports if ports else [NO_PORTS]
+
+    def scan_ports(self):
+        """Запускает поиск портов в фоновом потоке, если он еще не идет"""
+        if self.port_scan is not None and self.port_scan.is_alive():
+            return
+        self.port_scan = threading.Thread(target=lambda: self.ports.put(self.get_ports()), daemon=True)
+        self.port_scan.start()
+        self.after(self.poll_interval, self.poll_ports)
+
+    def poll_ports(self):
+        """Забирает список портов из фонового потока"""
+        try:
+            ports = self.ports.get_nowait()
+        except queue.Empty:
+            self.after(self.poll_interval, self.poll_ports)
+            return
+        self.port_combobox['values'] = ports
+        if self.port_combobox.get() in (SEARCHING_PORTS, NO_PORTS, '') or ports == [NO_PORTS]:
+            self.port_combobox.set(ports[0])
 
     def check_port(self):
         selected_port = self.port_combobox.get()
-        if selected_port == "No Ports Available":
+        if selected_port in (NO_PORTS, SEARCHING_PORTS):
             self.test_result_label.config(text="No ports available", foreground="red")
             return
 
-        try:
-            with serial.Serial(selected_port, 9600, timeout=2) as ser:
-                ser.write(b"TEST\n")
-                response = ser.readline().decode().strip()
-                if response == "OK":
-                    self.test_result_label.config(text="Port is working", foreground="green")
-                else:
-                    self.test_result_label.config(text="Invalid response", foreground="red")
-        except Exception as e:
-            self.test_result_label.config(text=f"Error: {e}", foreground="red")
+        self.send_request(selected_port, b"TEST\n", "Port is working")
 
     def run_test(self):
         selected_port = self.port_combobox.get()
-        if selected_port == "No Ports Available":
+        if selected_port in (NO_PORTS, SEARCHING_PORTS):
             self.test_result_label.config(text="No ports available", foreground="red")
             return
+        if self.live_plot is None:
+            self.test_result_label.config(text="Starting up, try again", foreground="red")
+            return
 
-        try:
-            with serial.Serial(selected_port, 9600, timeout=2) as ser:
-                ser.write(b"START\n")
-                response = ser.readline().decode().strip()
-                if response == "OK":
-                    self.test_result_label.config(text="Test started", foreground="green")
-                else:
-                    self.test_result_label.config(text="Invalid response", foreground="red")
-        except Exception as e:
-            self.test_result_label.config(text=f"Error: {e}", foreground="red")
+        self.reset_graphs()
+        self.send_request(selected_port, b"START\n", "Test started")
+
+    def stop_test(self):
+        """Останавливает двигатель и сбор данных без ожидания ответа"""
+        self.pending_request = None
+        self.stop_workers()
+        self.test_result_label.config(text="Test stopped", foreground="red")
+        self.show_test_info()
+
+    def get_worker(self, port):
+        """Возвращает поток сбора данных устройства, запуская его при первом обращении"""
+        worker = self.workers.get(port)
+        if worker is None or worker.stopped:
+            # Поток держит порт открытым: повторное открытие перезагружает ардуино через DTR
+            # У каждого потока свои фильтры: состояние фильтра относится к потоку данных одного устройства
+            filters = {name: load_cell_chain(**settings) for name, settings in load_cell_settings.items()}
+            worker = AcquisitionWorker(port, filters=filters)
+            worker.start()
+            self.workers[port] = worker
+        return worker
+
+    def send_request(self, port, command, success_text):
+        """
+        Отправляет команду через поток сбора данных; ответ обрабатывается в poll_acquisition
+        :param port: Порт устройства
+        :param command: Байты команды
+        :param success_text: Текст для лейбла при ответе OK
+        """
+        self.get_worker(port).send(command)
+        self.pending_request = (port, success_text, time.monotonic() + self.response_timeout)
+        self.test_result_label.config(text="Waiting for response...", foreground="black")
+
+    def poll_acquisition(self):
+        """Забирает пачки телеметрии и служебные строки из потоков сбора данных"""
+        deadline = time.monotonic() + self.poll_budget
+        channels = {'rpm': [], 'moment': [], 'thrust': []}
+
+        for port, worker in list(self.workers.items()):
+            # Ограничиваем время разбора очереди, чтобы окно оставалось отзывчивым при любом потоке данных
+            while time.monotonic() < deadline:
+                try:
+                    event, payload = worker.events.get_nowait()
+                except queue.Empty:
+                    break
+                if event == EVENT_SAMPLES:
+                    channels['rpm'] += payload.get('rpm', payload.get('speed', []))
+                    channels['moment'] += payload.get('moment', [])
+                    channels['thrust'] += payload.get('thrust', payload.get('weight', []))
+                    self.analyze_samples(payload)
+                elif event == EVENT_LINE:
+                    self.on_device_line(port, payload)
+                elif event == EVENT_ERROR:
+                    self.pending_request = None
+                    self.test_result_label.config(text=f"Error: {payload}", foreground="red")
+                elif event == EVENT_STOPPED:
+                    if self.workers.get(port) is worker:
+                        del self.workers[port]
+
+        if any(channels.values()):
+            self.update_graphs(channels['rpm'], channels['moment'], channels['thrust'])
+
+        if self.pending_request is not None and time.monotonic() > self.pending_request[2]:
+            self.pending_request = None
+            self.test_result_label.config(text="No response", foreground="red")
+
+        self.after(self.poll_interval, self.poll_acquisition)
+
+    def on_device_line(self, port, line):
+        if line.startswith("Test complete"):
+            self.show_test_info()
+        if self.pending_request is None or self.pending_request[0] != port:
+            return
+        _, success_text, _ = self.pending_request
+        self.pending_request = None
+        if line == "OK":
+            self.test_result_label.config(text=success_text, foreground="green")
+        else:
+            self.test_result_label.config(text="Invalid response", foreground="red")
+
+    def analyze_samples(self, payload):
+        """Передает пачку телеметрии анализатору ступеней"""
+        speeds = payload.get('speed', payload.get('rpm'))
+        weights = payload.get('weight', payload.get('thrust'))
+        if 'timestamp' not in payload or speeds is None:
+            return
+        self.analyzer.feed(payload['timestamp'], speeds, weights if weights is not None else [0] * len(speeds))
+
+    def show_test_info(self):
+        """Выводит статистику ступеней и кривую тяги последнего теста и прежние прогоны на вкладку Test Info"""
+        if self.analyzer is None:
+            return
+        self.analyzer.finish()
+        engine = self.selected_name(self.engine_combobox)
+        propeller = self.selected_name(self.propeller_combobox)
+        if not self.run_recorded and self.analyzer.samples:
+            self.catalog.add_run(engine=engine, propeller=propeller, port=self.port_combobox.get(),
+                                 summary=self.analyzer.summary())
+            self.run_recorded = True
+
+        self.test_info_text.delete('1.0', tk.END)
+        self.test_info_text.insert(tk.END, self.analyzer.report())
+        runs = self.catalog.find_runs(engine, propeller, limit=20)
+        self.test_info_text.insert(tk.END, "\n\nPrevious runs:\n" + self.format_runs(runs))
+
+    @staticmethod
+    def selected_name(combobox):
+        name = combobox.get()
+        return name if name and not name.startswith("No ") else None
+
+    @staticmethod
+    def format_runs(runs):
+        """Таблица прогонов из каталога"""
+        lines = [f"{'started':19s} {'engine':15s} {'propeller':15s} {'throttle':>8s} {'thrust':>10s} {'samples':>8s}"]
+        for run in runs:
+            started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run['started']))
+            throttle = f"{run['max_throttle']:.0f}%" if run['max_throttle'] is not None else '-'
+            thrust = f"{run['max_thrust']:.1f}" if run['max_thrust'] is not None else '-'
+            lines.append(f"{started:19s} {run['engine'] or '-':15s} {run['propeller'] or '-':15s} "
+                         f"{throttle:>8s} {thrust:>10s} {run['samples'] or 0:8d}")
+        return '\n'.join(lines)
+
+    def load_run_list(self):
+        """Заполняет список прогонов выбранного двигателя, у которых есть запись"""
+        runs = self.catalog.find_runs(self.selected_name(self.engine_combobox), limit=500)
+        self.compare_runs = [run for run in runs if run['capture_path']]
+        self.run_listbox.delete(0, tk.END)
+        for run in self.compare_runs:
+            started = time.strftime('%Y-%m-%d %H:%M', time.localtime(run['started']))
+            throttle = f"{run['max_throttle']:.0f}%" if run['max_throttle'] is not None else '-'
+            self.run_listbox.insert(tk.END, f"{started}  {run['propeller'] or '-'}  {throttle}")
+        self.update_comparison()
+
+    def update_comparison(self):
+        """Перерисовывает выбранные прогоны; недостающие ряды заказываются у потока загрузки"""
+        from comparison import series_key
+
+        for line in self.curve_ax.lines[:] + self.history_ax.lines[:]:
+            line.remove()
+
+        shown = {}
+        for index in self.run_listbox.curselection():
+            run = self.compare_runs[index]
+            try:
+                key = series_key(run['capture_path'])
+            except OSError:
+                continue
+            series = self.shown_series.get(key) or self.series_cache.get(key)
+            if series is None:
+                self.series_loader.request(key)
+                continue
+            shown[key] = series
+            label = run['propeller'] or os.path.basename(os.path.dirname(run['capture_path']))
+            (line,) = self.curve_ax.plot(series['curve_speed'], series['curve_thrust'], marker='.', label=label)
+            self.history_ax.plot(series['time'], series['thrust'], color=line.get_color(), label=label)
+
+        self.shown_series = shown
+
+        for ax in (self.curve_ax, self.history_ax):
+            ax.relim()
+            ax.autoscale_view()
+        if self.curve_ax.lines:
+            self.curve_ax.legend(fontsize='small')
+        elif self.curve_ax.get_legend() is not None:
+            self.curve_ax.get_legend().remove()
+        self.compare_canvas.draw_idle()
+
+    def poll_comparison(self):
+        """Забирает загруженные ряды из потока загрузки"""
+        from comparison import EVENT_LOADED, EVENT_FAILED
+
+        loaded = False
+        while True:
+            try:
+                event, (key, payload) = self.series_loader.events.get_nowait()
+            except queue.Empty:
+                break
+            if event == EVENT_LOADED:
+                # Ряд передается и напрямую: при малом бюджете кэш мог уже вытеснить его
+                self.shown_series[key] = payload
+                loaded = True
+            elif event == EVENT_FAILED:
+                self.test_result_label.config(text=f"Cannot load {key[0]}: {payload}", foreground="red")
+        if loaded:
+            self.update_comparison()
+        self.after(self.poll_interval, self.poll_comparison)
+
+    def stop_workers(self):
+        for worker in self.workers.values():
+            worker.stop()
+        self.workers.clear()
 
     def add_engine(self):
-        engine_data = {label: entry.get() for label, entry in self.engine_entries.items()}
-        with open(self.engine_file, 'a') as f:
-            f.write(','.join(engine_data.values()) + '\n')
+        engine_data = dict(zip(ENGINE_FIELDS, (entry.get() for entry in self.engine_entries.values())))
+        if not engine_data['name']:
+            return
+        self.catalog.add_engine(**engine_data)
         self.update_dropdowns()
 
     def add_propeller(self):
-        propeller_data = {label: entry.get() for label, entry in self.propeller_entries.items()}
-        with open(self.propeller_file, 'a') as f:
-            f.write(','.join(propeller_data.values()) + '\n')
+        propeller_data = dict(zip(PROPELLER_FIELDS, (entry.get() for entry in self.propeller_entries.values())))
+        if not propeller_data['name']:
+            return
+        self.catalog.add_propeller(**propeller_data)
         self.update_dropdowns()
 
     def update_dropdowns(self):
@@ -244,33 +563,42 @@ class TestApp(ThemedTk):
         self.propeller_combobox['values'] = self.load_propeller_list()
 
     def load_engine_list(self):
-        if os.path.exists(self.engine_file):
-            with open(self.engine_file, 'r') as f:
-                return [line.split(',')[0] for line in f]
-        return ["No Engines Available"]
+        return self.catalog.engine_names() or ["No Engines Available"]
 
     def load_propeller_list(self):
-        if os.path.exists(self.propeller_file):
-            with open(self.propeller_file, 'r') as f:
-                return [line.split(',')[0] for line in f]
-        return ["No Propellers Available"]
+        return self.catalog.propeller_names() or ["No Propellers Available"]
 
     def update_graphs(self, rpm, moment, thrust):
-        self.ax1.clear()
-        self.ax2.clear()
-        self.ax3.clear()
-        self.create_graph_panel(self.ax1, "RPM")
-        self.create_graph_panel(self.ax2, "Moment")
-        self.create_graph_panel(self.ax3, "Thrust")
-        self.ax1.plot(rpm, label='RPM')
-        self.ax2.plot(moment, label='Moment')
-        self.ax3.plot(thrust, label='Thrust')
-        self.ax1.legend()
-        self.ax2.legend()
-        self.ax3.legend()
-        self.canvas.draw()
+        """
+        Добавляет новые точки на графики; перерисовка ограничена частотой кадров LivePlot
+        :param rpm: Новые значения оборотов
+        :param moment: Новые значения момента
+        :param thrust: Новые значения тяги
+        """
+        self.live_plot.extend(RPM=rpm, Moment=moment, Thrust=thrust)
+        self.live_plot.update()
+
+    def refresh_graphs(self):
+        """Дорисовывает точки, пришедшие после последнего кадра"""
+        self.live_plot.update()
+        self.after(int(self.live_plot.frame_interval * 1000), self.refresh_graphs)
+
+    def reset_graphs(self):
+        """Очищает графики перед новым тестом"""
+        from analysis import StepAnalyzer
+
+        self.live_plot.clear()
+        self.live_plot.update(force=True)
+        self.analyzer = StepAnalyzer()
+        self.run_recorded = False
 
 
 if __name__ == "__main__":
     app = TestApp()
-    app.mainloop()
\ No newline at end of file
+    try:
+        app.mainloop()
+    finally:
+        app.stop_workers()
+        if app.series_loader is not None:
+            app.series_loader.stop()
+        app.catalog.close()
\ No newline at end of file
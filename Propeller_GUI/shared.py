@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Общие модули обработки данных (прореживание, формат записи) лежат в Eng_logg
+eng_logg_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'Eng_logg')
+if eng_logg_dir not in sys.path:
+    sys.path.append(eng_logg_dir)